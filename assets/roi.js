@@ -0,0 +1,71 @@
+// Selection of a region of interest by dragging a rectangle over the video feed
+// of the page Camera-Control. The region relative to the image shown is passed
+// to the store "roi-selection" as [x, y, w, h] with values from 0 to 1.
+(function () {
+    let start = null;
+    let box = null;
+
+    function relative(event, image) {
+        const rect = image.getBoundingClientRect();
+        return [
+            Math.min(Math.max((event.clientX - rect.left) / rect.width, 0), 1),
+            Math.min(Math.max((event.clientY - rect.top) / rect.height, 0), 1),
+        ];
+    }
+
+    function region(a, b) {
+        return [
+            Math.min(a[0], b[0]),
+            Math.min(a[1], b[1]),
+            Math.abs(a[0] - b[0]),
+            Math.abs(a[1] - b[1]),
+        ];
+    }
+
+    function drawBox(image, roi) {
+        const area = image.parentElement;
+        if (!box) {
+            box = document.createElement("div");
+            box.style.position = "absolute";
+            box.style.border = "2px dashed red";
+            box.style.pointerEvents = "none";
+            area.appendChild(box);
+        }
+        box.style.left = image.offsetLeft + roi[0] * image.clientWidth + "px";
+        box.style.top = image.offsetTop + roi[1] * image.clientHeight + "px";
+        box.style.width = roi[2] * image.clientWidth + "px";
+        box.style.height = roi[3] * image.clientHeight + "px";
+    }
+
+    document.addEventListener("pointerdown", function (event) {
+        const image = event.target.closest("#roi-area img");
+        if (!image) {
+            return;
+        }
+        event.preventDefault();
+        start = { image: image, point: relative(event, image) };
+    });
+
+    document.addEventListener("pointermove", function (event) {
+        if (start) {
+            drawBox(start.image, region(start.point, relative(event, start.image)));
+        }
+    });
+
+    document.addEventListener("pointerup", function (event) {
+        if (!start) {
+            return;
+        }
+        const roi = region(start.point, relative(event, start.image));
+        start = null;
+        if (box) {
+            box.remove();
+            box = null;
+        }
+        // clicks without dragging are ignored
+        if (roi[2] < 0.02 || roi[3] < 0.02) {
+            return;
+        }
+        window.dash_clientside.set_props("roi-selection", { data: roi });
+    });
+})();
@@ -0,0 +1,96 @@
+// Renderer of the videostream as changed tiles (see pys/tiles.py) for canvases
+// with the attribute data-src, e.g. on the page Videostream. The stream is read by
+// fetch, each message is decoded and its tiles are drawn at their position.
+// Changing data-src switches the stream, an empty data-src or removing the canvas stops it.
+(function () {
+    const readers = new Map();
+
+    async function render(canvas, src, controller) {
+        const context = canvas.getContext("2d");
+        const response = await fetch(src, { signal: controller.signal });
+        const reader = response.body.getReader();
+        let buffer = new Uint8Array(0);
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                return;
+            }
+            const joined = new Uint8Array(buffer.length + value.length);
+            joined.set(buffer);
+            joined.set(value, buffer.length);
+            buffer = joined;
+            // messages are prefixed by their length
+            while (buffer.length >= 4) {
+                const view = new DataView(buffer.buffer, buffer.byteOffset);
+                const length = view.getUint32(0, true);
+                if (buffer.length < 4 + length) {
+                    break;
+                }
+                await drawMessage(canvas, context, buffer.subarray(4, 4 + length));
+                buffer = buffer.slice(4 + length);
+            }
+        }
+    }
+
+    async function drawMessage(canvas, context, message) {
+        const view = new DataView(message.buffer, message.byteOffset, message.length);
+        const width = view.getUint16(1, true);
+        const height = view.getUint16(3, true);
+        const count = view.getUint16(5, true);
+        if (canvas.width !== width || canvas.height !== height) {
+            canvas.width = width;
+            canvas.height = height;
+        }
+        let offset = 7;
+        const tiles = [];
+        for (let i = 0; i < count; i++) {
+            const x = view.getUint16(offset, true);
+            const y = view.getUint16(offset + 2, true);
+            const length = view.getUint32(offset + 4, true);
+            offset += 8;
+            const blob = new Blob([message.subarray(offset, offset + length)], {
+                type: "image/jpeg",
+            });
+            offset += length;
+            tiles.push([x, y, createImageBitmap(blob)]);
+        }
+        // tiles are drawn in order after all of them were decoded
+        for (const [x, y, bitmap] of tiles) {
+            const image = await bitmap;
+            context.drawImage(image, x, y);
+            image.close();
+        }
+    }
+
+    function update() {
+        const canvases = new Set(document.querySelectorAll("canvas[data-src]"));
+        for (const [canvas, entry] of readers) {
+            if (!canvases.has(canvas) || canvas.dataset.src !== entry.src) {
+                entry.controller.abort();
+                readers.delete(canvas);
+            }
+        }
+        for (const canvas of canvases) {
+            const src = canvas.dataset.src;
+            if (!src || readers.has(canvas)) {
+                continue;
+            }
+            const entry = { src: src, controller: new AbortController() };
+            readers.set(canvas, entry);
+            render(canvas, src, entry.controller)
+                .catch(function (error) {
+                    if (error.name !== "AbortError") {
+                        console.log("tiles", error);
+                    }
+                })
+                .finally(function () {
+                    // reconnects at the next update unless stopped
+                    if (readers.get(canvas) === entry) {
+                        readers.delete(canvas);
+                    }
+                });
+        }
+    }
+
+    setInterval(update, 500);
+})();
@@ -0,0 +1,122 @@
+"""
+Benchmark of the JPEG encoder backends provided by pys.camera.
+Compares all available backends and some settings at several resolutions.
+Run from the root of the repository:
+
+    python -m benchmarks.bench_jpeg
+    python -m benchmarks.bench_jpeg --sensor 4608x2592 --repeat 20
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+import pys.camera as camera
+from benchmarks.common import parse_size
+
+#: str: image used as content, resized to the resolutions benchmarked
+IMAGE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "assets", "squirrel.png"
+)
+
+#: list: settings compared for each backend
+SETTINGS = [
+    dict(quality=95, subsampling="420"),
+    dict(quality=80, subsampling="420"),
+    dict(quality=80, subsampling="444"),
+    dict(quality=80, subsampling="420", progressive=True),
+    dict(quality=80, subsampling="420", optimize=True),
+    dict(quality=80, subsampling="420", restart_interval=8),
+]
+
+
+def make_frame(size) -> np.array:
+    """Returns test image of given size with some sensor noise
+
+    Args:
+        size (tuple): width,height
+
+    Returns:
+        np.array: image BGR
+    """
+    image = cv2.imread(IMAGE_PATH)
+    if image is None:
+        image = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    image = cv2.resize(image[:, :, :3], size, interpolation=cv2.INTER_CUBIC)
+    noise = np.random.normal(0, 3, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def available_backends() -> list:
+    """Returns names of backends which can be instanciated
+
+    Returns:
+        list: names
+    """
+    backends = []
+    for name in camera.JPEG_ENCODERS:
+        try:
+            camera.create_jpeg_encoder(name)
+            backends.append(name)
+        except Exception as e:
+            print(f"- backend {name} not available: {e}")
+    return backends
+
+
+def bench(encoder, frame, repeat) -> dict:
+    """Encodes frame repeatedly
+
+    Args:
+        encoder (JpegEncoderOpenCV): encoder
+        frame (np.array): image
+        repeat (int): number of repetitions
+
+    Returns:
+        dict: mean and minimum time in ms and size in bytes
+    """
+    encoder.encode(frame)  # warm-up
+    times = []
+    for _ in range(repeat):
+        starttime = time.perf_counter()
+        jpeg = encoder.encode(frame)
+        times.append(time.perf_counter() - starttime)
+    return dict(
+        mean_ms=1000 * float(np.mean(times)),
+        min_ms=1000 * float(np.min(times)),
+        size=len(jpeg),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sensor",
+        default="4056x3040",
+        help="full sensor resolution WIDTHxHEIGHT (default HQ camera)",
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    sizes = [(160, 120), (640, 480), parse_size(args.sensor)]
+    backends = available_backends()
+    print(f"{'size':>10} {'backend':>10} {'settings':<50} {'mean ms':>9} {'min ms':>9} {'bytes':>9}")
+    for size in sizes:
+        frame = make_frame(size)
+        # fewer repetitions at large resolutions
+        repeat = max(3, args.repeat * 640 * 480 // max(640 * 480, size[0] * size[1]))
+        for backend in backends:
+            for settings in SETTINGS:
+                encoder = camera.create_jpeg_encoder(backend, **settings)
+                result = bench(encoder, frame, repeat)
+                settings_text = ", ".join(f"{k}={v}" for k, v in settings.items())
+                print(
+                    f"{size[0]:>5}x{size[1]:<4} {backend:>10} {settings_text:<50} "
+                    f"{result['mean_ms']:>9.2f} {result['min_ms']:>9.2f} {result['size']:>9}"
+                )
+
+
+if __name__ == "__main__":
+    main()
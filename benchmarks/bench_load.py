@@ -0,0 +1,430 @@
+"""
+Load test of the server with many viewers of the videostream and of the page Camera-Control.
+Readers of /video_feed parse the multipart stream, Dash clients call the callback
+update_plots at the interval of the page. For each step the frames/s delivered per reader,
+the age of the frames, the latency of the callback and the CPU and RSS of the server are reported.
+By default a server with the synthetic camera is started in a temporary folder, so the test
+runs on any Linux box. Run from the root of the repository:
+
+    python -m benchmarks.bench_load --readers 1,4,16 --dash 0,4
+    python -m benchmarks.bench_load --url http://raspberrypi:8050 --readers 8 --dash 2
+"""
+
+import argparse
+import itertools
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from threading import Event, Thread
+
+import numpy as np
+
+from benchmarks.common import save_results
+
+#: str: root of the repository, the server is started from there
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: dict: configuration of the server started by the test
+SERVER_CONFIG = {
+    "camera": "SYNTHETIC",
+    "resolution": [640, 480],
+    "fps": 30,
+    "autostart": True,
+    "active_preprocessing_transformations": [],
+    "active_postprocessing_transformations": ["Camera Info"],
+}
+
+#: str: script starting the server, the working directory holds config.json
+SERVER_SCRIPT = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from maindash import app
+app.run(host="127.0.0.1", port=int(sys.argv[2]), debug=False)
+"""
+
+#: dict: request of the callback update_plots as sent by the page Camera-Control
+UPDATE_PLOTS_REQUEST = {
+    "output": "..plot-smd.figure...plot-revision.data..",
+    "outputs": [
+        {"id": "plot-smd", "property": "figure"},
+        {"id": "plot-revision", "property": "data"},
+    ],
+    "inputs": [{"id": "interval-componente", "property": "n_intervals", "value": 0}],
+    "changedPropIds": ["interval-componente.n_intervals"],
+    "state": [{"id": "plot-revision", "property": "data", "value": None}],
+}
+
+
+def get_free_port() -> int:
+    """Returns a free TCP port of localhost"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, config, folder) -> subprocess.Popen:
+    """Starts server in a folder with its own config.json and waits until it answers
+
+    Args:
+        port (int): port of server
+        config (dict): content of config.json
+        folder (str): working directory of server, its output is written to server.log
+
+    Returns:
+        subprocess.Popen: process of server
+    """
+    with open(os.path.join(folder, "config.json"), "w") as f:
+        json.dump(config, f)
+    log = open(os.path.join(folder, "server.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SCRIPT, ROOT, str(port)],
+        cwd=folder,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited, see {log.name}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/latency", timeout=1).read()
+            return process
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"server did not answer, see {log.name}")
+
+
+class ProcessSampler:
+    """Samples CPU and RSS of a process from /proc in a thread"""
+
+    def __init__(self, pid, interval=0.5):
+        """
+        Args:
+            pid (int): id of process
+            interval (float, optional): time in seconds between samples
+        """
+        #: int: id of process
+        self.pid = pid
+        #: float: time in seconds between samples
+        self.interval = interval
+        #: list: CPU of samples in % of one core
+        self.cpu = []
+        #: list: RSS of samples in MB
+        self.rss = []
+        #: Event: stops sampling
+        self.__stop = Event()
+        #: Thread: samples
+        self.__thread = None
+
+    def __read(self) -> tuple:
+        """Returns CPU time in seconds and RSS in MB of process"""
+        with open(f"/proc/{self.pid}/stat") as f:
+            # the name of the process in brackets may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cputime = (int(fields[11]) + int(fields[12])) / ticks
+        rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        return cputime, rss
+
+    def __run(self):
+        """Samples until stopped"""
+        last_cputime, _ = self.__read()
+        last_time = time.perf_counter()
+        while not self.__stop.wait(self.interval):
+            cputime, rss = self.__read()
+            now = time.perf_counter()
+            self.cpu.append(100 * (cputime - last_cputime) / (now - last_time))
+            self.rss.append(rss)
+            last_cputime, last_time = cputime, now
+
+    def start(self):
+        """Starts sampling"""
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Stops sampling"""
+        self.__stop.set()
+        self.__thread.join()
+
+
+class StreamReader(Thread):
+    """Reads the multipart stream of /video_feed like a browser, the frames are not decoded"""
+
+    def __init__(self, url, stop):
+        """
+        Args:
+            url (str): url of stream
+            stop (Event): ends reading
+        """
+        super().__init__(daemon=True)
+        #: str: url of stream
+        self.url = url
+        #: Event: ends reading
+        self.stop = stop
+        #: list: times frames were received
+        self.times = []
+        #: list: age of frames at reception in seconds, from the header X-Timestamp
+        self.ages = []
+        #: int: bytes of frames received
+        self.bytes = 0
+        #: str: error which ended reading
+        self.error = None
+
+    def run(self):
+        try:
+            with urllib.request.urlopen(self.url, timeout=10) as response:
+                while not self.stop.is_set():
+                    # skips to the boundary, parts end with empty lines
+                    line = response.readline()
+                    if not line:
+                        raise ConnectionError("stream ended")
+                    if line.strip() != b"--frame":
+                        continue
+                    headers = {}
+                    while True:
+                        line = response.readline().strip()
+                        if not line:
+                            break
+                        key, _, value = line.decode().partition(":")
+                        headers[key.strip().lower()] = value.strip()
+                    frame = response.read(int(headers["content-length"]))
+                    now = time.time()
+                    if "x-timestamp" not in headers:
+                        # default image shown while the camera does not run
+                        continue
+                    self.times.append(now)
+                    self.ages.append(now - float(headers["x-timestamp"]))
+                    self.bytes += len(frame)
+        except Exception as e:
+            if not self.stop.is_set():
+                self.error = repr(e)
+
+
+class DashClient(Thread):
+    """Calls the callback update_plots at the interval of the page Camera-Control"""
+
+    def __init__(self, url, stop, interval=0.1):
+        """
+        Args:
+            url (str): url of server
+            stop (Event): ends calling
+            interval (float, optional): time in seconds between calls, as dcc.Interval
+        """
+        super().__init__(daemon=True)
+        #: str: url of callback
+        self.url = url + "/_dash-update-component"
+        #: Event: ends calling
+        self.stop = stop
+        #: float: time in seconds between calls
+        self.interval = interval
+        #: list: time and duration in seconds of calls answered
+        self.calls = []
+        #: int: calls failed
+        self.errors = 0
+
+    def run(self):
+        # revision of the plot shown, sent back like the store of a tab
+        revision = None
+        for n in itertools.count(1):
+            request = dict(UPDATE_PLOTS_REQUEST)
+            request["inputs"] = [dict(UPDATE_PLOTS_REQUEST["inputs"][0], value=n)]
+            request["state"] = [dict(UPDATE_PLOTS_REQUEST["state"][0], value=revision)]
+            starttime = time.perf_counter()
+            try:
+                body = urllib.request.urlopen(
+                    urllib.request.Request(
+                        self.url,
+                        data=json.dumps(request).encode(),
+                        headers={"Content-Type": "application/json"},
+                    ),
+                    timeout=10,
+                ).read()
+                # no content if the plot is up to date
+                if body:
+                    response = json.loads(body)["response"]
+                    revision = response["plot-revision"]["data"]
+                self.calls.append((time.time(), time.perf_counter() - starttime))
+            except Exception:
+                self.errors += 1
+            # like dcc.Interval the next call is not sent before the response arrived
+            elapsed = time.perf_counter() - starttime
+            if self.stop.wait(max(0.0, self.interval - elapsed)):
+                return
+
+
+def percentile(values, q) -> float:
+    """Returns percentile of values, None if empty"""
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def run_step(
+    url, readers, dash_clients, duration, pid=None, stream="", interval=0.1
+) -> dict:
+    """Runs readers and Dash clients against the server for some time
+
+    Args:
+        url (str): url of server
+        readers (int): number of readers of the stream
+        dash_clients (int): number of Dash clients
+        duration (float): time in seconds measured
+        pid (int, optional): process of server, CPU and RSS are sampled if given
+        stream (str, optional): query of /video_feed, e.g. 'w=640'
+        interval (float, optional): time in seconds between calls of the Dash clients
+
+    Returns:
+        dict: results of step
+    """
+    stop = Event()
+    clients = [
+        StreamReader(f"{url}/video_feed?{stream}", stop) for _ in range(readers)
+    ] + [DashClient(url, stop, interval) for _ in range(dash_clients)]
+    for client in clients:
+        client.start()
+    # connections are set up before measuring
+    time.sleep(1.0)
+    sampler = ProcessSampler(pid) if pid else None
+    if sampler:
+        sampler.start()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    starttime = time.time()
+    time.sleep(duration)
+    endtime = time.time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    if sampler:
+        sampler.stop()
+    stop.set()
+    for client in clients:
+        client.join(timeout=5)
+
+    stream_readers = [c for c in clients if isinstance(c, StreamReader)]
+    dash = [c for c in clients if isinstance(c, DashClient)]
+    fps = []
+    ages = []
+    for reader in stream_readers:
+        measured = [
+            i for i, t in enumerate(reader.times) if starttime <= t <= endtime
+        ]
+        fps.append(len(measured) / duration)
+        ages.extend(reader.ages[i] for i in measured)
+    latencies = [
+        latency
+        for client in dash
+        for t, latency in client.calls
+        if starttime <= t <= endtime
+    ]
+    return dict(
+        readers=readers,
+        dash_clients=dash_clients,
+        fps_min=min(fps) if fps else None,
+        fps_median=percentile(fps, 50),
+        age_p50_ms=None if not ages else 1000 * percentile(ages, 50),
+        age_p90_ms=None if not ages else 1000 * percentile(ages, 90),
+        reader_errors=[r.error for r in stream_readers if r.error],
+        dash_calls_per_s=len(latencies) / duration if dash else None,
+        dash_p50_ms=None if not latencies else 1000 * percentile(latencies, 50),
+        dash_p90_ms=None if not latencies else 1000 * percentile(latencies, 90),
+        dash_errors=sum(client.errors for client in dash),
+        server_cpu_percent=percentile(sampler.cpu, 50) if sampler else None,
+        server_rss_mb=max(sampler.rss) if sampler and sampler.rss else None,
+        # the test itself must not be the bottleneck
+        client_cpu_percent=100
+        * (own.ru_utime + own.ru_stime - usage.ru_utime - usage.ru_stime)
+        / duration,
+    )
+
+
+def format_value(value, digits=1) -> str:
+    """Returns value formatted for the table, '-' if missing"""
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", default="1,4,16", help="stream readers per step")
+    parser.add_argument("--dash", default="0,4", help="Dash clients per step")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per step")
+    parser.add_argument("--stream", default="", help="query of /video_feed, e.g. w=640")
+    parser.add_argument(
+        "--interval", type=float, default=0.1, help="seconds between Dash calls"
+    )
+    parser.add_argument("--url", help="server to test instead of starting one")
+    parser.add_argument("--pid", type=int, help="process of server given by --url")
+    parser.add_argument("--resolution", default="640x480", help="of synthetic camera")
+    parser.add_argument("--fps", type=float, default=30, help="of the synthetic camera")
+    parser.add_argument("--output", help="saves results as JSON")
+    args = parser.parse_args()
+
+    process = None
+    tempdir = None
+    if args.url:
+        url, pid = args.url.rstrip("/"), args.pid
+    else:
+        tempdir = tempfile.mkdtemp(prefix="bench_load_")
+        port = get_free_port()
+        config = dict(
+            SERVER_CONFIG,
+            resolution=[int(v) for v in args.resolution.lower().split("x")],
+            fps=args.fps,
+        )
+        print("Starting server in", tempdir)
+        process = start_server(port, config, tempdir)
+        url, pid = f"http://127.0.0.1:{port}", process.pid
+
+    results = {}
+    print(
+        f"{'readers':>7} {'dash':>5} {'fps min':>8} {'fps p50':>8} {'age p50':>8} "
+        f"{'age p90':>8} {'dash/s':>7} {'dash p90':>9} {'errors':>7} "
+        f"{'CPU %':>6} {'RSS MB':>7} {'own CPU':>8}"
+    )
+    try:
+        for readers, dash_clients in itertools.product(
+            [int(v) for v in args.readers.split(",")],
+            [int(v) for v in args.dash.split(",")],
+        ):
+            result = run_step(
+                url,
+                readers,
+                dash_clients,
+                args.duration,
+                pid,
+                args.stream,
+                args.interval,
+            )
+            results[f"readers={readers},dash={dash_clients}"] = result
+            print(
+                f"{readers:>7} {dash_clients:>5} {format_value(result['fps_min']):>8} "
+                f"{format_value(result['fps_median']):>8} "
+                f"{format_value(result['age_p50_ms']):>8} "
+                f"{format_value(result['age_p90_ms']):>8} "
+                f"{format_value(result['dash_calls_per_s']):>7} "
+                f"{format_value(result['dash_p90_ms']):>9} "
+                f"{len(result['reader_errors']) + result['dash_errors']:>7} "
+                f"{format_value(result['server_cpu_percent'], 0):>6} "
+                f"{format_value(result['server_rss_mb']):>7} "
+                f"{format_value(result['client_cpu_percent'], 0):>8}"
+            )
+            for error in result["reader_errors"][:3]:
+                print("  READER", error)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+    if args.output:
+        save_results(args.output, results)
+        print("Results saved to", args.output)
+
+
+if __name__ == "__main__":
+    main()
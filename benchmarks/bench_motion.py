@@ -0,0 +1,206 @@
+"""
+Benchmark of the motion engines comparing cost per frame and quality of detection on a replay clip.
+By default a clip is generated with labelled segments: still scene with sensor noise,
+moving objects and a change of lighting without motion. Recorded footage can be used with labels
+given as CSV with columns frame,motion (motion 0 or 1).
+Run from the root of the repository:
+
+    python -m benchmarks.bench_motion
+    python -m benchmarks.bench_motion --resolution 1280x720 --output motion.json
+    python -m benchmarks.bench_motion --clip recording.mp4 --labels labels.csv
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import pys.camera as camera
+import pys.transformer as transformer
+from benchmarks.common import parse_size, save_results, summarize
+
+#: dict: engines benchmarked
+ENGINES = {
+    "SMD": lambda: transformer.SimpleMotionDetection(),
+    "MOG2": lambda: transformer.BackgroundSubtractionMotionDetection("MOG2"),
+    "KNN": lambda: transformer.BackgroundSubtractionMotionDetection("KNN"),
+    "FD": lambda: transformer.FrameDifferenceMotionDetection(),
+    "Flow": lambda: transformer.OpticalFlowMotionDetection(),
+}
+
+#: list: segments of the generated clip as (kind, number of frames)
+SEGMENTS = [
+    ("still", 60),
+    ("motion", 60),
+    ("still", 60),
+    ("lighting", 60),
+    ("still", 40),
+    ("motion", 60),
+    ("still", 40),
+]
+
+
+def make_clip(path, size, fps=25, noise=5, seed=0) -> list:
+    """Writes clip of labelled segments
+
+    Args:
+        path (str): video file (.avi)
+        size (tuple): width,height
+        fps (int, optional): frames per second
+        noise (int, optional): standard deviation of sensor noise
+        seed (int, optional): seed of random numbers
+
+    Returns:
+        list: True for each frame showing motion
+    """
+    w, h = size
+    rng = np.random.default_rng(seed)
+    xx, yy = np.meshgrid(np.linspace(0, 1, w), np.linspace(0, 1, h))
+    background = np.dstack(
+        [60 + 80 * xx, 80 + 60 * yy, 100 + 40 * (1 - xx)]
+    ).astype(np.float32)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+    labels = []
+    brightness = 1.0
+    box = (max(8, w // 8), max(8, h // 6))
+    for kind, frames in SEGMENTS:
+        for index in range(frames):
+            if kind == "lighting":
+                # lighting changes slowly over the whole segment
+                brightness = 1.0 + 0.5 * index / frames
+            image = background * brightness
+            if kind == "motion":
+                x = int((w - box[0]) * index / frames)
+                y = int((h - box[1]) * (0.5 + 0.3 * np.sin(index / 8)))
+                image[y : y + box[1], x : x + box[0]] = (30, 200, 230)
+            image = image + rng.normal(0, noise, image.shape)
+            writer.write(np.clip(image, 0, 255).astype(np.uint8))
+            labels.append(kind == "motion")
+    writer.release()
+    return labels
+
+
+def load_labels(path) -> list:
+    """Reads labels of recorded footage
+
+    Args:
+        path (str): CSV with columns frame,motion
+
+    Returns:
+        list: True for each frame showing motion
+    """
+    with open(path, newline="") as file:
+        rows = sorted(
+            (int(row["frame"]), bool(int(row["motion"]))) for row in csv.DictReader(file)
+        )
+    return [motion for _, motion in rows]
+
+
+def rate(detected, labels) -> dict:
+    """Returns quality of detection
+
+    Args:
+        detected (list): True for each frame motion was detected
+        labels (list): True for each frame showing motion
+
+    Returns:
+        dict: counts of true/false positives/negatives, precision, recall and F1
+    """
+    counts = dict(tp=0, fp=0, fn=0, tn=0)
+    for prediction, motion in zip(detected, labels):
+        counts[("t" if prediction == motion else "f") + ("p" if prediction else "n")] += 1
+    precision = counts["tp"] / max(1, counts["tp"] + counts["fp"])
+    recall = counts["tp"] / max(1, counts["tp"] + counts["fn"])
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
+    return dict(counts, precision=precision, recall=recall, f1=f1)
+
+
+def run_engine(name, clip, labels, warmup) -> dict:
+    """Replays clip through an engine
+
+    Args:
+        name (str): key of ENGINES
+        clip (str): video file or folder of images
+        labels (list): True for each frame showing motion
+        warmup (int): frames excluded from quality, the background model is learnt
+
+    Returns:
+        dict: frames/s, latency percentiles, quality at the default action threshold
+        and the best F1 of any threshold with its threshold
+    """
+    engine = ENGINES[name]()
+    adapter = camera.AdapterVideoFile(clip, realtime=False, loop=False)
+    threshold = engine.parameter["action_threshold"].value
+    times = []
+    scores = []
+    for _ in labels:
+        image = adapter.read()
+        if image is None:
+            break
+        starttime = time.perf_counter()
+        engine(image)
+        times.append(time.perf_counter() - starttime)
+        scores.append(float(engine.get_last_result().score))
+    adapter.release()
+    scores = scores[warmup:]
+    labels = labels[warmup : warmup + len(scores)]
+    result = summarize(times)
+    result.update(rate([score > threshold for score in scores], labels))
+    # the scores of the engines have different scales, the best threshold shows their potential
+    best = max(
+        (rate([score > value for score in scores], labels)["f1"], value)
+        for value in sorted(set(scores))
+    )
+    result.update(best_f1=best[0], best_threshold=best[1])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--resolution", default="640x480", help="of the generated clip")
+    parser.add_argument("--clip", help="recorded footage instead of the generated clip")
+    parser.add_argument("--labels", help="CSV with columns frame,motion for --clip")
+    parser.add_argument("--warmup", type=int, default=30, help="frames not rated")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--output", help="saves results as JSON")
+    args = parser.parse_args()
+
+    tempdir = None
+    if args.clip:
+        if not args.labels:
+            parser.error("--clip requires --labels")
+        clip = args.clip
+        labels = load_labels(args.labels)
+    else:
+        tempdir = tempfile.TemporaryDirectory(prefix="bench-motion-")
+        clip = os.path.join(tempdir.name, "clip.avi")
+        labels = make_clip(clip, parse_size(args.resolution))
+    print(f"CLIP {clip}: {len(labels)} frames, {sum(labels)} with motion")
+
+    results = {}
+    print(
+        f"{'engine':<8} {'fps':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'precision':>10} {'recall':>8} {'F1':>6} {'best F1':>8} {'at':>8}"
+    )
+    for name in args.engines.split(","):
+        result = run_engine(name, clip, labels, args.warmup)
+        results[name] = result
+        print(
+            f"{name:<8} {result['fps']:>9.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+            f"{result['precision']:>10.2f} {result['recall']:>8.2f} {result['f1']:>6.2f} "
+            f"{result['best_f1']:>8.2f} {result['best_threshold']:>8.2f}"
+        )
+    if tempdir:
+        tempdir.cleanup()
+
+    if args.output:
+        save_results(args.output, results)
+        print("Results saved to", args.output)
+
+
+if __name__ == "__main__":
+    main()
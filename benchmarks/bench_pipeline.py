@@ -0,0 +1,215 @@
+"""
+Benchmark of the transformation pipeline and the streaming path.
+Each case runs in a fresh process, so the peak RSS reported belongs to the case.
+Run from the root of the repository:
+
+    python -m benchmarks.bench_pipeline --output results.json
+    python -m benchmarks.bench_pipeline --compare results.json
+    python -m benchmarks.bench_pipeline --filter SMD --resolutions 640x480
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import multiprocessing
+import sys
+import time
+
+import pys.camera as camera
+import pys.transformer as transformer
+from pys.latency import FrameMeta
+from benchmarks.common import (
+    compare_results,
+    load_results,
+    measure,
+    parse_size,
+    peak_rss_mb,
+    save_results,
+)
+
+#: list: resolutions benchmarked by default
+RESOLUTIONS = ["160x120", "320x240", "640x480", "1280x720", "1920x1080"]
+
+#: dict: transformers benchmarked, SimpleMotionDetection is run for each output
+TRANSFORMERS = {
+    "smooth": lambda: transformer.Smoother(0.6),
+    "gaussblur": lambda: transformer.GaussianBlur(3),
+    "gaussblur15": lambda: transformer.GaussianBlur(15),
+}
+
+#: dict: sets of registered transformations used to benchmark CameraController
+CONTROLLER_SETS = {
+    "none": [],
+    "smooth": ["smooth"],
+    "SMD": ["SMD"],
+    "smooth+gaussblur+SMD": ["smooth", "gaussblur", "SMD"],
+}
+
+
+def make_frames(size, count=8) -> list:
+    """Returns some images of the synthetic camera
+
+    Args:
+        size (tuple): width,height
+        count (int, optional): number of images
+
+    Returns:
+        list: images
+    """
+    adapter = camera.AdapterSynthetic(size)
+    return [adapter.read() for _ in range(count)]
+
+
+def make_controller(size, registered=()) -> camera.CameraController:
+    """Returns controller reading from the synthetic camera as fast as possible
+
+    Args:
+        size (tuple): width,height
+        registered (list, optional): active registered transformations
+
+    Returns:
+        CameraController: controller
+    """
+    cam = camera.CameraController(
+        camera.AdapterSynthetic(size),
+        active_postprocessing_transformations=["Camera Info"],
+    )
+    cam.set_active_transformations("registered", registered)
+    return cam
+
+
+def encode_stream_frame(cam, width) -> bytes:
+    """Encodes the last frame for the stream at full width, bypassing the cache of the
+    variants, which returns the same bytes until the capture thread delivers a new frame
+
+    Args:
+        cam (CameraController): running controller
+        width (int): width of the variant
+
+    Returns:
+        bytes: JPEG
+    """
+    meta = cam.get_last_frame_meta()
+    # a new record of the frame makes the cache encode it again
+    cam._last_frame_meta = FrameMeta(meta.seq, meta.t_read, meta.t_capture)
+    data, _ = cam.get_stream_variant("transformed", width)
+    return data
+
+
+def run_case(case, duration) -> dict:
+    """Runs a case, called in a separate process
+
+    Args:
+        case (dict): description of case
+        duration (float): time in seconds to measure
+
+    Returns:
+        dict: results
+    """
+    size = case["size"]
+    kind = case["kind"]
+    if kind == "transformer":
+        if case["name"] == "SMD":
+            transformation = transformer.SimpleMotionDetection(output=case["output"])
+        else:
+            transformation = TRANSFORMERS[case["name"]]()
+        frames = itertools.cycle(make_frames(size))
+        result = measure(lambda: transformation(next(frames)), duration)
+    elif kind == "controller":
+        cam = make_controller(size, CONTROLLER_SETS[case["name"]])
+        result = measure(cam.single_run_get_frame, duration)
+    elif kind in ("stream", "gen"):
+        # the capture thread runs as in the app, frames are taken from the streaming path
+        cam = make_controller(size, CONTROLLER_SETS[case["name"]])
+        cam.run()
+        while cam._last_frame_br is None or cam.get_last_frame_meta() is None:
+            time.sleep(0.01)
+        if kind == "stream":
+            result = measure(lambda: encode_stream_frame(cam, size[0]), duration)
+        else:
+            # frames as received by a client, limited by the frame rate of the capture
+            stream = camera.gen(cam)
+            result = measure(lambda: next(stream), duration)
+        cam.stop()
+    else:
+        raise ValueError(f"Unknown kind of case: {kind}")
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def get_cases(resolutions) -> list:
+    """Returns all cases
+
+    Args:
+        resolutions (list): sizes (width,height)
+
+    Returns:
+        list: cases
+    """
+    cases = []
+    for size in resolutions:
+        for name in TRANSFORMERS:
+            cases.append(dict(kind="transformer", name=name, size=size))
+        for output in range(10):
+            cases.append(dict(kind="transformer", name="SMD", output=output, size=size))
+        for name in CONTROLLER_SETS:
+            cases.append(dict(kind="controller", name=name, size=size))
+        for kind in ("stream", "gen"):
+            for name in ("none", "SMD"):
+                cases.append(dict(kind=kind, name=name, size=size))
+    for case in cases:
+        w, h = case["size"]
+        output = f":output={case['output']}" if "output" in case else ""
+        case["id"] = f"{case['kind']}:{case['name']}{output}@{w}x{h}"
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS))
+    parser.add_argument("--filter", default="", help="run cases containing this text only")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--output", help="saves results as JSON")
+    parser.add_argument("--compare", help="JSON of a baseline to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="tolerated change")
+    parser.add_argument(
+        "--no-isolate", action="store_true", help="run all cases in this process"
+    )
+    args = parser.parse_args()
+
+    resolutions = [parse_size(text) for text in args.resolutions.split(",")]
+    cases = [case for case in get_cases(resolutions) if args.filter in case["id"]]
+
+    results = {}
+    print(f"{'case':<45} {'fps':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'RSS MB':>8}")
+    for case in cases:
+        if args.no_isolate:
+            result = run_case(case, args.duration)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                result = executor.submit(run_case, case, args.duration).result()
+        results[case["id"]] = result
+        print(
+            f"{case['id']:<45} {result['fps']:>9.1f} {result['p50_ms']:>8.2f} "
+            f"{result['p90_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['peak_rss_mb']:>8.1f}"
+        )
+
+    if args.output:
+        save_results(args.output, results)
+        print("Results saved to", args.output)
+
+    if args.compare:
+        regressions = compare_results(
+            results, load_results(args.compare), args.threshold
+        )
+        for case, metric, base, value in regressions:
+            print(f"REGRESSION {case} {metric}: {base:.2f} -> {value:.2f}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
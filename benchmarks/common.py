@@ -0,0 +1,145 @@
+"""
+Helpers shared by the benchmarks: measuring, statistics and result files.
+"""
+
+import json
+import platform
+import resource
+import time
+
+import cv2
+import numpy as np
+
+
+def parse_size(text) -> tuple:
+    """Parses size given as WIDTHxHEIGHT
+
+    Args:
+        text (str): size
+
+    Returns:
+        tuple: width,height
+    """
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def peak_rss_mb() -> float:
+    """Returns peak resident set size of the process
+
+    Returns:
+        float: peak RSS in MB
+    """
+    # ru_maxrss is given in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(times, count=None) -> dict:
+    """Returns statistics of measured times
+
+    Args:
+        times (list): times in seconds, one per frame
+        count (int, optional): number of frames, defaults to len(times)
+
+    Returns:
+        dict: frames/s and latency percentiles in ms
+    """
+    times = np.asarray(times)
+    total = float(times.sum())
+    count = len(times) if count is None else count
+    return dict(
+        frames=count,
+        fps=count / total if total > 0 else float("inf"),
+        p50_ms=1000 * float(np.percentile(times, 50)),
+        p90_ms=1000 * float(np.percentile(times, 90)),
+        p99_ms=1000 * float(np.percentile(times, 99)),
+        max_ms=1000 * float(times.max()),
+    )
+
+
+def measure(func, duration=1.0, warmup=3, min_iterations=5) -> dict:
+    """Calls func repeatedly for some time and returns statistics
+
+    Args:
+        func (callable): function called without arguments, one call per frame
+        duration (float, optional): time in seconds to measure
+        warmup (int, optional): calls before measuring
+        min_iterations (int, optional): minimal number of calls measured
+
+    Returns:
+        dict: frames/s and latency percentiles in ms
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline or len(times) < min_iterations:
+        starttime = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - starttime)
+    return summarize(times)
+
+
+def get_meta() -> dict:
+    """Returns description of the platform the benchmark runs on
+
+    Returns:
+        dict: description
+    """
+    return dict(
+        time=time.strftime("%Y-%m-%d %H:%M:%S"),
+        machine=platform.machine(),
+        processor=platform.processor(),
+        python=platform.python_version(),
+        opencv=cv2.__version__,
+        numpy=np.__version__,
+    )
+
+
+def save_results(filepath, results, meta=None):
+    """Saves results as JSON
+
+    Args:
+        filepath (str): file
+        results (dict): results by id of case
+        meta (dict, optional): description of the platform
+    """
+    with open(filepath, "w") as f:
+        json.dump(dict(meta=meta or get_meta(), results=results), f, indent=2)
+
+
+def load_results(filepath) -> dict:
+    """Loads results saved by save_results
+
+    Args:
+        filepath (str): file
+
+    Returns:
+        dict: results by id of case
+    """
+    with open(filepath) as f:
+        return json.load(f)["results"]
+
+
+def compare_results(results, baseline, threshold=0.1) -> list:
+    """Compares results with a baseline and returns regressions.
+    A case regressed if its frames/s dropped or its p90 latency rose by more than threshold.
+
+    Args:
+        results (dict): results by id of case
+        baseline (dict): results by id of case
+        threshold (float, optional): tolerated relative change
+
+    Returns:
+        list: regressions as (case, metric, baseline value, value)
+    """
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        base = baseline[case]
+        if "fps" in base and result["fps"] < base["fps"] * (1 - threshold):
+            regressions.append((case, "fps", base["fps"], result["fps"]))
+        if "p90_ms" in base and result["p90_ms"] > base["p90_ms"] * (1 + threshold):
+            regressions.append((case, "p90_ms", base["p90_ms"], result["p90_ms"]))
+    return regressions
@@ -7,7 +7,8 @@ This module describes the basic structure of the application.
 import dash
 from dash import Dash, Output, State, Input, html, dcc, clientside_callback
 import dash_bootstrap_components as dbc
-from flask import Flask, redirect
+from flask import Flask, redirect, request, jsonify, Response
+from pys.profiler import profiler
 
 
 # FLASK: used to redirect and set up videostream
@@ -19,6 +20,32 @@ def root_redirect():
     return redirect("/welcome")
 
 
+# PROFILER: can be switched on for some seconds, see page profiler
+@server.route("/profiler/start")
+def profiler_start():
+    seconds = min(max(request.args.get("seconds", default=10, type=float), 1), 300)
+    return jsonify(started=profiler.start(seconds), **profiler.get_status())
+
+
+@server.route("/profiler/status")
+def profiler_status():
+    return jsonify(profiler.get_status())
+
+
+@server.route("/profiler/collapsed")
+def profiler_collapsed():
+    return Response(
+        profiler.get_collapsed(),
+        mimetype="text/plain",
+        headers={"Content-Disposition": "attachment; filename=profile.collapsed"},
+    )
+
+
+@server.route("/profiler/top")
+def profiler_top():
+    return jsonify(profiler.get_top(request.args.get("n", default=20, type=int)))
+
+
 """ to be tested
 dash.register_page(
     __name__,
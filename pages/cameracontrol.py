@@ -5,10 +5,10 @@ PAGE: describing the controls of the camera in the app at page cameracontrol
 import dash
 from dash import html, Output, Input, State, dcc, callback, get_app
 import dash_bootstrap_components as dbc
-from pys.initialized_camera_connected_to_app import cam
+from pys.initialized_camera_connected_to_app import cam, gallery
 from pys.camera import encode_frame_as_jpg
-import os
-import plotly.express as px
+from pys.cache import VersionedCache
+import time
 
 print("REGISTER", __file__)
 dash.register_page(__name__, title="Camera-Control", name="feature-camera-control")
@@ -17,11 +17,6 @@ print("CAMERACONTROL")
 print(" - APP-ID", id(app))
 print(" - CAM-ID", id(cam))
 
-# SOME CONFIGURATION
-APPLICATION_DIR = os.path.dirname(__file__)
-FOLDER_TO_SAVE_IMAGES = "saved"
-PATH_TO_SAVE_IMAGES = os.path.join(APPLICATION_DIR, FOLDER_TO_SAVE_IMAGES)
-
 
 # LAYOUT
 
@@ -46,6 +41,10 @@ VALUE_BUTTON_HR_IMAGE = [
     html.I(className="bi bi-image-fill m-1"),
     "Image",
 ]
+VALUE_BUTTON_FULL_FRAME = [
+    html.I(className="bi bi-fullscreen m-1"),
+    "Full frame",
+]
 
 
 def get_figure():
@@ -65,19 +64,66 @@ def get_figure():
     }
 
 
-def get_figure():
-    fig = px.line(
-        x=list(range(1000)),
-        y=list(cam.get_data_from_simple_motion_detection().get("data")),
-    )
-    fig.update_layout(
-        margin=dict(l=0, r=0, b=0, t=50),
-        title="Detektor",
-        showlegend=False,
-        plot_bgcolor="white",
-        yaxis_range=[0, 30],
+#: list: x values of the plot, one per frame of the motion data
+PLOT_X = list(range(1000))
+
+#: VersionedCache: figure of the motion data by seq of frame, shared by all tabs polling.
+#: The figure is used for one interval of the plot even if frames were processed meanwhile.
+figure_cache = VersionedCache(max_age=0.1)
+
+#: VersionedCache: layout by state of the camera shown in it
+layout_cache = VersionedCache()
+
+
+def build_figure() -> dict:
+    """Returns figure of the motion data, built as dict without validation of plotly"""
+    motion_data = cam.get_motion_data() or {
+        "SMD": cam.get_data_from_simple_motion_detection()
+    }
+    data = []
+    for name, values in motion_data.items():
+        data.append(
+            dict(type="scatter", x=PLOT_X, y=list(values.get("data")), name=name)
+        )
+        if "direction" in values:
+            # dominant direction of motion vectors in degrees
+            data.append(
+                dict(
+                    type="scatter",
+                    x=PLOT_X,
+                    y=list(values.get("direction")),
+                    name=f"{name} direction",
+                    mode="markers",
+                    marker=dict(size=3),
+                    yaxis="y2",
+                )
+            )
+    return dict(
+        data=data,
+        layout=dict(
+            margin=dict(l=0, r=0, b=0, t=50),
+            title=dict(text="Detektor"),
+            showlegend=len(data) > 1,
+            plot_bgcolor="white",
+            yaxis=dict(range=[0, 30]),
+            yaxis2=dict(range=[0, 360], overlaying="y", side="right", showgrid=False),
+        ),
     )
-    return fig
+
+
+def get_data_revision():
+    """Returns seq of the last frame, the motion data changes with each frame"""
+    meta = cam.get_last_frame_meta()
+    return None if meta is None else meta.seq
+
+
+def get_figure() -> tuple:
+    """Returns figure of the motion data, built once per revision of the data
+
+    Returns:
+        tuple: revision the figure was built for and figure
+    """
+    return figure_cache.get(get_data_revision(), build_figure)
 
 
 def get_parameter_setter_component(para: "Parameter", id: str):
@@ -210,6 +256,14 @@ def _create_layout():  # cam=cam):
                             n_clicks=0,
                             className="m-1 d-md-block",
                         ),
+                        dbc.Button(
+                            VALUE_BUTTON_FULL_FRAME,
+                            id="camera-roi-reset-button",
+                            n_clicks=0,
+                            color="secondary",
+                            disabled=cam.get_roi() is None,
+                            className="m-1 d-md-block",
+                        ),
                     ],
                 ),
             ]
@@ -225,6 +279,22 @@ def _create_layout():  # cam=cam):
                 )
             )
         ),
+        dbc.Row(
+            dbc.Col(
+                [
+                    html.Div(
+                        id="adaptive-quality-info",
+                        className="m-1",
+                        style={"font-size": "small"},
+                    ),
+                    dcc.Interval(
+                        id="interval-adaptive-quality",
+                        interval=1000,
+                        disabled=cam.get_adaptive_quality() is None,
+                    ),
+                ]
+            )
+        ),
     ]
 
     row_hr_image = dbc.Row(
@@ -253,11 +323,13 @@ def _create_layout():  # cam=cam):
         dbc.Col(
             [
                 dcc.Graph(
-                    figure=get_figure(),
+                    figure=get_figure()[1],
                     id="plot-smd",
                     style={"display": "none", "margin": "0", "padding": "0"},
                 ),
                 dcc.Interval(id="interval-componente", interval=100),
+                # seq of frame shown by the plot of this tab
+                dcc.Store(id="plot-revision"),
             ]
         ),
         id="row-plots",
@@ -275,12 +347,23 @@ def _create_layout():  # cam=cam):
                 [
                     dbc.Col(
                         [
-                            html.Img(
-                                src="/video_feed",
-                                id="video-feed",
-                                width="100%",
-                                style={"padding-bottom": "4px"},
+                            # a rectangle dragged over the image selects the region of interest, see assets/roi.js
+                            html.Div(
+                                html.Img(
+                                    src="/video_feed",
+                                    id="video-feed",
+                                    width="100%",
+                                    draggable="false",
+                                    style={
+                                        "padding-bottom": "4px",
+                                        "cursor": "crosshair",
+                                        "touch-action": "none",
+                                    },
+                                ),
+                                id="roi-area",
+                                style={"position": "relative"},
                             ),
+                            dcc.Store(id="roi-selection"),
                         ],
                         className="col-sm-9 col-12",
                     ),
@@ -298,7 +381,31 @@ def _create_layout():  # cam=cam):
     return layout
 
 
-layout = _create_layout
+def get_layout_version() -> tuple:
+    """Returns state of the camera shown by the layout, the layout is built again if it changes"""
+    groups = ("basic", "registered", "post")
+    return (
+        tuple(tuple(cam.get_keys_of_transformations(group)) for group in groups),
+        tuple(tuple(sorted(cam.get_active_transformations(group))) for group in groups),
+        tuple(
+            (transformation, key, para.value)
+            for transformation in cam.get_keys_of_transformations("registered")
+            for key, para in cam.get_transformation(
+                "registered", transformation
+            ).parameter.items()
+        ),
+        cam.running(),
+        cam.get_roi() is None,
+        cam.get_adaptive_quality() is None,
+    )
+
+
+def create_layout():
+    """Returns layout, shared by all page loads until the state of the camera changes"""
+    return layout_cache.get(get_layout_version(), _create_layout)[1]
+
+
+layout = create_layout
 
 
 # CALLBACKS
@@ -327,12 +434,27 @@ def click_camera_start_stop_button(n_clicks):
 )
 def click_camera_save_button(n_clicks):
     """Save-image-button"""
-    filepath = os.path.join(PATH_TO_SAVE_IMAGES, "saved_image.jpg")
+    filepath = gallery.new_filepath(prefix=cam.name)
     print(" - SAVEFILE:", filepath)
     cam.save_stored_image_to_file(filepath)
+    gallery.add(filepath)
     return True, VALUE_BUTTON_SAVED_IMAGE
 
 
+def get_skipped_note(controller) -> list:
+    """Returns note on the transformations not applied to the high resolution image"""
+    skipped = controller.get_stored_image_skipped()
+    if not skipped:
+        return []
+    return [
+        html.P(
+            "Not applied to the still, they need previous frames: "
+            + ", ".join(skipped),
+            style={"font-style": "italic"},
+        )
+    ]
+
+
 @app.callback(
     Output("col-hr-image", "children"),
     Output("camera-save-button", "disabled", allow_duplicate=True),
@@ -346,20 +468,52 @@ def click_hr_button(n_clicks):
     if n_clicks % 2 == 0:
         return [], True, VALUE_BUTTON_SAVE_IMAGE, {"display": "none"}
     else:
-        dataURI = encode_frame_as_jpg(cam.get_and_store_last_transformed_frame())
+        dataURI = encode_frame_as_jpg(cam.get_and_store_hr_frame())
         return (
-            html.Img(
-                src=dataURI,
-                id="image-hr",
-                width="100%",
-                style={"padding-bottom": "4px"},
-            ),
+            [
+                html.Img(
+                    src=dataURI,
+                    id="image-hr",
+                    width="100%",
+                    style={"padding-bottom": "4px"},
+                )
+            ]
+            + get_skipped_note(cam),
             False,
             VALUE_BUTTON_SAVE_IMAGE,
             {"display": "flex"},
         )
 
 
+@app.callback(
+    Output("camera-roi-reset-button", "disabled", allow_duplicate=True),
+    Input("roi-selection", "data"),
+    prevent_initial_call=True,
+)
+def select_roi(selection):
+    """Zooms into the region dragged over the image, which may already show a region"""
+    if not selection:
+        return dash.no_update
+    x, y, w, h = cam.get_roi() or (0, 0, 1, 1)
+    sx, sy, sw, sh = selection
+    try:
+        cam.set_roi((x + sx * w, y + sy * h, sw * w, sh * h))
+    except ValueError as e:
+        print(e)
+    return cam.get_roi() is None
+
+
+@app.callback(
+    Output("camera-roi-reset-button", "disabled", allow_duplicate=True),
+    Input("camera-roi-reset-button", "n_clicks"),
+    prevent_initial_call=True,
+)
+def click_camera_roi_reset_button(n_clicks):
+    """Shows full frame again"""
+    cam.set_roi(None)
+    return True
+
+
 @app.callback(
     Output("offcanvas", "is_open"),
     Input("open-offcanvas", "n_clicks"),
@@ -397,10 +551,55 @@ def set_post_transformations(values):
 ## LIVE-UPDATES
 
 
-@app.callback(Output("plot-smd", "figure"), Input("interval-componente", "n_intervals"))
-def update_plots(n_intervals):
-    print("N", n_intervals)
-    return get_figure()
+@app.callback(
+    Output("plot-smd", "figure"),
+    Output("plot-revision", "data"),
+    Input("interval-componente", "n_intervals"),
+    State("plot-revision", "data"),
+)
+def update_plots(n_intervals, revision):
+    """Updates plot if a frame was processed since the last update of this tab"""
+    current = get_data_revision()
+    if current is not None and current == revision:
+        raise dash.exceptions.PreventUpdate
+    # a figure cached within max_age may be older than the current frame, the tab
+    # keeps the revision it shows, so it updates again at the next interval
+    built, figure = get_figure()
+    if built is not None and built == revision:
+        raise dash.exceptions.PreventUpdate
+    return figure, built
+
+
+@app.callback(
+    Output("adaptive-quality-info", "children"),
+    Input("interval-adaptive-quality", "n_intervals"),
+)
+def update_adaptive_quality_info(n_intervals):
+    """Shows state and latest decisions of adaptive quality controller"""
+    controller = cam.get_adaptive_quality()
+    if controller is None:
+        return []
+    average_ms = controller.get_average_ms()
+    state = ", ".join(
+        f"{kind}: {'-' if value is None else value}"
+        for kind, value in controller.get_state().items()
+    )
+    decisions = [
+        html.Li(
+            f"{time.strftime('%H:%M:%S', time.localtime(decision['time']))} "
+            f"{decision['action']} {decision['kind']} -> {decision['value']} "
+            f"({round(decision['frame_ms'], 1)} ms)"
+        )
+        for decision in reversed(controller.get_decisions())
+    ]
+    return [
+        html.Div(
+            f"Frame time: {'-' if average_ms is None else round(average_ms, 1)} ms"
+            f" / {controller.budget_ms} ms"
+        ),
+        html.Div(state),
+        html.Ul(decisions[:5], className="mb-0"),
+    ]
 
 
 ## REGISTERED TRANSFORMATION
@@ -0,0 +1,116 @@
+"""
+PAGE: Allows to query motion events stored by the event store
+"""
+
+import dash
+from dash import html, Output, Input, State, dcc
+import dash_bootstrap_components as dbc
+from pys.initialized_camera_connected_to_app import event_store
+import datetime
+import time
+
+print("REGISTER", __file__)
+dash.register_page(__name__, title="Motion-Events", name="feature-motion-events")
+app = dash.get_app()
+
+
+def create_layout():
+    """Creates layout of page"""
+    controls = dbc.Row(
+        [
+            dbc.Col(
+                [
+                    dbc.Label("Hours"),
+                    dcc.Input(id="events-hours", type="number", value=1, min=0),
+                ]
+            ),
+            dbc.Col(
+                [
+                    dbc.Label("Min. score"),
+                    dcc.Input(id="events-score-min", type="number", value=None),
+                ]
+            ),
+            dbc.Col(
+                [
+                    dbc.Label("Max. score"),
+                    dcc.Input(id="events-score-max", type="number", value=None),
+                ]
+            ),
+            dbc.Col(
+                dbc.Button(
+                    [html.I(className="bi bi-search m-1"), "Query"],
+                    id="events-query-button",
+                    n_clicks=0,
+                    className="m-1 d-md-block",
+                )
+            ),
+        ],
+        className="mb-2",
+    )
+    return html.Div(
+        [
+            html.H2("Motion-Events"),
+            controls,
+            html.P(id="events-summary", style={"font-style": "italic"}),
+            html.Div(id="events-table"),
+        ]
+    )
+
+
+layout = create_layout
+
+
+@app.callback(
+    Output("events-table", "children"),
+    Output("events-summary", "children"),
+    Input("events-query-button", "n_clicks"),
+    State("events-hours", "value"),
+    State("events-score-min", "value"),
+    State("events-score-max", "value"),
+)
+def query_events(n_clicks, hours, score_min, score_max):
+    """Queries events and shows them in a table"""
+    starttime = time.time()
+    events = event_store.query(
+        hours=hours or 0, score_min=score_min, score_max=score_max
+    )
+    duration_ms = (time.time() - starttime) * 1000
+    rows = [
+        html.Tr(
+            [
+                html.Td(
+                    datetime.datetime.fromtimestamp(event["timestamp"]).strftime(
+                        "%Y-%m-%d %H:%M:%S"
+                    )
+                ),
+                html.Td(event["camera"]),
+                html.Td(round(event["score"], 2)),
+                html.Td(str(event["bbox"])),
+                html.Td(
+                    html.Img(src=f"/events/thumbnails/{event['thumbnail']}")
+                    if event["thumbnail"]
+                    else ""
+                ),
+            ]
+        )
+        for event in events
+    ]
+    table = dbc.Table(
+        [
+            html.Thead(
+                html.Tr(
+                    [
+                        html.Th("Time"),
+                        html.Th("Camera"),
+                        html.Th("Score"),
+                        html.Th("Box"),
+                        html.Th("Thumbnail"),
+                    ]
+                )
+            ),
+            html.Tbody(rows),
+        ],
+        striped=True,
+        size="sm",
+    )
+    return table, f"{len(events)} events found in {round(duration_ms, 1)} ms"
@@ -0,0 +1,75 @@
+"""
+PAGE: Shows the saved images as thumbnails, page by page
+"""
+
+import dash
+from dash import html, Output, Input
+import dash_bootstrap_components as dbc
+from pys.initialized_camera_connected_to_app import gallery
+import math
+import time
+from urllib.parse import quote
+
+print("REGISTER", __file__)
+dash.register_page(__name__, title="Gallery", name="feature-gallery")
+app = dash.get_app()
+
+#: int: number of images per page
+PAGE_SIZE = 24
+
+
+def create_layout():
+    """Creates layout of page"""
+    return html.Div(
+        [
+            html.H2("Gallery"),
+            html.P(id="gallery-summary", style={"font-style": "italic"}),
+            dbc.Pagination(
+                id="gallery-pagination",
+                max_value=max(1, math.ceil(gallery.count() / PAGE_SIZE)),
+                active_page=1,
+                fully_expanded=False,
+                first_last=True,
+            ),
+            dbc.Row(id="gallery-images", className="g-2"),
+        ]
+    )
+
+
+layout = create_layout
+
+
+@app.callback(
+    Output("gallery-images", "children"),
+    Output("gallery-summary", "children"),
+    Output("gallery-pagination", "max_value"),
+    Input("gallery-pagination", "active_page"),
+)
+def show_page(active_page):
+    """Shows thumbnails of a page, linked to the images"""
+    count = gallery.count()
+    entries = gallery.get_page((active_page or 1) - 1, PAGE_SIZE)
+    # the mtime in the URLs makes the cached responses invalid if an image changes
+    cards = [
+        dbc.Col(
+            html.A(
+                [
+                    html.Img(
+                        src=f"/gallery/thumbnails/{quote(entry['name'])}?v={int(entry['mtime'])}",
+                        style={"width": "100%"},
+                    ),
+                    html.Div(
+                        time.strftime(
+                            "%Y-%m-%d %H:%M:%S", time.localtime(entry["mtime"])
+                        ),
+                        style={"font-size": "small"},
+                    ),
+                ],
+                href=f"/gallery/images/{quote(entry['name'])}?v={int(entry['mtime'])}",
+                target="_blank",
+            ),
+            className="col-6 col-sm-4 col-md-3 col-lg-2",
+        )
+        for entry in entries
+    ]
+    return cards, f"{count} images", max(1, math.ceil(count / PAGE_SIZE))
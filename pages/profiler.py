@@ -0,0 +1,119 @@
+"""
+PAGE: Allows to profile the running app for some seconds
+"""
+
+import dash
+from dash import html, Output, Input, State, dcc
+import dash_bootstrap_components as dbc
+from pys.profiler import profiler
+
+print("REGISTER", __file__)
+dash.register_page(__name__, title="Profiler", name="profiler")
+app = dash.get_app()
+
+
+def create_layout():
+    """Creates layout of page"""
+    status = profiler.get_status()
+    controls = dbc.Row(
+        [
+            dbc.Col(
+                [
+                    dbc.Label("Seconds"),
+                    dcc.Input(
+                        id="profiler-seconds", type="number", value=10, min=1, max=300
+                    ),
+                ]
+            ),
+            dbc.Col(
+                dbc.Button(
+                    [html.I(className="bi bi-play-fill"), "Start"],
+                    id="profiler-start-button",
+                    n_clicks=0,
+                    className="m-1 d-md-block",
+                )
+            ),
+            dbc.Col(
+                html.A(
+                    "Collapsed stacks",
+                    href="/profiler/collapsed",
+                    className="m-1 d-md-block",
+                )
+            ),
+        ],
+        className="mb-2",
+    )
+    return html.Div(
+        [
+            html.H2("Profiler"),
+            html.P(
+                "Samples the capture threads and the web threads for some seconds.",
+                style={"font-style": "italic"},
+            ),
+            controls,
+            html.P(id="profiler-status"),
+            html.Div(id="profiler-table"),
+            dcc.Interval(
+                id="interval-profiler", interval=1000, disabled=not status["running"]
+            ),
+        ]
+    )
+
+
+layout = create_layout
+
+
+@app.callback(
+    Output("interval-profiler", "disabled", allow_duplicate=True),
+    Input("profiler-start-button", "n_clicks"),
+    State("profiler-seconds", "value"),
+    prevent_initial_call=True,
+)
+def click_profiler_start_button(n_clicks, seconds):
+    """Starts profiling"""
+    profiler.start(min(seconds or 10, 300))
+    return False
+
+
+@app.callback(
+    Output("profiler-status", "children"),
+    Output("profiler-table", "children"),
+    Output("interval-profiler", "disabled", allow_duplicate=True),
+    Input("interval-profiler", "n_intervals"),
+    prevent_initial_call="initial_duplicate",
+)
+def update_profiler_result(n_intervals):
+    """Shows status and, when done, the functions seen most often"""
+    status = profiler.get_status()
+    if status["running"]:
+        text = f"Running, {round(status['remaining'])} s remaining, {status['samples']} samples"
+        return text, dash.no_update, False
+    rows = [
+        html.Tr(
+            [
+                html.Td(entry["function"]),
+                html.Td(entry["self"]),
+                html.Td(entry["total"]),
+                html.Td(f"{entry['self_percent']} %"),
+            ]
+        )
+        for entry in profiler.get_top(30)
+    ]
+    table = dbc.Table(
+        [
+            html.Thead(
+                html.Tr(
+                    [
+                        html.Th("Function"),
+                        html.Th("Self"),
+                        html.Th("Total"),
+                        html.Th("Self %"),
+                    ]
+                )
+            ),
+            html.Tbody(rows),
+        ],
+        striped=True,
+        size="sm",
+    )
+    return f"{status['samples']} samples", table, True
@@ -5,19 +5,13 @@ PAGE: Simplification of page cameracontrol which allows only to pick up the vide
 import dash
 from dash import html, Output, Input, State, dcc, callback, get_app
 import dash_bootstrap_components as dbc
-from pys.initialized_camera_connected_to_app import cam
+from pys.initialized_camera_connected_to_app import cam, cams, gallery
 from pys.camera import encode_frame_as_jpg
-import os
 
 print("REGISTER", __file__)
 dash.register_page(__name__, title="Videostream", name="feature-camera-stream")
 app = dash.get_app()
 
-# SOME CONFIGURATION
-APPLICATION_DIR = os.path.dirname(__file__)
-FOLDER_TO_SAVE_IMAGES = "saved"
-PATH_TO_SAVE_IMAGES = os.path.join(APPLICATION_DIR, FOLDER_TO_SAVE_IMAGES)
-
 # LAYOUT
 
 # STATIC ELEMENTS
@@ -56,6 +50,27 @@ def create_layout(cam=cam):
                 ),
             ]
         ),
+        dbc.Row(
+            dbc.Col(
+                dbc.Switch(
+                    id="stream-tiles-switch",
+                    label="Changed tiles only",
+                    value=False,
+                    className="m-1",
+                ),
+            ),
+        ),
+        dbc.Row(
+            dbc.Col(
+                dbc.RadioItems(
+                    options=list(cams.keys()),
+                    value=cam.name,
+                    id="stream-camera-select",
+                    className="m-1",
+                ),
+            ),
+            style={} if len(cams) > 1 else {"display": "none"},
+        ),
     ]
 
     row_hr_image = dbc.Row(
@@ -98,6 +113,13 @@ def create_layout(cam=cam):
                                 width="100%",
                                 style={"padding-bottom": "4px"},
                             ),
+                            # drawn by assets/tiles.js while data-src is set
+                            html.Canvas(
+                                id="video-tiles",
+                                width=640,
+                                height=480,
+                                style={"width": "100%", "display": "none"},
+                            ),
                         ],
                         className="col-sm-9 col-12",
                     ),
@@ -116,41 +138,81 @@ def create_layout(cam=cam):
 layout = create_layout
 
 
+@app.callback(
+    Output("video-feed", "src"),
+    Output("video-feed", "style"),
+    Output("video-tiles", "data-src"),
+    Output("video-tiles", "style"),
+    Input("stream-camera-select", "value"),
+    Input("stream-tiles-switch", "value"),
+    prevent_initial_call=True,
+)
+def select_camera(name, tiles):
+    """Switches videostream to selected camera, as JPEGs or as changed tiles drawn to a canvas"""
+    hidden = {"display": "none"}
+    if tiles:
+        # the image without source closes the connection of the JPEG stream
+        return "", hidden, f"/video_tiles/{name}?w=640", {"width": "100%"}
+    return f"/video_feed/{name}", {"padding-bottom": "4px"}, "", hidden
+
+
 @app.callback(
     Output("stream-camera-save-button", "disabled", allow_duplicate=True),
     Output("stream-camera-save-button", "children", allow_duplicate=True),
     Input("stream-camera-save-button", "n_clicks"),
+    State("stream-camera-select", "value"),
     prevent_initial_call=True,
 )
-def click_camera_save_button(n_clicks):
+def click_camera_save_button(n_clicks, name):
     """Save-image-button"""
-    filepath = os.path.join(PATH_TO_SAVE_IMAGES, "saved_image.jpg")
+    controller = cams.get(name, cam)
+    filepath = gallery.new_filepath(prefix=controller.name)
     print(" - SAVEFILE:", filepath)
-    cam.save_stored_image_to_file(filepath)
+    controller.save_stored_image_to_file(filepath)
+    gallery.add(filepath)
     return True, VALUE_BUTTON_SAVED_IMAGE
 
 
+def get_skipped_note(controller) -> list:
+    """Returns note on the transformations not applied to the high resolution image"""
+    skipped = controller.get_stored_image_skipped()
+    if not skipped:
+        return []
+    return [
+        html.P(
+            "Not applied to the still, they need previous frames: "
+            + ", ".join(skipped),
+            style={"font-style": "italic"},
+        )
+    ]
+
+
 @app.callback(
     Output("stream-col-hr-image", "children"),
     Output("stream-camera-save-button", "disabled", allow_duplicate=True),
     Output("stream-camera-save-button", "children", allow_duplicate=True),
     Output("stream-row-hr-image", "style"),
     Input("stream-camera-hr-button", "n_clicks"),
+    State("stream-camera-select", "value"),
     prevent_initial_call=True,
 )
-def click_hr_button(n_clicks):
+def click_hr_button(n_clicks, name):
     """Take HR-Image"""
     if n_clicks % 2 == 0:
         return [], True, VALUE_BUTTON_SAVE_IMAGE, {"display": "none"}
     else:
-        dataURI = encode_frame_as_jpg(cam.get_and_store_last_transformed_frame())
+        controller = cams.get(name, cam)
+        dataURI = encode_frame_as_jpg(controller.get_and_store_hr_frame())
         return (
-            html.Img(
-                src=dataURI,
-                id="image-hr",
-                width="100%",
-                style={"padding-bottom": "4px"},
-            ),
+            [
+                html.Img(
+                    src=dataURI,
+                    id="image-hr",
+                    width="100%",
+                    style={"padding-bottom": "4px"},
+                )
+            ]
+            + get_skipped_note(controller),
             False,
             VALUE_BUTTON_SAVE_IMAGE,
             {"display": "flex"},
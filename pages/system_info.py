@@ -4,10 +4,13 @@ PAGE: Provides some information about the platform.
 
 import dash
 from dash import html, __version__
+from functools import lru_cache
 import platform
 import platform, socket, re, uuid, psutil
 
 
+# the information is read once at the first request, the lookup of the address may take long
+@lru_cache(maxsize=1)
 def getSystemInfo():
     info = {}
     info["Hostname"] = socket.gethostname()
@@ -24,16 +27,18 @@ def getSystemInfo():
 
 dash.register_page(__name__, title="System Info", name="system_info")
 
-layout = html.Div(
-    [
-        html.H2("System Information"),
-        html.P(
-            "Some information read from the server.",
-            style={"font-style": "italic"},
-        ),
-        html.Div(
-            [html.Div(f"{key}: {value}") for key, value in getSystemInfo().items()]
-            + [html.P(f"Dash Version: {__version__}")]
-        ),
-    ]
-)
+def layout():
+    """Creates layout when page is loaded"""
+    return html.Div(
+        [
+            html.H2("System Information"),
+            html.P(
+                "Some information read from the server.",
+                style={"font-style": "italic"},
+            ),
+            html.Div(
+                [html.Div(f"{key}: {value}") for key, value in getSystemInfo().items()]
+                + [html.P(f"Dash Version: {__version__}")]
+            ),
+        ]
+    )
@@ -0,0 +1,257 @@
+"""
+PAGE: Shows the load of the system live, correlated with the frame time of the cameras
+"""
+
+import dash
+from dash import html, Output, Input, State, dcc
+import dash_bootstrap_components as dbc
+from pys.initialized_camera_connected_to_app import cams, system_monitor, thread_roles
+from pys.threadroles import OTHER, NATIVE
+from functools import partial
+import time
+
+print("REGISTER", __file__)
+dash.register_page(__name__, title="System Monitor", name="system_monitor")
+app = dash.get_app()
+
+
+def get_value(group, key, sample):
+    """Returns value of a gauge or rate of a sample, None if not sampled"""
+    return sample[group].get(key)
+
+
+def get_traces() -> list:
+    """Returns traces of the graph as (name, axis, function returning value of a sample),
+    the traces are fixed when the page is loaded
+    """
+    traces = [
+        ("CPU %", "y", lambda sample: sample["cpu"]),
+        ("App CPU %", "y", lambda sample: sample["process_cpu"]),
+        ("Memory %", "y", lambda sample: sample["memory"]),
+        ("Temperature °C", "y2", lambda sample: sample["temperature"]),
+        (
+            "Throttled",
+            "y2",
+            # current state only, the higher bits tell what happened since boot
+            lambda sample: (
+                sample["temperature"] if (sample["throttled"] or 0) & 0xF else None
+            ),
+        ),
+        ("Frequency MHz", "y3", lambda sample: sample["frequency"]),
+    ]
+    for name in cams:
+        frame_ms = partial(get_value, "gauges", f"{name}/frame_ms")
+        fps = partial(get_value, "rates", f"{name}/fps")
+        traces.append((f"{name} frame ms", "y4", frame_ms))
+        traces.append((f"{name} fps", "y5", fps))
+    if thread_roles is not None:
+        for role in list(thread_roles.patterns) + [OTHER, NATIVE]:
+            cpu = partial(get_value, "gauges", f"roles/{role}")
+            traces.append((f"{role} CPU %", "y", cpu))
+    return traces
+
+
+def format_time(timestamp) -> str:
+    """Returns local time as understood by plotly"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) + (
+        f".{int(timestamp % 1 * 1000):03d}"
+    )
+
+
+def get_columns(samples) -> tuple:
+    """Returns x values and y values of each trace of samples"""
+    x = [format_time(sample["time"]) for sample in samples]
+    y = [[value(sample) for sample in samples] for _, _, value in get_traces()]
+    return x, y
+
+
+def build_figure(samples) -> dict:
+    """Returns figure of samples, the CPU, the temperature and the cameras share the time axis"""
+    x, y = get_columns(samples)
+    data = [
+        dict(
+            type="scatter",
+            x=x,
+            y=values,
+            name=name,
+            yaxis=axis,
+            mode="markers" if name == "Throttled" else "lines",
+            marker=dict(color="red", size=6) if name == "Throttled" else None,
+            # the roles besides capture and web are shown on demand
+            visible=(
+                "legendonly"
+                if name.endswith(" CPU %")
+                and name not in ("capture CPU %", "web CPU %", "App CPU %")
+                else True
+            ),
+        )
+        for (name, axis, _), values in zip(get_traces(), y)
+    ]
+    return dict(
+        data=data,
+        layout=dict(
+            margin=dict(l=0, r=0, b=0, t=30),
+            height=600,
+            plot_bgcolor="white",
+            xaxis=dict(type="date", anchor="y4"),
+            # CPU of the app and of the roles in % of a core, may exceed 100
+            yaxis=dict(domain=[0.7, 1], rangemode="tozero", title=dict(text="%")),
+            yaxis2=dict(domain=[0.37, 0.63], title=dict(text="°C")),
+            yaxis3=dict(
+                overlaying="y2", side="right", showgrid=False, title=dict(text="MHz")
+            ),
+            yaxis4=dict(domain=[0, 0.3], rangemode="tozero", title=dict(text="ms")),
+            yaxis5=dict(
+                overlaying="y4",
+                side="right",
+                showgrid=False,
+                rangemode="tozero",
+                title=dict(text="fps"),
+            ),
+        ),
+    )
+
+
+def create_layout():
+    """Creates layout of page, the graph starts with the samples kept by the monitor"""
+    if system_monitor is None:
+        return html.Div(
+            [
+                html.H2("System Monitor"),
+                html.P('Disabled by "system_monitor": null in config.json.'),
+            ]
+        )
+    samples = system_monitor.get_samples()
+    return html.Div(
+        [
+            html.H2("System Monitor"),
+            html.P(
+                "Load, temperature and throttling of the system and the frame time "
+                "of the cameras.",
+                style={"font-style": "italic"},
+            ),
+            html.P(id="sysmon-status"),
+            dcc.Graph(
+                id="sysmon-graph",
+                figure=build_figure(samples),
+                config=dict(displayModeBar=False),
+            ),
+            html.Div(id="sysmon-threads"),
+            dcc.Store(id="sysmon-seq", data=samples[-1]["seq"] if samples else None),
+            dcc.Interval(
+                id="interval-sysmon", interval=int(system_monitor.interval * 1000)
+            ),
+        ]
+    )
+
+
+layout = create_layout
+
+
+@app.callback(
+    Output("sysmon-graph", "extendData"),
+    Output("sysmon-seq", "data"),
+    Input("interval-sysmon", "n_intervals"),
+    State("sysmon-seq", "data"),
+    prevent_initial_call=True,
+)
+def update_graph(n_intervals, seq):
+    """Appends samples taken since the last update, older points drop out of the graph"""
+    samples = system_monitor.get_samples(seq)
+    if not samples:
+        raise dash.exceptions.PreventUpdate
+    x, y = get_columns(samples)
+    indices = list(range(len(y)))
+    return (
+        [dict(x=[x] * len(y), y=y), indices, system_monitor.history],
+        samples[-1]["seq"],
+    )
+
+
+@app.callback(
+    Output("sysmon-status", "children"),
+    Output("sysmon-threads", "children"),
+    Input("sysmon-seq", "data"),
+)
+def update_status(seq):
+    """Shows last sample in numbers and the threads using the most CPU"""
+    status = system_monitor.get_status()
+    sample = status["latest"]
+    if sample is None:
+        return "No sample yet.", []
+    throttled = ", ".join(status["throttled"]) or "no"
+    cores = " ".join(f"{value:.0f}" for value in sample["cores"])
+    temperature = sample["temperature"]
+    frequency = sample["frequency"]
+    text = (
+        f"CPU {sample['cpu']:.0f} % (cores {cores}), "
+        f"app {sample['process_cpu']:.0f} %, memory {sample['memory']:.0f} %, "
+        f"temperature {'-' if temperature is None else temperature} °C, "
+        f"frequency {'-' if frequency is None else round(frequency)} MHz, "
+        f"throttled: {throttled}, sample took {sample['duration_ms']:.1f} ms"
+    )
+    table = dbc.Table(
+        [html.Thead(html.Tr([html.Th("Thread"), html.Th("CPU %")]))]
+        + [
+            html.Tbody(
+                [
+                    html.Tr(
+                        [html.Td(thread["name"]), html.Td(f"{thread['cpu']:.1f}")]
+                    )
+                    for thread in sample["threads"]
+                ]
+            )
+        ],
+        size="sm",
+        striped=True,
+    )
+    if thread_roles is None:
+        return text, table
+    report = thread_roles.get_report()
+    roles = dbc.Table(
+        [
+            html.Thead(
+                html.Tr(
+                    [
+                        html.Th("Role"),
+                        html.Th("CPU %"),
+                        html.Th("Threads"),
+                        html.Th("CPUs"),
+                        html.Th("Nice"),
+                    ]
+                )
+            )
+        ]
+        + [
+            html.Tbody(
+                [
+                    html.Tr(
+                        [
+                            html.Td(role),
+                            html.Td(f"{entry['cpu']:.1f}"),
+                            html.Td(len(entry["threads"])),
+                            html.Td(
+                                "all"
+                                if entry["cpus"] is None
+                                else ",".join(map(str, entry["cpus"]))
+                            ),
+                            html.Td(
+                                "-" if entry["nice"] is None else entry["nice"],
+                                title=entry["error"],
+                            ),
+                        ]
+                    )
+                    for role, entry in report.get("roles", {}).items()
+                    if entry["threads"]
+                ]
+            )
+        ],
+        size="sm",
+        striped=True,
+    )
+    return text, [
+        html.H5(f"Roles (OpenCV threads: {report.get('opencv_threads')})"),
+        roles,
+        html.H5("Threads"),
+        table,
+    ]
@@ -0,0 +1,116 @@
+"""
+Checks the batch processing against a generated video and a folder of images.
+The output of chunks processed in parallel has to equal the output of one pass.
+No camera is needed, run from the root of the repository:
+
+    python -m pys._test_batch
+"""
+
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+from pys.batch import get_reliable_frame_count
+
+
+def make_frames(n, size=(160, 120)):
+    """Returns frames with a moving square and the frame number"""
+    frames = []
+    for i in range(n):
+        frame = np.full((size[1], size[0], 3), 40, np.uint8)
+        x = (i * 5) % (size[0] - 20)
+        cv2.rectangle(frame, (x, 40), (x + 20, 60), (255, 255, 255), -1)
+        cv2.putText(frame, str(i), (5, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0))
+        frames.append(frame)
+    return frames
+
+
+def read_video(path) -> list:
+    """Returns all frames of a video"""
+    reader = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        success, frame = reader.read()
+        if not success:
+            break
+        frames.append(frame)
+    reader.release()
+    return frames
+
+
+def run_batch(*args):
+    """Runs the command-line tool, raises on failure"""
+    subprocess.run(
+        [sys.executable, "-m", "pys.batch", *args],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+if __name__ == "__main__":
+    folder = tempfile.mkdtemp(prefix="test_batch_")
+    frames = make_frames(70)
+
+    video = os.path.join(folder, "input.avi")
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"MJPG"), 25, (160, 120))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    images = os.path.join(folder, "images")
+    os.makedirs(images)
+    for i, frame in enumerate(frames[:30]):
+        cv2.imwrite(os.path.join(images, f"{i:04d}.png"), frame)
+
+    assert get_reliable_frame_count(video, 16) == 70
+    assert get_reliable_frame_count(images, 16) == 30
+    assert get_reliable_frame_count(os.path.join(folder, "missing.avi"), 16) is None
+    print("- frame count: OK")
+
+    for name, source, count in (("video", video, 70), ("images", images, 30)):
+        chunked = os.path.join(folder, f"{name}_chunked.avi")
+        single = os.path.join(folder, f"{name}_single.avi")
+        scores = os.path.join(folder, f"{name}.csv")
+        options = ["--basic", "Vflip", "--registered", "SMD"]
+        # warmup over all previous frames gives the detector the state of one pass
+        chunking = ["--chunk", "16", "--workers", "2", "--warmup", "80"]
+        run_batch(source, chunked, *options, *chunking)
+        run_batch(source, single, *options, "--sequential", "--csv", scores)
+        chunked_frames = read_video(chunked)
+        single_frames = read_video(single)
+        assert len(chunked_frames) == len(single_frames) == count
+        # with lossless chunks the output is compressed once, like in one pass
+        equal = all(
+            np.array_equal(a, b) for a, b in zip(chunked_frames, single_frames)
+        )
+        assert equal, f"{name}: chunked output differs from one pass"
+        with open(scores) as f:
+            assert len(list(csv.reader(f))) == count + 1
+        print(f"- {name}: OK, {count} frames")
+
+    # the scores are taken from any motion detection, not only from SMD
+    for engine in ("MOG2", "FD"):
+        scores = os.path.join(folder, f"{engine}.csv")
+        output = os.path.join(folder, f"{engine}.avi")
+        options = ["--registered", engine, "--sequential", "--csv", scores]
+        run_batch(video, output, *options)
+        with open(scores) as f:
+            rows = list(csv.reader(f))[1:]
+        assert len(rows) == 70
+        assert all(float(row[2]) >= 0 for row in rows), f"{engine}: scores missing"
+        print(f"- scores of {engine}: OK")
+
+    # an input without frames fails instead of writing nothing
+    empty = os.path.join(folder, "empty")
+    os.makedirs(empty)
+    result = subprocess.run(
+        [sys.executable, "-m", "pys.batch", empty, os.path.join(folder, "x.avi")],
+        capture_output=True,
+    )
+    assert result.returncode != 0
+    print("- empty input: OK")
+    print("DONE", folder)
@@ -0,0 +1,163 @@
+"""
+Checks the motion event bus against a local HTTP server standing in for a webhook
+endpoint, a hanging endpoint and a slow subscriber. No camera is needed,
+run from the root of the repository:
+
+    python -m pys._test_event_bus
+"""
+
+import json
+import os
+import socket
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import cv2
+import numpy as np
+
+from pys.events import (
+    EventSubscriber,
+    FileSubscriber,
+    MotionEventBus,
+    RecorderSubscriber,
+    WebhookSubscriber,
+    create_subscriber,
+)
+from pys.history import FrameHistory
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Collects the JSON posted"""
+
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        WebhookHandler.received.append(json.loads(body))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowSubscriber(EventSubscriber):
+    """Takes a second per event"""
+
+    def handle(self, event):
+        time.sleep(1.0)
+
+
+class FakeController:
+    """Stands in for CameraController, provides the history only"""
+
+    def __init__(self, history):
+        self.history = history
+
+    def get_history(self):
+        return self.history
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+if __name__ == "__main__":
+    frame = np.zeros((120, 160, 3), np.uint8)
+    folder = tempfile.mkdtemp(prefix="test_event_bus_")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    # accepts connections but never answers, like a hanging endpoint
+    dead = socket.socket()
+    dead.bind(("127.0.0.1", 0))
+    dead.listen(100)
+
+    _, jpeg = cv2.imencode(".jpg", frame)
+    history = FrameHistory(seconds=60)
+    bus = MotionEventBus(debounce_frames=3, gap=0.5, cooldown=1.0)
+    webhook = WebhookSubscriber(f"http://127.0.0.1:{server.server_port}/hook")
+    hanging = WebhookSubscriber(
+        f"http://127.0.0.1:{dead.getsockname()[1]}/hook",
+        timeout=2,
+        name="hanging",
+        maxsize=2,
+    )
+    slow = SlowSubscriber("slow", maxsize=2)
+    logfile = os.path.join(folder, "events.jsonl")
+    recorder = RecorderSubscriber(
+        {"cam": FakeController(history)}, folder, before=0.2, after=0.2
+    )
+    for subscriber in (webhook, hanging, slow, FileSubscriber(logfile), recorder):
+        bus.add_subscriber(subscriber)
+
+    # debouncing: the third frame with motion starts the event, further frames do not
+    now = time.time()
+    started = [
+        bus.publish(now + i * 0.05, 5.0 + i, (1, 2, 3, 4), frame, camera="cam")
+        for i in range(10)
+    ]
+    for i in range(10):
+        history.add(now + i * 0.05, jpeg.tobytes())
+    assert started == [False, False, True] + [False] * 7, started
+    print("- debouncing: OK")
+
+    # the event ends after the gap and is posted to the local server
+    assert wait_for(lambda: len(WebhookHandler.received) == 2), WebhookHandler.received
+    start, end = WebhookHandler.received
+    assert start["kind"] == "start" and end["kind"] == "end"
+    assert end["score"] == 14.0 and abs(end["duration"] - 0.35) < 1e-6, end
+    print("- webhook: OK")
+
+    # no new event during cooldown
+    assert not any(
+        bus.publish(time.time(), 5.0, (1, 2, 3, 4), frame, camera="cam")
+        for _ in range(5)
+    )
+    print("- cooldown: OK")
+
+    # a hanging endpoint and a slow subscriber do not delay publishing
+    durations = []
+    for n in range(200):
+        # each burst of motion starts an event of another camera
+        timestamp = time.time()
+        for i in range(3):
+            starttime = time.perf_counter()
+            bus.publish(timestamp + i * 0.01, 5, (1, 2, 3, 4), frame, camera=f"c{n}")
+            durations.append(time.perf_counter() - starttime)
+    # single calls may wait for the GIL held by another thread (switch interval 5 ms)
+    p99 = np.percentile(durations, 99)
+    assert p99 < 0.002 and max(durations) < 0.05, (p99, max(durations))
+    status = {s["name"]: s for s in bus.get_status()["subscribers"]}
+    assert status["hanging"]["dropped"] > 0 and status["slow"]["dropped"] > 0
+    print(
+        f"- publishing with blocked subscribers: OK, "
+        f"p99 {1000 * p99:.2f} ms, max {1000 * max(durations):.2f} ms"
+    )
+
+    # the log file and the recording of the first event
+    videos = lambda: [name for name in os.listdir(folder) if name.endswith(".avi")]
+    assert wait_for(lambda: len(videos()) == 1), videos()
+    with open(logfile) as f:
+        kinds = [json.loads(line)["kind"] for line in f]
+    assert kinds[:2] == ["start", "end"], kinds
+    assert cv2.VideoCapture(os.path.join(folder, videos()[0])).read()[0]
+    print("- file and recorder: OK")
+
+    # a recorder without any camera with history is rejected when it is created
+    try:
+        config = {"type": "recorder", "folder": folder}
+        create_subscriber(config, {"x": FakeController(None)})
+        assert False, "recorder without history accepted"
+    except ValueError:
+        pass
+    print("- recorder without history: OK")
+
+    assert wait_for(lambda: hanging.errors > 0, timeout=10)
+    print("DONE", bus.get_status())
+    server.shutdown()
@@ -0,0 +1,152 @@
+"""
+Checks the zero-copy mode of AdapterPiCamera against a fake picamera2 module.
+No camera is needed, run from the root of the repository:
+
+    python -m pys._test_zero_copy
+"""
+
+import time
+from threading import Thread
+
+import numpy as np
+import pys.camera as camera
+
+
+class FakeRequest:
+    """Stands in for picamera2.CompletedRequest, owns one buffer"""
+
+    def __init__(self, buffer, owner):
+        self.buffer = buffer
+        self.owner = owner
+        self.released = False
+
+    def release(self):
+        assert not self.released, "request released twice"
+        self.released = True
+        self.owner.released += 1
+
+
+class FakeMappedArray:
+    """Stands in for picamera2.MappedArray, maps the buffer of a request"""
+
+    def __init__(self, request, stream):
+        self.__request = request
+        self.array = None
+
+    def __enter__(self):
+        assert not self.__request.released, "mapping a released request"
+        self.array = self.__request.buffer
+        return self
+
+    def __exit__(self, *args):
+        self.array = None
+
+
+class FakePicamera2:
+    """Stands in for picamera2.Picamera2"""
+
+    sensor_modes = [dict(size=(640, 480), bit_depth=10)]
+    sensor_resolution = (1280, 960)
+
+    def __init__(self, camera_num=0):
+        self.captured = 0
+        self.released = 0
+        self.copies = 0
+        self.buffers = []
+        self.config = None
+
+    def create_still_configuration(self, main, lores, sensor, **kwargs):
+        return dict(main=main, lores=lores, sensor=sensor, **kwargs)
+
+    def configure(self, config):
+        self.config = config
+
+    def camera_configuration(self):
+        return self.config
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+    def capture_request(self):
+        w, h = self.config["main"]["size"]
+        buffer = np.random.randint(0, 255, (h, w, 3), dtype=np.uint8)
+        self.buffers.append(buffer)
+        self.captured += 1
+        return FakeRequest(buffer, self)
+
+    def switch_mode_and_capture_array(self, config, stream):
+        assert self.captured == self.released, "request held while switching mode"
+        w, h = config["main"]["size"]
+        return np.zeros((h, w, 3), dtype=np.uint8)
+
+    def capture_array(self, stream):
+        self.copies += 1
+        w, h = self.config["main"]["size"]
+        return np.zeros((h, w, 3), dtype=np.uint8)
+
+
+class FakeModule:
+    Picamera2 = FakePicamera2
+    MappedArray = FakeMappedArray
+
+
+def shares_any_buffer(array, pc):
+    return any(np.shares_memory(array, buffer) for buffer in pc.buffers)
+
+
+if __name__ == "__main__":
+    camera.picamera2 = FakeModule
+    adapter = camera.AdapterPiCamera(0, zero_copy=True)
+    pc = adapter._AdapterPiCamera__pc
+    assert pc.config["main"]["format"] == "RGB888"
+    cam = camera.CameraController(adapter)
+
+    # no transformation: the frame kept has to be detached from the buffer
+    for _ in range(5):
+        cam.single_run_get_frame()
+    assert pc.copies == 0, "capture_array was used"
+    assert pc.captured == pc.released, "buffer not released"
+    assert not shares_any_buffer(cam._last_frame_br, pc)
+    assert cam._last_frame is None, "raw frame copied without request"
+    print("- without transformations: OK")
+
+    # transformations allocating new images: nothing has to be copied
+    cam.set_active_transformations("basic", ["Vflip"])
+    cam.set_active_transformations("registered", ["smooth", "SMD"])
+    for _ in range(5):
+        cam.single_run_get_frame()
+    assert pc.captured == pc.released
+    assert not shares_any_buffer(cam._last_frame_br, pc)
+    print("- with transformations: OK")
+
+    # raw frame is copied on request only, the request waits for the next frame
+    cam._CameraController__running = True
+    requested = []
+    waiter = Thread(target=lambda: requested.append(cam.get_last_frame()))
+    waiter.start()
+    while not cam._CameraController__retain_raw_frame:
+        time.sleep(0.01)
+    cam.single_run_get_frame()
+    waiter.join(2)
+    assert requested and requested[0] is cam._last_frame
+    assert cam._last_frame is not None
+    assert not shares_any_buffer(cam._last_frame, pc)
+    assert np.array_equal(cam._last_frame, pc.buffers[-1])
+    print("- retained raw frame: OK")
+
+    # high resolution image is taken after the buffer was returned
+    cam._CameraController__running = False
+    hr_image = cam.get_and_store_hr_frame()
+    assert hr_image.shape == (960, 1280, 3), hr_image.shape
+    assert pc.captured == pc.released, "buffer held while switching mode"
+    print("- high resolution still: OK")
+
+    adapter.release()
+    assert pc.captured == pc.released
+    print("DONE", pc.captured, "captures,", pc.copies, "copies by capture_array")
@@ -0,0 +1,299 @@
+"""
+Command-line tool applying the transformations of CameraController offline
+to a video file or a folder of images, e.g. to tune the motion detection on recorded footage.
+The frames are split into chunks processed by a pool of processes. Stateful transformations
+(temporal smoothing, motion detection) get some frames before each chunk to warm up.
+Chunks are kept as PNG until they are joined, so the output is compressed only once.
+Videos reporting a wrong number of frames or seeking inexactly are read in one pass.
+Run from the root of the repository:
+
+    python -m pys.batch recording.mp4 output.avi --registered SMD --csv scores.csv
+    python -m pys.batch frames/ output.avi --registered smooth SMD --set SMD.action_threshold=8
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import pys.camera as camera
+
+
+def parse_settings(settings) -> dict:
+    """Parses parameters given as TRANSFORMATION.PARAMETER=VALUE
+
+    Args:
+        settings (list): parameters as text
+
+    Returns:
+        dict: values by (transformation, parameter)
+    """
+    values = {}
+    for setting in settings:
+        key, value = setting.split("=", 1)
+        transformation, parameter = key.rsplit(".", 1)
+        value = float(value)
+        values[(transformation, parameter)] = int(value) if value.is_integer() else value
+    return values
+
+
+def get_fourcc(filepath) -> int:
+    """Returns codec matching the extension of the output file
+
+    Args:
+        filepath (str): output file
+
+    Returns:
+        int: fourcc
+    """
+    if filepath.lower().endswith(".mp4"):
+        return cv2.VideoWriter_fourcc(*"mp4v")
+    return cv2.VideoWriter_fourcc(*"MJPG")
+
+
+def get_reliable_frame_count(path, chunk) -> int:
+    """Returns number of frames if the frames can be split into chunks by seeking.
+    Some video files report a wrong number of frames or seek inexactly, they are read
+    in one pass instead.
+
+    Args:
+        path (str): video file or folder of images
+        chunk (int): frames per chunk, the start of the second chunk is checked
+
+    Returns:
+        int: number of frames, None if the video has to be read in one pass
+    """
+    if os.path.isdir(path):
+        adapter = camera.AdapterVideoFile(path, realtime=False, loop=False)
+        return adapter.get_frame_count()
+    vc = cv2.VideoCapture(path)
+    try:
+        count = int(vc.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count <= 0:
+            return None
+        # the frame at the start of the second chunk is read sequentially and by seeking
+        target = min(chunk, count - 1)
+        for _ in range(target + 1):
+            success, sequential = vc.read()
+            if not success:
+                return None
+        vc.set(cv2.CAP_PROP_POS_FRAMES, target)
+        success, seeked = vc.read()
+        if not success or not np.array_equal(sequential, seeked):
+            return None
+        # the last frame reported exists and is the last one
+        vc.set(cv2.CAP_PROP_POS_FRAMES, count - 1)
+        if not vc.read()[0] or vc.read()[0]:
+            return None
+        return count
+    finally:
+        vc.release()
+
+
+def iterate_chunk(task):
+    """Yields processed frames of a chunk with the motion score of the first active
+    motion detection, e.g. SMD, MOG2, KNN, FD or Flow
+
+    Args:
+        task (dict): description of chunk and transformations, 'end' None for all frames
+
+    Yields:
+        tuple: frame, score (None without motion detection)
+    """
+    warmup_start = max(0, task["start"] - task["warmup"])
+    adapter = camera.AdapterVideoFile(
+        task["input"],
+        realtime=False,
+        loop=False,
+        start=warmup_start,
+        end=task["end"],
+    )
+    cam = camera.CameraController(
+        adapter,
+        active_preprocessing_transformations=task["basic"],
+        active_postprocessing_transformations=task["post"],
+    )
+    cam.set_active_transformations("registered", task["registered"])
+    for (transformation, parameter), value in task["settings"].items():
+        cam.get_transformation("registered", transformation).parameter[
+            parameter
+        ].value = value
+    detector = cam.get_motion_engine()
+    index = warmup_start
+    try:
+        while True:
+            image = adapter.read()
+            if image is None:
+                break
+            cam.process_frame(image)
+            index += 1
+            if index <= task["start"]:
+                continue
+            result = detector.get_last_result() if detector else None
+            score = float(result.score) if result is not None else None
+            yield cam._last_frame_brp.astype("uint8"), score
+    finally:
+        adapter.release()
+
+
+def process_chunk(task) -> dict:
+    """Processes a chunk of frames, called in a worker process. The frames are written
+    as PNG, so they are compressed lossy only once when joined into the output.
+
+    Args:
+        task (dict): description of chunk and transformations
+
+    Returns:
+        dict: index of chunk, folder of frames and scores
+    """
+    # the pool provides the parallelism, OpenCV must not start threads of its own
+    cv2.setNumThreads(1)
+    os.makedirs(task["chunkfolder"], exist_ok=True)
+    scores = []
+    for frame, score in iterate_chunk(task):
+        cv2.imwrite(
+            os.path.join(task["chunkfolder"], f"{len(scores):06d}.png"),
+            frame,
+            [cv2.IMWRITE_PNG_COMPRESSION, 1],
+        )
+        scores.append(score)
+    return dict(index=task["index"], chunkfolder=task["chunkfolder"], scores=scores)
+
+
+def read_chunk(result):
+    """Yields frames of a chunk written by process_chunk and deletes them
+
+    Args:
+        result (dict): result of process_chunk
+
+    Yields:
+        np.array: frame
+    """
+    for number in range(len(result["scores"])):
+        yield cv2.imread(os.path.join(result["chunkfolder"], f"{number:06d}.png"))
+    shutil.rmtree(result["chunkfolder"], ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("input", help="video file or folder of images")
+    parser.add_argument("output", help="output video (.avi or .mp4)")
+    parser.add_argument("--basic", nargs="*", default=[], help="basic transformations")
+    parser.add_argument(
+        "--registered", nargs="*", default=[], help="registered transformations"
+    )
+    parser.add_argument("--post", nargs="*", default=[], help="post transformations")
+    parser.add_argument(
+        "--set",
+        nargs="*",
+        default=[],
+        dest="settings",
+        help="parameters as TRANSFORMATION.PARAMETER=VALUE",
+    )
+    parser.add_argument(
+        "--csv", help="writes motion scores of the first motion detection to this file"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=500, help="frames per chunk")
+    parser.add_argument(
+        "--warmup", type=int, default=50, help="frames processed before each chunk"
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="reads the input in one pass instead of chunks",
+    )
+    args = parser.parse_args()
+
+    source = camera.AdapterVideoFile(args.input, realtime=False, loop=False)
+    if not source.check():
+        parser.error(f"no frames found in {args.input}")
+    fps = source.get_fps()
+    source.release()
+    settings = parse_settings(args.settings)
+    task = dict(
+        input=args.input,
+        warmup=args.warmup,
+        basic=args.basic,
+        registered=args.registered,
+        post=args.post,
+        settings=settings,
+    )
+
+    count = (
+        None if args.sequential else get_reliable_frame_count(args.input, args.chunk)
+    )
+    tempdir = tempfile.mkdtemp(prefix="batch-")
+    if count is None:
+        # one pass in this process, the frames are written to the output directly
+        print(f"BATCH {args.input}: read in one pass")
+        chunks = [dict(task, index=0, start=0, end=None)]
+    else:
+        chunks = [
+            dict(
+                task,
+                index=index,
+                start=start,
+                end=min(start + args.chunk, count),
+                chunkfolder=os.path.join(tempdir, f"chunk{index:05d}"),
+            )
+            for index, start in enumerate(range(0, count, args.chunk))
+        ]
+        print(
+            f"BATCH {args.input}: {count} frames, {len(chunks)} chunks, "
+            f"{args.workers} workers"
+        )
+
+    starttime = time.time()
+    writer = None
+    frames = 0
+    csvfile = open(args.csv, "w", newline="") if args.csv else None
+    scorewriter = csv.writer(csvfile) if csvfile else None
+    if scorewriter:
+        scorewriter.writerow(["frame", "time_s", "score"])
+
+    def write(frame, score):
+        nonlocal writer, frames
+        if writer is None:
+            h, w = frame.shape[:2]
+            writer = cv2.VideoWriter(args.output, get_fourcc(args.output), fps, (w, h))
+        writer.write(frame)
+        if scorewriter:
+            scorewriter.writerow([frames, round(frames / fps, 3), score])
+        frames += 1
+
+    try:
+        if count is None:
+            for frame, score in iterate_chunk(chunks[0]):
+                write(frame, score)
+        else:
+            with multiprocessing.Pool(args.workers) as pool:
+                # chunks are joined in order while later chunks are still processed
+                for result in pool.imap(process_chunk, chunks):
+                    for frame, score in zip(read_chunk(result), result["scores"]):
+                        write(frame, score)
+                    elapsed = time.time() - starttime
+                    print(
+                        f" - chunk {result['index'] + 1}/{len(chunks)}: "
+                        f"{frames} frames, {frames / elapsed:.1f} frames/s"
+                    )
+    finally:
+        if writer is not None:
+            writer.release()
+        if csvfile:
+            csvfile.close()
+        shutil.rmtree(tempdir, ignore_errors=True)
+    if frames == 0:
+        raise SystemExit(f"no frames processed from {args.input}")
+    elapsed = time.time() - starttime
+    print(f"DONE {frames} frames in {elapsed:.1f} s, {frames / elapsed:.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
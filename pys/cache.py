@@ -0,0 +1,67 @@
+"""
+This module provides a cache for values built from a state described by a version,
+e.g. the layout of a page or a figure. The value is built once per version and shared
+by all requests, requests arriving while it is built wait for it instead of building it too.
+"""
+
+import time
+from threading import Lock
+
+
+class VersionedCache:
+    """Keeps one value and the version it was built for"""
+
+    def __init__(self, max_age=None):
+        """
+        Args:
+            max_age (float, optional): time in seconds a value is used even if the version
+                changed meanwhile, limits the rate of building for fast changing versions.
+                None to build a value for each new version.
+        """
+        #: float: time in seconds a value is used even if the version changed meanwhile
+        self.max_age = max_age
+        #: object: version of value
+        self.__version = None
+        #: object: value
+        self.__value = None
+        #: float: time value was built
+        self.__built = None
+        #: int: number of values built
+        self.builds = 0
+        #: int: number of requests served from the cache
+        self.hits = 0
+        #: Lock: one value is built at a time
+        self.__lock = Lock()
+
+    def get(self, version, build):
+        """Returns value of a version, built if needed
+
+        Args:
+            version (object): version of the state, compared by equality
+            build (callable): builds value without arguments
+
+        Returns:
+            tuple: version the value was built for and value, the version may be older
+                than the one asked for within max_age
+        """
+        with self.__lock:
+            if self.__built is not None and (
+                self.__version == version
+                or (
+                    self.max_age is not None
+                    and time.perf_counter() - self.__built < self.max_age
+                )
+            ):
+                self.hits += 1
+                return self.__version, self.__value
+            self.__value = build()
+            self.__version = version
+            self.__built = time.perf_counter()
+            self.builds += 1
+            return self.__version, self.__value
+
+    def clear(self):
+        """Drops value, the next request builds it"""
+        with self.__lock:
+            self.__built = None
+            self.__value = None
@@ -10,20 +10,36 @@ try:
 except Exception as e:
     picamera2 = None
 
+try:
+    import turbojpeg
+except Exception as e:
+    turbojpeg = None
+
 import base64
+import copy
+import os
 import time
-from collections import deque, OrderedDict
+from collections import Counter, deque, namedtuple, OrderedDict
 import pys.transformer as transformer
-from threading import Thread
+from pys.heatmap import MotionHeatmap
+from pys.history import FrameHistory
+from pys.latency import FrameMeta, LatencyTracker
+from pys.tiles import TileDeltaEncoder, pack_message, KEYFRAME
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Condition, Thread, Lock
 
 
 class AdapterOpenCV:
     """Adapter indented to access camera on PC and provide interface used by CameraController"""
 
-    def __init__(self):
-        """Encapsulates Object 'OpenCV VideoCapture'"""
+    def __init__(self, device=0):
+        """Encapsulates Object 'OpenCV VideoCapture'
+
+        Args:
+            device (int, optional): index of the camera device
+        """
         #: cv2.VideoCapture: Provides access to camera
-        self.vc = cv2.VideoCapture(0)
+        self.vc = cv2.VideoCapture(device)
         # reading image from camera in order to determine size of the image taken
         _, img = self.vc.read()
         h, w, _ = img.shape
@@ -47,6 +63,37 @@ class AdapterOpenCV:
         success, image = self.vc.read()
         return image
 
+    def is_zero_copy(self) -> bool:
+        """Returns True if images returned by read are views into buffers of the camera
+
+        Returns:
+            bool: False, images are owned by the caller
+        """
+        return False
+
+    def release_frame(self):
+        """Releases buffer of the image returned by read, nothing to do"""
+        pass
+
+    def capture_still(self) -> np.array:
+        """Returns image at the highest resolution available, same as read
+
+        Returns:
+            np.array: Image
+        """
+        return self.read()
+
+    def set_crop(self, roi) -> bool:
+        """Crops images at the camera, not supported
+
+        Args:
+            roi (tuple): region (x,y,w,h) relative to the full image, None for the full image
+
+        Returns:
+            bool: False, images must be cropped by the caller
+        """
+        return False
+
     def get_imagesize(self) -> tuple:
         """Returns size of images provides by the camera
 
@@ -74,14 +121,33 @@ class AdapterOpenCV:
 class AdapterPiCamera:
     """Adapter indented to access camera on RPI-OS (Bullseye or higher) and provide interface used by CameraController"""
 
-    def __init__(self, resolution=(160, 120)):
+    def __init__(
+        self, resolution=(160, 120), camera_num=0, zero_copy=False, still_mode="switch"
+    ):
         """Encapsulates Object Picamera2
 
         Args:
             resolution (tuple, optional): Image size (width,heiht)
+            camera_num (int, optional): index of the camera, if more than one is connected
+            zero_copy (bool, optional): read returns a view into the buffer of the camera request
+            still_mode (str, optional): how capture_still gets full resolution images:
+                'switch' switches the mode of the camera for one image,
+                'dual' configures the full resolution as main stream and reads the images from the stream lores
         """
         #: picamera.Picamera2: provides access to camera on RPi
-        self.__pc = picamera2.Picamera2()
+        self.__pc = picamera2.Picamera2(camera_num)
+        #: str: 'switch' or 'dual', see capture_still
+        self.__still_mode = still_mode
+        if still_mode == "dual" and zero_copy:
+            # images of stream lores are converted from YUV anyway
+            print(" - ZERO-COPY is not supported with still_mode dual")
+            zero_copy = False
+        #: bool: read returns a view into the buffer of the camera request
+        self.__zero_copy = zero_copy
+        #: CompletedRequest: request whose buffer is used by the last image read
+        self.__request = None
+        #: MappedArray: mapping of buffer of __request
+        self.__mapped_array = None
         #: tuple: image size aks resolution
         self.__imagesize = None
 
@@ -103,12 +169,37 @@ class AdapterPiCamera:
             else:
                 self.__imagesize = resolution = (160, 120)
 
+        #: tuple: size of full resolution images of capture_still (width,height)
+        self.__still_size = tuple(getattr(self.__pc, "sensor_resolution", self.__imagesize))
+        lores_dict = {}
+        if still_mode == "dual":
+            # format RGB888 of libcamera is stored as BGR, the stream lores is YUV420
+            main_dict = dict(size=self.__still_size, format="RGB888")
+            lores_dict = dict(size=self.__imagesize)
+            buffer_dict = {}
+        elif zero_copy:
+            # format RGB888 of libcamera is stored as BGR, so no conversion is needed
+            # a second buffer allows to capture while the pipeline holds the first one
+            main_dict = dict(size=self.__imagesize, format="RGB888")
+            buffer_dict = dict(buffer_count=2)
+        else:
+            main_dict = dict(size=self.__imagesize)
+            buffer_dict = {}
         #: dict: camera configuration set to Picamera2
         self.__camera_config = self.__pc.create_still_configuration(
-            main=dict(size=self.__imagesize),
-            lores={},
+            main=main_dict,
+            lores=lores_dict,
             sensor=sensor_dict,
+            **buffer_dict,
         )
+        #: dict: configuration the camera is switched to by capture_still
+        self.__still_config = None
+        if still_mode == "switch":
+            self.__still_config = self.__pc.create_still_configuration(
+                main=dict(size=self.__still_size, format="RGB888"),
+                lores={},
+                sensor={},
+            )
         self.__pc.configure(self.__camera_config)
         self.__pc.start()
 
@@ -134,12 +225,82 @@ class AdapterPiCamera:
         Returns:
             np.array: Image
         """
+        if self.__zero_copy:
+            self.release_frame()
+            self.__request = self.__pc.capture_request()
+            self.__mapped_array = picamera2.MappedArray(self.__request, "main")
+            return self.__mapped_array.__enter__().array
+        if self.__still_mode == "dual":
+            return cv2.cvtColor(self.__pc.capture_array("lores"), cv2.COLOR_YUV2BGR_I420)
         image = self.__pc.capture_array("main")
         image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
         return image
 
+    def is_zero_copy(self) -> bool:
+        """Returns True if images returned by read are views into buffers of the camera.
+        Such an image is only valid until release_frame is called.
+
+        Returns:
+            bool: True if zero-copy mode is used
+        """
+        return self.__zero_copy
+
+    def release_frame(self):
+        """Returns buffer of the image returned by read to the camera"""
+        if self.__request is not None:
+            self.__mapped_array.__exit__(None, None, None)
+            self.__request.release()
+            self.__mapped_array = None
+            self.__request = None
+
+    def capture_still(self) -> np.array:
+        """Returns image at full resolution of the sensor. With still_mode 'switch'
+        the camera is switched to the full resolution for one image, which stops the stream
+        for a short time, with still_mode 'dual' the image is taken from the main stream.
+        Must be called by the thread reading the images.
+
+        Returns:
+            np.array: Image BGR
+        """
+        self.release_frame()
+        if self.__still_mode == "dual":
+            return self.__pc.capture_array("main")
+        return self.__pc.switch_mode_and_capture_array(self.__still_config, "main")
+
+    def set_crop(self, roi) -> bool:
+        """Crops images at the sensor by the control ScalerCrop, so the full output
+        resolution shows the region. The region is enlarged to the aspect ratio of the output.
+
+        Args:
+            roi (tuple): region (x,y,w,h) relative to the full image, None for the full image
+
+        Returns:
+            bool: True if the images are cropped
+        """
+        crop_maximum = self.__pc.camera_properties.get("ScalerCropMaximum")
+        if crop_maximum is None:
+            return False
+        x0, y0, w0, h0 = crop_maximum
+        if roi is None:
+            self.__pc.set_controls({"ScalerCrop": crop_maximum})
+            return False
+        x, y, w, h = roi
+        # keeps aspect ratio of the output, the ISP would distort the image otherwise
+        aspect = self.__imagesize[0] / self.__imagesize[1]
+        w_px, h_px = w * w0, h * h0
+        if w_px / h_px < aspect:
+            w_px = min(w0, h_px * aspect)
+        else:
+            h_px = min(h0, w_px / aspect)
+        cx, cy = x0 + (x + w / 2) * w0, y0 + (y + h / 2) * h0
+        left = int(min(max(cx - w_px / 2, x0), x0 + w0 - w_px))
+        top = int(min(max(cy - h_px / 2, y0), y0 + h0 - h_px))
+        self.__pc.set_controls({"ScalerCrop": (left, top, int(w_px), int(h_px))})
+        return True
+
     def release(self):
         """Releases camera"""
+        self.release_frame()
         self.__pc.stop()
         self.__pc.close()
 
@@ -151,11 +312,670 @@ class AdapterPiCamera:
         """
         try:
             _ = self.read()
+            self.release_frame()
             return True
         except RuntimeError:
             return False
 
 
+class AdapterVideoFile:
+    """Adapter replaying a video file or a folder of images, provides interface used by CameraController"""
+
+    #: tuple: extensions of files read from a folder of images
+    IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, path, realtime=True, loop=True, fps=None, start=0, end=None):
+        """Opens video file or folder of images
+
+        Args:
+            path (str): video file or folder of images
+            realtime (bool, optional): frames are returned at the rate of the video, else as fast as possible
+            loop (bool, optional): replay restarts at the end, else read returns None
+            fps (float, optional): frame rate, defaults to rate of video or 10 for images
+            start (int, optional): index of first frame replayed
+            end (int, optional): index after last frame replayed, defaults to end of video
+        """
+        #: str: video file or folder of images
+        self.__path = path
+        #: bool: frames are returned at the rate of the video
+        self.__realtime = realtime
+        #: bool: replay restarts at the end
+        self.__loop = loop
+        #: list: files of folder of images, None for a video file
+        self.__files = None
+        #: cv2.VideoCapture: reads video file
+        self.__vc = None
+        #: int: index of first frame replayed
+        self.__start = start
+        #: int: index after last frame replayed, None for end of video
+        self.__end = end
+        if os.path.isdir(path):
+            self.__files = sorted(
+                os.path.join(path, filename)
+                for filename in os.listdir(path)
+                if filename.lower().endswith(self.IMAGE_EXTENSIONS)
+            )
+            video_fps = 10
+        else:
+            self.__vc = cv2.VideoCapture(path)
+            video_fps = self.__vc.get(cv2.CAP_PROP_FPS) or 25
+        #: float: frame rate used for replay in real-time
+        self.__fps = fps or video_fps
+        #: int: index of next frame
+        self.__index = 0
+        #: float: time replay started, used to keep real-time
+        self.__starttime = None
+        #: np.array: last image returned by read, used by capture_still
+        self.__last_image = None
+        self.__rewind()
+        # reading image in order to determine size of the images
+        img = self.__read_next()
+        #: tuple: Size of Image (height,width)
+        self.__imagesize = img.shape[:2] if img is not None else None
+        self.__rewind()
+
+    def __rewind(self):
+        """Restarts replay at first frame"""
+        self.__index = self.__start
+        self.__starttime = None
+        if self.__vc is not None:
+            self.__vc.set(cv2.CAP_PROP_POS_FRAMES, self.__start)
+
+    def __read_next(self) -> np.array:
+        """Returns next frame or None at the end"""
+        if self.__end is not None and self.__index >= self.__end:
+            return None
+        if self.__files is not None:
+            if self.__index >= len(self.__files):
+                return None
+            image = cv2.imread(self.__files[self.__index])
+        else:
+            success, image = self.__vc.read()
+            if not success:
+                return None
+        self.__index += 1
+        return image
+
+    def get_configs(self) -> dict:
+        """Returns description of configurations of the replay
+
+        Returns:
+            dict: configurations
+        """
+        return dict(path=self.__path, fps=self.__fps, realtime=self.__realtime)
+
+    def get_fps(self) -> float:
+        """Returns frame rate of the replay
+
+        Returns:
+            float: frames per second
+        """
+        return self.__fps
+
+    def get_frame_count(self) -> int:
+        """Returns number of frames of the video or folder, as reported by the video file
+
+        Returns:
+            int: number of frames
+        """
+        if self.__files is not None:
+            return len(self.__files)
+        return int(self.__vc.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def read(self) -> np.array:
+        """Returns next image in BGR colorspace
+
+        Returns:
+            np.array: Image, None at the end if not looping
+        """
+        image = self.__read_next()
+        if image is None and self.__loop:
+            self.__rewind()
+            image = self.__read_next()
+        self.__last_image = image
+        if self.__realtime:
+            if self.__starttime is None:
+                self.__starttime = time.time()
+            frames = self.__index - self.__start - 1
+            delay = self.__starttime + frames / self.__fps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return image
+
+    def is_zero_copy(self) -> bool:
+        """Returns True if images returned by read are views into buffers of the camera
+
+        Returns:
+            bool: False, images are owned by the caller
+        """
+        return False
+
+    def release_frame(self):
+        """Releases buffer of the image returned by read, nothing to do"""
+        pass
+
+    def capture_still(self) -> np.array:
+        """Returns copy of the last image read, a still must not skip a frame of the replay
+
+        Returns:
+            np.array: Image, None before the first image was read
+        """
+        if self.__last_image is None:
+            return None
+        return self.__last_image.copy()
+
+    def set_crop(self, roi) -> bool:
+        """Crops images at the camera, not supported
+
+        Args:
+            roi (tuple): region (x,y,w,h) relative to the full image, None for the full image
+
+        Returns:
+            bool: False, images must be cropped by the caller
+        """
+        return False
+
+    def get_imagesize(self) -> tuple:
+        """Returns size of images
+
+        Returns:
+            tuple: height, width
+        """
+        return self.__imagesize
+
+    def release(self):
+        """Releases video file"""
+        if self.__vc is not None:
+            self.__vc.release()
+
+    def check(self) -> bool:
+        """Checks if video or images are available
+
+        Returns:
+            bool: True if at least one image could be read
+        """
+        return self.__imagesize is not None
+
+
+class AdapterSynthetic:
+    """Adapter generating images of moving patterns, provides interface used by CameraController"""
+
+    def __init__(self, resolution=(640, 480), noise=5, objects=3, speed=4, fps=None):
+        """Prepares background and moving objects
+
+        Args:
+            resolution (tuple, optional): image size (width,height)
+            noise (float, optional): standard deviation of gaussian noise added to images
+            objects (int, optional): number of moving objects
+            speed (float, optional): speed of objects in pixels per frame
+            fps (float, optional): frame rate, as fast as possible if None
+        """
+        w, h = resolution
+        #: tuple: Size of Image (height,width)
+        self.__imagesize = (h, w)
+        #: float: frame rate, None for as fast as possible
+        self.__fps = fps
+        #: float: standard deviation of noise
+        self.__noise = noise
+        #: int: number of frame generated
+        self.__index = 0
+        #: float: time generation started, used to keep frame rate
+        self.__starttime = None
+        rng = np.random.default_rng(0)
+        #: np.array: static background, a color gradient
+        x = np.linspace(0, 255, w, dtype=np.float32)
+        y = np.linspace(0, 255, h, dtype=np.float32)
+        self.__background = np.dstack(
+            (
+                np.add.outer(y, x) / 2,
+                np.tile(x, (h, 1)),
+                np.tile(y[:, None], (1, w)),
+            )
+        ).astype(np.uint8)
+        #: list: noise images, used in turn as generating noise per frame is expensive
+        self.__noise_frames = []
+        if noise > 0:
+            self.__noise_frames = [
+                rng.normal(0, noise, (h, w, 3)).astype(np.int16) for _ in range(4)
+            ]
+        size = max(4, min(w, h) // 8)
+        #: list: moving objects as [x, y, vx, vy, size, color]
+        self.__objects = [
+            [
+                rng.uniform(0, w - size),
+                rng.uniform(0, h - size),
+                speed * np.cos(angle),
+                speed * np.sin(angle),
+                size,
+                tuple(int(c) for c in rng.integers(0, 255, 3)),
+            ]
+            for angle in rng.uniform(0, 2 * np.pi, objects)
+        ]
+
+    def get_configs(self) -> dict:
+        """Returns description of configurations of the generator
+
+        Returns:
+            dict: configurations
+        """
+        return dict(
+            size=self.__imagesize, noise=self.__noise, objects=len(self.__objects)
+        )
+
+    def get_object_boxes(self) -> list:
+        """Returns bounding boxes of the objects in the last image
+
+        Returns:
+            list: boxes (x,y,w,h)
+        """
+        return [(int(x), int(y), size, size) for x, y, _, _, size, _ in self.__objects]
+
+    def __render(self, index) -> np.array:
+        """Returns image of the objects at their current position with noise of frame index"""
+        image = self.__background.copy()
+        for x, y, _, _, size, color in self.__objects:
+            cv2.rectangle(
+                image, (int(x), int(y)), (int(x) + size, int(y) + size), color, -1
+            )
+        if self.__noise_frames:
+            noise = self.__noise_frames[index % len(self.__noise_frames)]
+            image = cv2.add(image, noise, dtype=cv2.CV_8U)
+        return image
+
+    def read(self) -> np.array:
+        """Returns next image in BGR colorspace
+
+        Returns:
+            np.array: Image
+        """
+        h, w = self.__imagesize
+        for obj in self.__objects:
+            x, y, vx, vy, size, color = obj
+            x, y = x + vx, y + vy
+            if not 0 <= x <= w - size:
+                vx = -vx
+                x = min(max(x, 0), w - size)
+            if not 0 <= y <= h - size:
+                vy = -vy
+                y = min(max(y, 0), h - size)
+            obj[:4] = x, y, vx, vy
+        image = self.__render(self.__index)
+        self.__index += 1
+        if self.__fps:
+            if self.__starttime is None:
+                self.__starttime = time.time()
+            delay = self.__starttime + self.__index / self.__fps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return image
+
+    def is_zero_copy(self) -> bool:
+        """Returns True if images returned by read are views into buffers of the camera
+
+        Returns:
+            bool: False, images are owned by the caller
+        """
+        return False
+
+    def release_frame(self):
+        """Releases buffer of the image returned by read, nothing to do"""
+        pass
+
+    def capture_still(self) -> np.array:
+        """Returns image of the objects at their current position, the next image
+        returned by read is not affected
+
+        Returns:
+            np.array: Image
+        """
+        return self.__render(max(self.__index - 1, 0))
+
+    def set_crop(self, roi) -> bool:
+        """Crops images at the camera, not supported
+
+        Args:
+            roi (tuple): region (x,y,w,h) relative to the full image, None for the full image
+
+        Returns:
+            bool: False, images must be cropped by the caller
+        """
+        return False
+
+    def get_imagesize(self) -> tuple:
+        """Returns size of images
+
+        Returns:
+            tuple: height, width
+        """
+        return self.__imagesize
+
+    def release(self):
+        """Nothing to release"""
+        pass
+
+    def check(self) -> bool:
+        """Checks if generator is available
+
+        Returns:
+            bool: always True
+        """
+        return True
+
+
+class JpegEncoderOpenCV:
+    """Encodes images as JPEG using OpenCV"""
+
+    #: str: name of backend
+    name = "opencv"
+
+    #: dict: chroma subsampling factors of OpenCV
+    SUBSAMPLING = {
+        "444": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_444", None),
+        "440": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_440", None),
+        "422": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_422", None),
+        "420": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420", None),
+        "411": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_411", None),
+    }
+
+    def __init__(
+        self,
+        quality=95,
+        subsampling="420",
+        optimize=False,
+        progressive=False,
+        restart_interval=0,
+    ):
+        """
+        Args:
+            quality (int, optional): quality 0 to 100
+            subsampling (str, optional): chroma subsampling '444', '440', '422', '420' or '411'
+            optimize (bool, optional): optimizes huffman tables, smaller but slower
+            progressive (bool, optional): progressive JPEG
+            restart_interval (int, optional): restart interval in MCUs, 0 disables restart markers
+        """
+        #: int: quality 0 to 100
+        self.quality = quality
+        #: str: chroma subsampling
+        self.subsampling = subsampling
+        #: bool: optimizes huffman tables
+        self.optimize = optimize
+        #: bool: progressive JPEG
+        self.progressive = progressive
+        #: int: restart interval
+        self.restart_interval = restart_interval
+
+    def get_parameters(self, quality=None) -> list:
+        """Returns parameters as expected by cv2.imencode
+
+        Args:
+            quality (int, optional): quality overriding the quality of the encoder
+
+        Returns:
+            list: parameters
+        """
+        parameters = [
+            cv2.IMWRITE_JPEG_QUALITY,
+            int(self.quality if quality is None else quality),
+            cv2.IMWRITE_JPEG_OPTIMIZE,
+            int(self.optimize),
+            cv2.IMWRITE_JPEG_PROGRESSIVE,
+            int(self.progressive),
+            cv2.IMWRITE_JPEG_RST_INTERVAL,
+            int(self.restart_interval),
+        ]
+        sampling_factor = self.SUBSAMPLING.get(self.subsampling)
+        if sampling_factor is not None:
+            parameters += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, sampling_factor]
+        return parameters
+
+    def encode(self, frame, quality=None) -> bytes:
+        """Encodes image
+
+        Args:
+            frame (np.array): image BGR
+            quality (int, optional): quality overriding the quality of the encoder
+
+        Returns:
+            bytes: JPEG
+        """
+        _, jpeg = cv2.imencode(".jpg", frame, self.get_parameters(quality))
+        return jpeg.tobytes()
+
+
+class JpegEncoderTurbo(JpegEncoderOpenCV):
+    """Encodes images as JPEG using libjpeg-turbo (PyTurboJPEG).
+    Huffman optimization and restart intervals are not supported and ignored.
+    """
+
+    #: str: name of backend
+    name = "turbojpeg"
+
+    def __init__(self, *args, **kwargs):
+        """Same arguments as JpegEncoderOpenCV
+
+        Raises:
+            RuntimeError: if PyTurboJPEG or library libjpeg-turbo is not available
+        """
+        super().__init__(*args, **kwargs)
+        if turbojpeg is None:
+            raise RuntimeError("PyTurboJPEG is not installed")
+        #: turbojpeg.TurboJPEG: encoder
+        self.__tj = turbojpeg.TurboJPEG()
+        #: dict: chroma subsampling factors of libjpeg-turbo
+        self.__subsampling = {
+            "444": turbojpeg.TJSAMP_444,
+            "440": turbojpeg.TJSAMP_440,
+            "422": turbojpeg.TJSAMP_422,
+            "420": turbojpeg.TJSAMP_420,
+            "411": turbojpeg.TJSAMP_411,
+        }
+
+    def encode(self, frame, quality=None) -> bytes:
+        """Encodes image
+
+        Args:
+            frame (np.array): image BGR
+            quality (int, optional): quality overriding the quality of the encoder
+
+        Returns:
+            bytes: JPEG
+        """
+        if frame.dtype != np.uint8:
+            frame = frame.astype(np.uint8)
+        return self.__tj.encode(
+            frame,
+            quality=int(self.quality if quality is None else quality),
+            pixel_format=turbojpeg.TJPF_BGR,
+            jpeg_subsample=self.__subsampling.get(
+                self.subsampling, turbojpeg.TJSAMP_420
+            ),
+            flags=turbojpeg.TJFLAG_PROGRESSIVE if self.progressive else 0,
+        )
+
+
+#: dict: available JPEG encoders by name of backend
+JPEG_ENCODERS = {
+    JpegEncoderOpenCV.name: JpegEncoderOpenCV,
+    JpegEncoderTurbo.name: JpegEncoderTurbo,
+}
+
+
+def create_jpeg_encoder(backend="auto", **parameters):
+    """Creates JPEG encoder. With backend 'auto' libjpeg-turbo is used if available.
+
+    Args:
+        backend (str, optional): 'auto', 'opencv' or 'turbojpeg'
+        **parameters: parameters of the encoder, see JpegEncoderOpenCV
+
+    Returns:
+        JpegEncoderOpenCV: encoder
+    """
+    if backend == "auto":
+        try:
+            return JpegEncoderTurbo(**parameters)
+        except Exception as e:
+            return JpegEncoderOpenCV(**parameters)
+    return JPEG_ENCODERS[backend](**parameters)
+
+
+def create_adapter(config: dict):
+    """Creates adapter described by a configuration as given in config.json
+
+    Args:
+        config (dict): contains key 'camera' ('PICAMERA', 'OPENCV', 'VIDEOFILE' or 'SYNTHETIC')
+            and optional settings of the adapter
+
+    Returns:
+        Adapter: adapter providing interface used by CameraController
+    """
+    if config["camera"] == "PICAMERA":
+        resolution = config.get("resolution", 0)
+        if isinstance(resolution, list):
+            resolution = tuple(resolution)
+        return AdapterPiCamera(
+            resolution,
+            camera_num=config.get("camera_num", 0),
+            zero_copy=config.get("zero_copy", False),
+            still_mode=config.get("still_mode", "switch"),
+        )
+    elif config["camera"] == "OPENCV":
+        return AdapterOpenCV(config.get("device", 0))
+    elif config["camera"] == "VIDEOFILE":
+        return AdapterVideoFile(
+            config["path"],
+            realtime=config.get("realtime", True),
+            loop=config.get("loop", True),
+            fps=config.get("fps"),
+        )
+    elif config["camera"] == "SYNTHETIC":
+        return AdapterSynthetic(
+            tuple(config.get("resolution", (640, 480))),
+            noise=config.get("noise", 5),
+            objects=config.get("objects", 3),
+            speed=config.get("speed", 4),
+            fps=config.get("fps"),
+        )
+    raise ValueError(f"Unknown camera: {config['camera']}")
+
+
+class CaptureScheduler:
+    """Divides a CPU budget between the capture threads of several CameraController by priority.
+    Each running camera may spend its share of the budget processing frames and sleeps for the rest,
+    so a camera with heavy transformations can not starve the others.
+    """
+
+    def __init__(self, cpu_budget=1.0):
+        """
+        Args:
+            cpu_budget (float, optional): number of CPU-cores to be shared by all cameras
+        """
+        #: float: number of CPU-cores to be shared by all cameras
+        self.__cpu_budget = cpu_budget
+        #: dict: priorities of running cameras by name
+        self.__priorities = {}
+        #: Lock: protects __priorities
+        self.__lock = Lock()
+
+    def register(self, name, priority=1):
+        """Registers running camera
+
+        Args:
+            name (str): name of camera
+            priority (float, optional): priority of the camera, relative to the others
+        """
+        with self.__lock:
+            self.__priorities[name] = max(priority, 1e-3)
+
+    def unregister(self, name):
+        """Unregisters camera which stopped running
+
+        Args:
+            name (str): name of camera
+        """
+        with self.__lock:
+            self.__priorities.pop(name, None)
+
+    def get_share(self, name) -> float:
+        """Returns share of time a camera may spend processing frames
+
+        Args:
+            name (str): name of camera
+
+        Returns:
+            float: share between 0 and 1
+        """
+        with self.__lock:
+            if name not in self.__priorities:
+                return 1.0
+            total = sum(self.__priorities.values())
+            share = self.__cpu_budget * self.__priorities[name] / total
+        return min(share, 1.0)
+
+    def get_shares(self) -> dict:
+        """Returns shares of all running cameras
+
+        Returns:
+            dict: share by name of camera
+        """
+        return {name: self.get_share(name) for name in list(self.__priorities)}
+
+    def throttle(self, name, busy_time):
+        """Sleeps after a frame was processed, so that the camera keeps within its share
+
+        Args:
+            name (str): name of camera
+            busy_time (float): time in seconds spent processing the last frame, excluding waiting for the camera
+        """
+        share = self.get_share(name)
+        if share < 1.0:
+            time.sleep(busy_time * (1 / share - 1))
+
+
+#: tuple: stages of frames which can be streamed
+STREAM_STAGES = ("transformed", "raw")
+#: tuple: key of variant of /video_feed without parameters, kept in the history
+STREAM_DEFAULT_KEY = ("transformed", 160, None)
+
+#: StillResult: high resolution image and the keys of the active registered transformations
+#: skipped because they depend on previous frames (motion detections, temporal smoothing)
+StillResult = namedtuple("StillResult", ["image", "skipped"])
+
+
+def crop_to_roi(image, roi) -> np.array:
+    """Returns region of an image as view without copying
+
+    Args:
+        image (np.array): image
+        roi (tuple): region (x,y,w,h) relative to the image, values from 0 to 1
+
+    Returns:
+        np.array: view into image
+    """
+    h, w = image.shape[:2]
+    x, y, rw, rh = roi
+    left, top = int(x * w), int(y * h)
+    right = max(left + 1, int(round((x + rw) * w)))
+    bottom = max(top + 1, int(round((y + rh) * h)))
+    return image[top:bottom, left:right]
+
+
+def get_parameter_snapshot(transformation):
+    """Returns copy of a stateless transformation with its current parameter values,
+    later changes of the parameters do not affect the copy
+
+    Args:
+        transformation (callable): transformation with attribute parameter
+
+    Returns:
+        callable: copy
+    """
+    snapshot = copy.copy(transformation)
+    snapshot.parameter = {
+        key: copy.copy(parameter) for key, parameter in transformation.parameter.items()
+    }
+    return snapshot
+
+
 def bgr_to_grayscale_bgr(img) -> np.array:
     """Converts image form colorspace BGR to grayscale in colorspace BGR
 
@@ -170,15 +990,240 @@ def bgr_to_grayscale_bgr(img) -> np.array:
     return img
 
 
+class AdaptiveQualityController:
+    """Feedback controller watching the time needed per frame against a budget.
+    If frames take too long, processing is degraded step by step in the configured order,
+    if there is enough headroom again, the degradations are restored in reverse order.
+    """
+
+    #: dict: levels of each kind of degradation, the first level means no degradation
+    LEVELS = {
+        # scale of the image processed by registered transformations
+        "resolution": [1.0, 0.75, 0.5, 0.25],
+        # registered transformations are applied to every n-th frame only
+        "skip": [1, 2, 3],
+        # quality of JPEG encoding of the stream, None means as configured
+        "quality": [None, 70, 50, 30],
+    }
+
+    def __init__(
+        self,
+        budget_ms=100,
+        order=("skip", "resolution", "quality"),
+        headroom=0.6,
+        patience=10,
+        restore_patience=50,
+        alpha=0.2,
+    ):
+        """
+        Args:
+            budget_ms (float, optional): time budget per frame in ms
+            order (tuple, optional): kinds of degradation in order of application
+            headroom (float, optional): degradations are restored below this fraction of the budget
+            patience (int, optional): number of frames over budget before degrading
+            restore_patience (int, optional): number of frames with headroom before restoring
+            alpha (float, optional): weight of the newest frame time in the moving average
+        """
+        #: float: time budget per frame in ms
+        self.budget_ms = budget_ms
+        #: list: kinds of degradation in order of application
+        self.__order = [kind for kind in order if kind in self.LEVELS]
+        #: float: degradations are restored below this fraction of the budget
+        self.__headroom = headroom
+        #: int: number of frames over budget before degrading
+        self.__patience = patience
+        #: int: number of frames with headroom before restoring
+        self.__restore_patience = restore_patience
+        #: float: weight of the newest frame time in the moving average
+        self.__alpha = alpha
+        #: dict: current level of each kind of degradation
+        self.__levels = {kind: 0 for kind in self.__order}
+        #: float: moving average of frame time in ms
+        self.__average_ms = None
+        #: int: number of consecutive frames over budget
+        self.__count_over = 0
+        #: int: number of consecutive frames with headroom
+        self.__count_under = 0
+        #: deque: latest decisions
+        self.__decisions = deque([], 20)
+        #: Lock: protects __decisions, read by request threads
+        self.__decisions_lock = Lock()
+
+    def get_value(self, kind):
+        """Returns current value of a kind of degradation
+
+        Args:
+            kind (str): 'resolution', 'skip' or 'quality'
+
+        Returns:
+            value of current level
+        """
+        return self.LEVELS[kind][self.__levels.get(kind, 0)]
+
+    def get_decisions(self) -> list:
+        """Returns latest decisions, oldest first
+
+        Returns:
+            list: decisions as dict of time, action, kind, value and frame_ms
+        """
+        with self.__decisions_lock:
+            return list(self.__decisions)
+
+    def get_average_ms(self) -> float:
+        """Returns moving average of frame time
+
+        Returns:
+            float: frame time in ms
+        """
+        return self.__average_ms
+
+    def get_state(self) -> dict:
+        """Returns current values of all kinds of degradation
+
+        Returns:
+            dict: value by kind
+        """
+        return {kind: self.get_value(kind) for kind in self.__order}
+
+    def update(self, frame_time) -> bool:
+        """Takes time needed for a frame into account and decides about degradations
+
+        Args:
+            frame_time (float): time in seconds
+
+        Returns:
+            bool: True if a level changed
+        """
+        frame_ms = frame_time * 1000
+        if self.__average_ms is None:
+            self.__average_ms = frame_ms
+        else:
+            self.__average_ms += self.__alpha * (frame_ms - self.__average_ms)
+        if self.__average_ms > self.budget_ms:
+            self.__count_over += 1
+            self.__count_under = 0
+            if self.__count_over >= self.__patience:
+                self.__count_over = 0
+                return self.__change("degrade", self.__order, 1)
+        elif self.__average_ms < self.budget_ms * self.__headroom:
+            self.__count_under += 1
+            self.__count_over = 0
+            if self.__count_under >= self.__restore_patience:
+                self.__count_under = 0
+                return self.__change("restore", reversed(self.__order), -1)
+        else:
+            self.__count_over = 0
+            self.__count_under = 0
+        return False
+
+    def __change(self, action, kinds, step) -> bool:
+        """Changes level of the first kind of degradation which can be changed
+
+        Args:
+            action (str): 'degrade' or 'restore'
+            kinds (iterable): kinds of degradation in order of preference
+            step (int): change of level
+
+        Returns:
+            bool: True if a level changed
+        """
+        for kind in kinds:
+            level = self.__levels[kind] + step
+            if 0 <= level < len(self.LEVELS[kind]):
+                self.__levels[kind] = level
+                decision = dict(
+                    time=time.time(),
+                    action=action,
+                    kind=kind,
+                    value=self.LEVELS[kind][level],
+                    frame_ms=self.__average_ms,
+                )
+                with self.__decisions_lock:
+                    self.__decisions.append(decision)
+                print(" - ADAPTIVE QUALITY:", decision)
+                return True
+        return False
+
+
 class CameraController(object):
     def __init__(
         self,
         adapter,
         active_preprocessing_transformations=[],
         active_postprocessing_transformations=[],
+        name="default",
+        scheduler=None,
+        priority=1,
+        jpeg_encoder=None,
+        adaptive_quality=None,
+        history=None,
+        roi_sensor=False,
+        heatmap=None,
+        history_idle=True,
     ):
         #:Adapter: allows to access to camera via specified interface
         self.__adapter = adapter
+        #: str: name of camera
+        self.name = name
+        #: CaptureScheduler: shares CPU between cameras, None if not shared
+        self.__scheduler = scheduler
+        #: float: priority used by scheduler
+        self.__priority = priority
+        #: JpegEncoderOpenCV: encodes frames of the stream
+        self.__jpeg_encoder = jpeg_encoder or create_jpeg_encoder()
+        #: bytes: encoded default image shown if camera is not running
+        self.__default_frame_as_bytes = None
+        #: tuple: region of interest (x,y,w,h) relative to the full image cropped after reading, None for full image
+        self.__roi = None
+        #: tuple: region of interest shown, cropped by the adapter or after reading
+        self.__roi_shown = None
+        #: list: region of interest to be applied by the capture thread, [None] for full image
+        self.__pending_roi = None
+        #: bool: crops at the sensor if the adapter supports it
+        self.__roi_sensor = roi_sensor
+        #: MotionHeatmap: accumulates masks of the active motion detection, None if disabled
+        self.__heatmap = heatmap
+        #: MotionResult: result last added to the heatmap
+        self.__last_heatmap_result = None
+        #: dict: encoded variants of the stream as dict of data, meta and lock by key (stage, width, quality)
+        self.__stream_cache = {}
+        #: dict: tile encoders of variants of the stream as dict of encoder, meta and lock by key
+        self.__tile_cache = {}
+        #: Counter: number of clients of the stream by key of variant
+        self.__subscribers = Counter()
+        #: Lock: protects __stream_cache, __tile_cache and __subscribers
+        self.__stream_lock = Lock()
+        #: list: futures of requested high resolution images, served by the capture thread
+        self.__hr_requests = []
+        #: Lock: protects __hr_requests
+        self.__hr_lock = Lock()
+        #: list: keys of transformations skipped for the stored high resolution image
+        self.__image_skipped = []
+        #: ThreadPoolExecutor: applies the transformations to high resolution images
+        self.__hr_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"hr-{name}"
+        )
+        #: int: number of clients of variants of the raw frames, which must be kept in zero-copy mode
+        self.__raw_subscribers = 0
+        #: Condition: notified if a frame was processed
+        self.__frame_condition = Condition()
+        #: FrameHistory: keeps frames encoded for the stream, None if disabled
+        self.__history = history
+        #: bool: frames are encoded for the history while no client watches the stream,
+        #: else the history keeps only the frames encoded for the clients
+        self.__history_idle = history_idle
+        #: AdaptiveQualityController: degrades processing under load, None if disabled
+        self.__adaptive_quality = adaptive_quality
+        #: int: quality of JPEG encoding as configured
+        self.__configured_quality = self.__jpeg_encoder.quality
+        #: float: scale of images processed by registered transformations
+        self.__processing_scale = 1.0
+        #: float: time in seconds needed to process the last frame, excluding waiting for the camera
+        self.__processing_time = 0.0
+        #: LatencyTracker: keeps age of frames sent to the clients of the stream
+        self.__latency = LatencyTracker()
+        #: FrameMeta: record of timestamps of the last frame
+        self._last_frame_meta = None
         #: int: counts images taken
         self.__counter = 0
         #: bool: indictes that thread is running
@@ -192,6 +1237,8 @@ class CameraController(object):
             "post": OrderedDict(
                 {
                     "Camera Info": self.__add_info_to_frame,
+                    "Latency Info": self.__add_latency_info_to_frame,
+                    "Motion Heatmap": self.__add_heatmap_to_frame,
                 }
             ),
             "basic": OrderedDict(
@@ -207,6 +1254,10 @@ class CameraController(object):
                     "gaussblur": transformer.GaussianBlur(3),
                     "test": transformer.Test(1),
                     "SMD": transformer.SimpleMotionDetection(),
+                    "MOG2": transformer.BackgroundSubtractionMotionDetection("MOG2"),
+                    "KNN": transformer.BackgroundSubtractionMotionDetection("KNN"),
+                    "FD": transformer.FrameDifferenceMotionDetection(),
+                    "Flow": transformer.OpticalFlowMotionDetection(),
                 }
             ),
         }
@@ -231,11 +1282,29 @@ class CameraController(object):
         self._last_frame_br = None
         #:np.array:last frame taken by tha woth all tranformations applied
         self._last_frame_brp = None
+        #: bool: requests a copy of the next raw frame, used if adapter works zero-copy
+        self.__retain_raw_frame = False
+        #: int: seq of frame copied to _last_frame on request in zero-copy mode
+        self.__retained_seq = None
 
     def get_data_from_simple_motion_detection(self):
         """to be deleted"""
         return self.__transformations["registered"]["SMD"].get_data()
 
+    def get_motion_data(self) -> dict:
+        """Returns time series of the active motion detections
+
+        Returns:
+            dict: data of get_data by name of transformation
+        """
+        return {
+            key: self.__transformations["registered"][key].get_data()
+            for key in self.__active_transformations["registered"]
+            if isinstance(
+                self.__transformations["registered"][key], transformer.MotionEngine
+            )
+        }
+
     def get_active_transformations(self, key) -> list:
         """Returns list of active transformations
 
@@ -274,7 +1343,6 @@ class CameraController(object):
         Returns:
             np.array: image
         """
-        self.__counter += 1
         starttime = time.time()
         try:
             image = self.__adapter.read()
@@ -282,13 +1350,216 @@ class CameraController(object):
             image = np.ones((10, 10, 3))
         if image is None:
             image = np.ones((10, 10, 3))
-        self._last_frame = image.copy()
+        return self.process_frame(image, starttime)
+
+    def process_frame(self, image, starttime=None) -> np.array:
+        """Applies transformations to an image read from the adapter and keeps the results
+        as last frames, used by single_run_get_frame and for offline processing
+
+        Args:
+            image (np.array): image read from the adapter
+            starttime (float, optional): time reading the image started
+
+        Returns:
+            np.array: image with basic transformations applied
+        """
+        self.__counter += 1
+        # waiting for the camera is excluded from the time used to control the load
+        processing_starttime = time.time()
+        if starttime is None:
+            starttime = processing_starttime
+        meta = FrameMeta(self.__counter, starttime, processing_starttime)
+        # a zero-copy adapter returns a view into the camera buffer which is valid
+        # until release_frame, so frames are only copied if they are retained
+        if self.__pending_roi is not None:
+            self.__change_roi(self.__pending_roi[0])
+        if self.__roi is not None:
+            # view, all transformations work on the region only
+            image = crop_to_roi(image, self.__roi)
+        zero_copy = self.__adapter.is_zero_copy()
+        if zero_copy:
+            raw = image
+        else:
+            self._last_frame = image.copy()
         image = self.__apply_transformations("basic", image)
-        self._last_frame_br = self.__apply_transformations("registered", image)
+        meta.t_basic = time.time()
+        frame_br = self.__apply_registered_transformations(image)
+        if self.__heatmap is not None:
+            self.__update_heatmap(processing_starttime)
+        meta.t_registered = time.time()
+        if zero_copy:
+            if np.may_share_memory(frame_br, raw):
+                frame_br = frame_br.copy()
+            if not self.__running and np.may_share_memory(image, raw):
+                # image is returned to the caller only if thread is not running
+                image = image.copy()
+            if self.__retain_raw_frame or self.__raw_subscribers:
+                self._last_frame = raw.copy()
+                self.__retain_raw_frame = False
+                self.__retained_seq = self.__counter
+            self.__adapter.release_frame()
+        self._last_frame_br = frame_br
+        self._last_frame_meta = meta
         self._last_frame_brp = self.__apply_transformations("post", self._last_frame_br)
-        self.__times.append(time.time() - starttime)
+        endtime = time.time()
+        meta.t_post = endtime
+        self.__times.append(endtime - starttime)
+        self.__processing_time = endtime - processing_starttime
+        if self.__adaptive_quality and self.__adaptive_quality.update(
+            self.__processing_time
+        ):
+            self.__apply_adaptive_quality()
+        with self.__frame_condition:
+            self.__frame_condition.notify_all()
         return image
 
+    def set_roi(self, roi=None):
+        """Sets region of interest, the image is cropped right after reading,
+        so all transformations work on the region only. The change is applied
+        by the next frame processed.
+
+        Args:
+            roi (tuple, optional): region (x,y,w,h) relative to the full image, values from 0 to 1, None for full image
+
+        Raises:
+            ValueError: if region is empty
+        """
+        if roi is not None:
+            x, y, w, h = (float(value) for value in roi)
+            x, y = min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+            w, h = min(w, 1.0 - x), min(h, 1.0 - y)
+            if w <= 0 or h <= 0:
+                raise ValueError(f"Empty region of interest: {roi}")
+            if (x, y, w, h) == (0.0, 0.0, 1.0, 1.0):
+                roi = None
+            else:
+                roi = (x, y, w, h)
+        self.__pending_roi = [roi]
+        if not self.__running:
+            self.__change_roi(roi)
+
+    def get_roi(self) -> tuple:
+        """Returns region of interest
+
+        Returns:
+            tuple: region (x,y,w,h) relative to the full image, None for full image
+        """
+        if self.__pending_roi is not None:
+            return self.__pending_roi[0]
+        return self.__roi_shown
+
+    def __change_roi(self, roi):
+        """Applies region of interest, at the sensor if possible"""
+        self.__pending_roi = None
+        cropped_by_adapter = False
+        if self.__roi_sensor:
+            cropped_by_adapter = self.__adapter.set_crop(roi)
+        self.__roi = None if cropped_by_adapter else roi
+        self.__roi_shown = roi
+        # stateful transformations can not deal with a change of the image size
+        for transformation in self.__transformations["registered"].values():
+            transformation.reset()
+
+    def get_motion_engine(self) -> transformer.MotionEngine:
+        """Returns first active motion detection in the order of the registered
+        transformations, its detections are the motion of the camera, so a frame is
+        counted once if several motion detections are active
+
+        Returns:
+            MotionEngine: motion detection, None if none is active
+        """
+        # the active keys are a set, the registry gives the order
+        for key, transformation in self.__transformations["registered"].items():
+            if key in self.__active_transformations["registered"] and isinstance(
+                transformation, transformer.MotionEngine
+            ):
+                return transformation
+        return None
+
+    def __update_heatmap(self, timestamp):
+        """Adds mask of the first active motion detection to the heatmap"""
+        engine = self.get_motion_engine()
+        if engine is None:
+            return
+        result = engine.get_last_result()
+        # frames skipped by the adaptive quality controller are not counted twice
+        if result is not None and result is not self.__last_heatmap_result:
+            self.__heatmap.update(result.mask, timestamp)
+            self.__last_heatmap_result = result
+
+    def get_heatmap(self) -> MotionHeatmap:
+        """Returns heatmap of motion
+
+        Returns:
+            MotionHeatmap: heatmap, None if disabled
+        """
+        return self.__heatmap
+
+    def get_processing_time(self) -> float:
+        """Returns time needed to process the last frame, excluding waiting for the camera
+
+        Returns:
+            float: time in seconds
+        """
+        return self.__processing_time
+
+    def get_frame_time(self) -> float:
+        """Returns mean time of the last frames from reading until all transformations were done
+
+        Returns:
+            float: time in seconds, None if no frame was processed yet
+        """
+        times = list(self.__times)
+        if not times:
+            return None
+        return sum(times) / len(times)
+
+    def __apply_registered_transformations(self, image) -> np.array:
+        """Applies registered transformations, degraded by the adaptive quality controller if necessary
+
+        Args:
+            image (np.array): image to be transformed
+
+        Returns:
+            np.array: transformed image
+        """
+        if not self.__adaptive_quality:
+            return self.__apply_transformations("registered", image)
+        skip = self.__adaptive_quality.get_value("skip")
+        if skip > 1 and self.__counter % skip != 0:
+            # the frame is passed on without registered transformations, so the
+            # stream keeps its frame rate and only the overlays are updated less often
+            return image
+        scale = self.__adaptive_quality.get_value("resolution")
+        if scale < 1:
+            image = cv2.resize(
+                image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        return self.__apply_transformations("registered", image)
+
+    def __apply_adaptive_quality(self):
+        """Applies levels changed by the adaptive quality controller"""
+        quality = self.__adaptive_quality.get_value("quality")
+        self.__jpeg_encoder.quality = (
+            self.__configured_quality
+            if quality is None
+            else min(quality, self.__configured_quality)
+        )
+        scale = self.__adaptive_quality.get_value("resolution")
+        if scale != self.__processing_scale:
+            self.__processing_scale = scale
+            # stateful transformations can not deal with a change of the image size
+            for transformation in self.__transformations["registered"].values():
+                transformation.reset()
+
+    def get_adaptive_quality(self):
+        """Returns adaptive quality controller
+
+        Returns:
+            AdaptiveQualityController: controller, None if disabled
+        """
+        return self.__adaptive_quality
+
     def __apply_transformations(self, key, image) -> np.array:
         """Applies all active transformation of a given key to an image and returns the result
 
@@ -310,12 +1581,28 @@ class CameraController(object):
     def __thread_func(self):
         """Read image and apllies transformation"""
         self.__running = True
+        if self.__scheduler:
+            self.__scheduler.register(self.name, self.__priority)
         while self.__running:
             self.single_run_get_frame()
+            if self.__hr_requests:
+                self.__capture_hr_frame()
+            if self.__history is not None and self.__history_idle:
+                # the frame is encoded once for the history and the clients of the stream,
+                # this costs an encode per frame while no client watches
+                self.get_stream_frame_with_meta()
+            if self.__scheduler:
+                self.__scheduler.throttle(self.name, self.__processing_time)
+        if self.__scheduler:
+            self.__scheduler.unregister(self.name)
+        # requests arriving while stopping are served too
+        self.__capture_hr_frame()
 
     def run(self):
         """Wrappes __thread_func"""
-        thread = Thread(target=self.__thread_func, args=())
+        thread = Thread(
+            target=self.__thread_func, args=(), name=f"capture-{self.name}"
+        )
         thread.start()
 
     def stop(self):
@@ -328,7 +1615,7 @@ class CameraController(object):
 
     def __make_stream_default_image(self):
         """Returns an default image"""
-        img = np.ones((120, 160, 3)) * 50
+        img = np.full((120, 160, 3), 50, dtype=np.uint8)
         img = cv2.putText(
             img,
             "Camera not running",
@@ -348,28 +1635,279 @@ class CameraController(object):
         Returns:
             bytes: encoded image
         """
-        if self.__running and self._last_frame_br is not None:
+        return self.get_stream_frame_with_meta()[0]
+
+    def get_stream_frame_with_meta(self) -> tuple:
+        """Returns last frame encoded as byte and the record of its timestamps
+
+        Returns:
+            tuple: encoded image, FrameMeta (None for the default image)
+        """
+        return self.get_stream_variant()
+
+    @staticmethod
+    def get_stream_variant_key(stage="transformed", width=160, quality=None) -> tuple:
+        """Returns key of a variant of the stream, width and quality are bounded
+
+        Args:
+            stage (str, optional): 'transformed' or 'raw'
+            width (int, optional): frames fit into width x 3/4 width
+            quality (int, optional): quality of JPEG, None for quality of the encoder
+
+        Raises:
+            ValueError: if stage is unknown
+
+        Returns:
+            tuple: stage, width, quality
+        """
+        if stage not in STREAM_STAGES:
+            raise ValueError(f"Unknown stage of stream: {stage}")
+        # multiples of 16 limit the number of variants
+        width = min(max(16, int(width) // 16 * 16), 3840)
+        if quality is not None:
+            quality = min(max(1, int(quality)), 100)
+        return stage, width, quality
+
+    def subscribe(self, stage="transformed", width=160, quality=None) -> tuple:
+        """Registers client of a variant of the stream
+
+        Args:
+            stage (str, optional): 'transformed' or 'raw'
+            width (int, optional): frames fit into width x 3/4 width
+            quality (int, optional): quality of JPEG, None for quality of the encoder
+
+        Returns:
+            tuple: key of variant used to get frames and to unsubscribe
+        """
+        key = self.get_stream_variant_key(stage, width, quality)
+        with self.__stream_lock:
+            self.__subscribers[key] += 1
+            if key[0] == "raw":
+                self.__raw_subscribers += 1
+        return key
+
+    def unsubscribe(self, key):
+        """Unregisters client of a variant of the stream, variants without clients are dropped
+
+        Args:
+            key (tuple): key returned by subscribe
+        """
+        with self.__stream_lock:
+            self.__subscribers[key] -= 1
+            if key[0] == "raw":
+                self.__raw_subscribers -= 1
+            if self.__subscribers[key] <= 0:
+                del self.__subscribers[key]
+                if key != STREAM_DEFAULT_KEY:
+                    self.__stream_cache.pop(key, None)
+                self.__tile_cache.pop(key, None)
+
+    def get_stream_subscribers(self) -> dict:
+        """Returns number of clients by variant of the stream
+
+        Returns:
+            dict: number of clients by key (stage, width, quality)
+        """
+        with self.__stream_lock:
+            return dict(self.__subscribers)
+
+    def wait_for_frame(self, seq, timeout=1.0) -> bool:
+        """Waits until a frame other than the one given was processed
+
+        Args:
+            seq (int): sequence number of frame already seen, None to wait for the next frame
+            timeout (float, optional): maximal time in seconds to wait
+
+        Returns:
+            bool: True if a new frame is available
+        """
+
+        def is_new():
+            meta = self._last_frame_meta
+            return meta is not None and meta.seq != seq
+
+        with self.__frame_condition:
+            if seq is None:
+                return self.__frame_condition.wait(timeout)
+            return self.__frame_condition.wait_for(is_new, timeout)
+
+    def get_stream_variant(self, stage="transformed", width=160, quality=None) -> tuple:
+        """Returns last frame encoded for a variant of the stream and the record of its timestamps.
+        Each variant is encoded at most once per frame, clients of the same variant share it.
+
+        Args:
+            stage (str, optional): 'transformed' (registered and post transformations applied) or 'raw'
+            width (int, optional): frames fit into width x 3/4 width, they are not enlarged
+            quality (int, optional): quality of JPEG, None for quality of the encoder
+
+        Returns:
+            tuple: encoded image, FrameMeta (None for the default image)
+        """
+        key = self.get_stream_variant_key(stage, width, quality)
+        source = self._last_frame if key[0] == "raw" else self._last_frame_br
+        meta = self._last_frame_meta
+        if not self.__running or source is None or meta is None:
+            if self.__default_frame_as_bytes is None:
+                frame = self.__make_stream_default_image()
+                self.__default_frame_as_bytes = self.__jpeg_encoder.encode(frame)
+            return self.__default_frame_as_bytes, None
+        with self.__stream_lock:
+            entry = self.__stream_cache.get(key)
+            if entry is None:
+                entry = self.__stream_cache[key] = dict(data=None, meta=None, lock=Lock())
+        with entry["lock"]:
+            if entry["meta"] is not meta:
+                entry["data"] = self.__encode_stream_variant(key, source, meta)
+                entry["meta"] = meta
+            return entry["data"], entry["meta"]
+
+    def get_tile_messages(
+        self, stage="transformed", width=160, quality=None, since=None
+    ) -> tuple:
+        """Returns messages of changed tiles a client of a variant of the stream needs to catch up.
+        Each variant is divided into tiles at most once per frame, clients of the same variant share it.
+
+        Args:
+            stage (str, optional): 'transformed' or 'raw'
+            width (int, optional): frames fit into width x 3/4 width, they are not enlarged
+            quality (int, optional): quality of JPEG, None for quality of the encoder
+            since (int, optional): sequence number of last message received, None for a new client
+
+        Returns:
+            tuple: list of messages (see pys.tiles), sequence number of last message,
+                FrameMeta (None for the default image)
+        """
+        key = self.get_stream_variant_key(stage, width, quality)
+        source = self._last_frame if key[0] == "raw" else self._last_frame_br
+        meta = self._last_frame_meta
+        if not self.__running or source is None or meta is None:
+            frame = self.__make_stream_default_image()
+            data = self.__jpeg_encoder.encode(frame)
+            message = pack_message(KEYFRAME, (frame.shape[1], frame.shape[0]), [(0, 0, data)])
+            # the client starts again with a keyframe when the camera runs
+            return [message], None, None
+        with self.__stream_lock:
+            entry = self.__tile_cache.get(key)
+            if entry is None:
+                entry = self.__tile_cache[key] = dict(
+                    encoder=TileDeltaEncoder(self.__jpeg_encoder), meta=None, lock=Lock()
+                )
+        with entry["lock"]:
+            if entry["meta"] is not meta:
+                entry["encoder"].update(self.__render_stream_variant(key, source), key[2])
+                entry["meta"] = meta
+            messages, seq = entry["encoder"].get_messages(since, key[2])
+            return messages, seq, entry["meta"]
+
+    def get_tile_status(self) -> dict:
+        """Returns counters of the tile encoders
+
+        Returns:
+            dict: counters (see TileDeltaEncoder.get_status) by key of variant
+        """
+        with self.__stream_lock:
+            entries = dict(self.__tile_cache)
+        return {key: entry["encoder"].get_status() for key, entry in entries.items()}
+
+    def __render_stream_variant(self, key, source) -> np.array:
+        """Resizes frame for a variant of the stream and applies the post transformations
+
+        Args:
+            key (tuple): stage, width, quality
+            source (np.array): frame of the stage
+
+        Returns:
+            np.array: image
+        """
+        stage, width, quality = key
+        # fits into width x 3/4 width keeping the aspect ratio of a region of interest
+        h, w = source.shape[:2]
+        scale = min(width / w, width * 3 / 4 / h, 1.0)
+        frame = source
+        if scale < 1:
             frame = cv2.resize(
-                self._last_frame_br, (160, 120), interpolation=cv2.INTER_LINEAR
+                source,
+                (max(1, round(w * scale)), max(1, round(h * scale))),
+                interpolation=cv2.INTER_LINEAR,
             )
+        if stage == "transformed":
             frame = self.__apply_transformations("post", frame)
-            _, jpeg = cv2.imencode(".jpg", frame)
-            self.__last_transformed_frame_as_bytes = jpeg.tobytes()
-        elif not hasattr(self, "__last_transformed_frame_as_bytes"):
-            frame = self.__make_stream_default_image()
-            _, jpeg = cv2.imencode(".jpg", frame)
-            self.__last_transformed_frame_as_bytes = jpeg.tobytes()
-        return self.__last_transformed_frame_as_bytes
+        return frame
+
+    def __encode_stream_variant(self, key, source, meta) -> bytes:
+        """Resizes and encodes frame for a variant of the stream
+
+        Args:
+            key (tuple): stage, width, quality
+            source (np.array): frame of the stage
+            meta (FrameMeta): record of frame
+
+        Returns:
+            bytes: encoded image
+        """
+        frame = self.__render_stream_variant(key, source)
+        data = self.__jpeg_encoder.encode(frame, key[2])
+        if key == STREAM_DEFAULT_KEY:
+            if meta.t_encoded is None:
+                meta.t_encoded = time.time()
+            if self.__history is not None:
+                self.__history.add(meta.t_capture, data)
+        return data
+
+    def get_history(self) -> FrameHistory:
+        """Returns rewind buffer of frames encoded for the stream
+
+        Returns:
+            FrameHistory: buffer, None if disabled
+        """
+        return self.__history
+
+    def get_last_frame_meta(self) -> FrameMeta:
+        """Returns record of the last frame processed, its seq changes with each frame
+
+        Returns:
+            FrameMeta: record, None if no frame was processed yet
+        """
+        return self._last_frame_meta
+
+    def get_latency_tracker(self) -> LatencyTracker:
+        """Returns tracker of age of frames sent to the clients of the stream
+
+        Returns:
+            LatencyTracker: tracker
+        """
+        return self.__latency
 
-    def get_last_frame(self) -> np.array:
+    def get_jpeg_encoder(self):
+        """Returns encoder used for the stream
+
+        Returns:
+            JpegEncoderOpenCV: encoder
+        """
+        return self.__jpeg_encoder
+
+    def get_last_frame(self, timeout=1.0) -> np.array:
         """Returns last frame without transformations applied.
-            If camera is not running reads returns new frame
+            If camera is not running reads returns new frame.
+            If the adapter works zero-copy the next frame is copied and waited for.
+
+        Args:
+            timeout (float, optional): maximal time in seconds to wait for the next frame
+                in zero-copy mode
 
         Returns:
             np.array: last frame without transformations applied
         """
         if not self.running():
             return self.single_run_get_frame()
+        if self.__adapter.is_zero_copy() and not self.__raw_subscribers:
+            # raw frames are only copied on request, the next one is kept
+            seq = self.__retained_seq
+            self.__retain_raw_frame = True
+            with self.__frame_condition:
+                self.__frame_condition.wait_for(
+                    lambda: self.__retained_seq != seq or not self.__running, timeout
+                )
         return self._last_frame
 
     def get_last_transformed_frame(self):
@@ -385,8 +1923,101 @@ class CameraController(object):
 
     def get_and_store_last_transformed_frame(self):
         self.__image = self.get_last_transformed_frame()
+        self.__image_skipped = []
         return self.__image
 
+    def request_hr_frame(self) -> Future:
+        """Requests image at the highest resolution of the adapter with all transformations applied.
+        If the camera is running, the capture thread takes the image between two frames
+        and the transformations are applied by another thread, so the stream keeps its frame rate.
+
+        Returns:
+            Future: result is a StillResult, the transformed image and the keys of the
+                stateful registered transformations not applied to it
+        """
+        future = Future()
+        with self.__hr_lock:
+            self.__hr_requests.append(future)
+        if not self.running():
+            self.__capture_hr_frame()
+        return future
+
+    def get_and_store_hr_frame(self, timeout=10) -> np.array:
+        """Returns image at the highest resolution with all transformations applied,
+        the image is kept for save_stored_image_to_file
+
+        Args:
+            timeout (float, optional): maximal time in seconds to wait
+
+        Returns:
+            np.array: image
+        """
+        self.__image, self.__image_skipped = self.request_hr_frame().result(timeout)
+        return self.__image
+
+    def get_stored_image_skipped(self) -> list:
+        """Returns transformations not applied to the stored image, a high resolution
+        image skips the registered transformations depending on previous frames
+
+        Returns:
+            list: keys of registered transformations
+        """
+        return list(self.__image_skipped)
+
+    def __capture_hr_frame(self):
+        """Takes image for the pending requests, called by the capture thread"""
+        with self.__hr_lock:
+            futures, self.__hr_requests = self.__hr_requests, []
+        if not futures:
+            return
+        try:
+            image = self.__adapter.capture_still()
+            if image is None:
+                raise RuntimeError("No image captured")
+            if self.__roi is not None:
+                image = crop_to_roi(image, self.__roi)
+            # the buffer of the camera must not be used by another thread
+            image = image.copy()
+            # stateful transformations like the motion detections need previous frames,
+            # the others are copied with the parameters of this frame
+            transformations = []
+            skipped = []
+            for key, transformation in self.__transformations["registered"].items():
+                if key not in self.__active_transformations["registered"]:
+                    continue
+                if getattr(transformation, "stateful", True):
+                    skipped.append(key)
+                else:
+                    transformations.append(get_parameter_snapshot(transformation))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.__hr_executor.submit(
+            self.__process_hr_frame, image, transformations, skipped, futures
+        )
+
+    def __process_hr_frame(self, image, transformations, skipped, futures):
+        """Applies all active transformations to a high resolution image
+
+        Args:
+            image (np.array): image
+            transformations (list): copies of the registered transformations to apply
+            skipped (list): keys of the registered transformations not applied
+            futures (list): futures getting the result
+        """
+        try:
+            image = self.__apply_transformations("basic", image)
+            for transformation in transformations:
+                image = transformation(image)
+            image = self.__apply_transformations("post", image)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(StillResult(image, skipped))
+
     def __add_info_to_frame(self, frame) -> np.array:
         """adds some written textual information to the image
 
@@ -396,6 +2027,9 @@ class CameraController(object):
         Returns:
             np.array: image with info
         """
+        if not self.__times:
+            # first frame is not finished yet
+            return frame
         time_ms = sum(self.__times) / len(self.__times) * 1000
         return cv2.putText(
             frame,
@@ -409,6 +2043,42 @@ class CameraController(object):
             cv2.LINE_AA,
         )
 
+    def __add_latency_info_to_frame(self, frame) -> np.array:
+        """adds median age of frames sent to the clients of the stream to the image
+
+        Args:
+            frame (np.array): image to add info into
+
+        Returns:
+            np.array: image with info
+        """
+        age = self.__latency.get_age_percentile(50)
+        text = "- ms age" if age is None else f"{round(age * 1000, 1)} ms age"
+        # second line, below the frame time written by Camera Info
+        return cv2.putText(
+            frame,
+            text,
+            (10, 38),
+            self.__font,
+            0.5,
+            (0, 255, 255),
+            1,
+            cv2.LINE_AA,
+        )
+
+    def __add_heatmap_to_frame(self, frame) -> np.array:
+        """blends heatmap of motion over the image
+
+        Args:
+            frame (np.array): image to add heatmap into
+
+        Returns:
+            np.array: image with heatmap
+        """
+        if self.__heatmap is None:
+            return frame
+        return self.__heatmap.overlay(frame)
+
     def save_stored_image_to_file(self, filepath) -> None:
         """Saves image to file
 
@@ -434,34 +2104,83 @@ class CameraController(object):
         return self.__adapter.get_imagesize()
 
 
-def encode_frame_as_jpg(frame) -> bytes:
+#: JpegEncoderOpenCV: encoder used by encode_frame_as_jpg by default
+default_jpeg_encoder = create_jpeg_encoder()
+
+
+def encode_frame_as_jpg(frame, encoder=None) -> bytes:
     """Provides encodes image as ???
 
     Args:
         frame (_type_): _description_
+        encoder (JpegEncoderOpenCV, optional): encoder, default_jpeg_encoder if not given
 
     Returns:
         bytes: _description_
     """
-    _, buffer = cv2.imencode(".jpg", frame)
-    dataURI = "data:image/jpeg;base64, " + base64.b64encode(buffer.tobytes()).decode(
-        "ascii"
-    )
+    buffer = (encoder or default_jpeg_encoder).encode(frame)
+    dataURI = "data:image/jpeg;base64, " + base64.b64encode(buffer).decode("ascii")
     return dataURI
 
 
-def gen(camera: CameraController):
-    """Returns Generator for streaming video
+def gen(
+    camera: CameraController, client=None, stage="transformed", width=160, quality=None
+):
+    """Returns Generator for streaming video, a frame is sent as soon as it was processed
+
+    Args:
+        camera (CameraController): camera streamed
+        client (str, optional): id of client used to track the age of frames sent
+        stage (str, optional): 'transformed' or 'raw'
+        width (int, optional): frames fit into width x 3/4 width
+        quality (int, optional): quality of JPEG, None for quality of the encoder
+
+    Yields:
+        bytes: part of multipart response with one JPEG
+    """
+    client = client or f"client-{id(object())}"
+    tracker = camera.get_latency_tracker()
+    key = camera.subscribe(stage, width, quality)
+    try:
+        while True:
+            frame, meta = camera.get_stream_variant(*key)
+            # length and time of capture let clients like benchmarks/bench_load parse the parts
+            headers = f"Content-Type: image/jpeg\r\nContent-Length: {len(frame)}\r\n"
+            if meta is not None:
+                headers += f"X-Timestamp: {meta.t_capture:.6f}\r\n"
+            yield b"--frame\r\n" + headers.encode() + b"\r\n" + frame + b"\r\n\r\n"
+            # the generator resumes after the server has written the part
+            if meta is not None:
+                tracker.record(client, meta)
+            # waits for the next frame, the default image is repeated every second
+            camera.wait_for_frame(None if meta is None else meta.seq)
+    finally:
+        camera.unsubscribe(key)
+        tracker.remove(client)
+
+
+def gen_tiles(camera: CameraController, stage="transformed", width=640, quality=None):
+    """Returns Generator for streaming video as changed tiles, see pys.tiles
 
     Args:
-        camera (CameraController): _description_
+        camera (CameraController): camera streamed
+        stage (str, optional): 'transformed' or 'raw'
+        width (int, optional): frames fit into width x 3/4 width
+        quality (int, optional): quality of JPEG, None for quality of the encoder
 
     Yields:
-        byte: ???
+        bytes: messages of tiles
     """
-    while True:
-        frame = camera.get_stream_frame_as_bytes()
-        yield (b"--frame\r\n" b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n\r\n")
+    key = camera.subscribe(stage, width, quality)
+    since = None
+    try:
+        while True:
+            messages, since, meta = camera.get_tile_messages(*key, since=since)
+            if messages:
+                yield b"".join(messages)
+            camera.wait_for_frame(None if meta is None else meta.seq)
+    finally:
+        camera.unsubscribe(key)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,531 @@
+"""
+This module provides a bus for motion events. The bus is a listener of the motion detections,
+it debounces the frames with motion into events with a start and an end and passes the events
+to subscribers: webhook, MQTT, log file and recorder.
+Each subscriber works in its own thread with a bounded queue. Publishing only puts events
+into the queues, so a slow or dead endpoint never delays the thread processing the frames,
+its events are dropped instead.
+"""
+
+import base64
+import json
+import os
+import queue
+import time
+import urllib.request
+from collections import namedtuple
+from threading import Event, Lock, Thread
+
+import cv2
+import numpy as np
+
+try:
+    import paho.mqtt.client as mqtt
+except Exception as e:
+    mqtt = None
+
+#: MotionEvent: event of the bus, kind is 'start' or 'end'. A start carries the score and
+#: the frame starting the event, an end the peak score and no frame. start is the time
+#: the event started, timestamp the time of the frame (start) or of the last motion (end).
+MotionEvent = namedtuple(
+    "MotionEvent", ["kind", "camera", "timestamp", "score", "bbox", "frame", "start"]
+)
+
+
+def event_to_dict(event, include_image=False) -> dict:
+    """Returns event as dict serializable as JSON
+
+    Args:
+        event (MotionEvent): event
+        include_image (bool, optional): adds frame as base64 encoded JPEG
+
+    Returns:
+        dict: event
+    """
+    data = dict(
+        kind=event.kind,
+        camera=event.camera,
+        timestamp=event.timestamp,
+        start=event.start,
+        duration=event.timestamp - event.start,
+        score=float(event.score),
+        bbox=[int(v) for v in event.bbox] if event.bbox is not None else None,
+    )
+    if include_image and event.frame is not None:
+        success, jpeg = cv2.imencode(".jpg", event.frame)
+        if success:
+            data["image"] = base64.b64encode(jpeg.tobytes()).decode("ascii")
+    return data
+
+
+class EventSubscriber:
+    """Base class of subscribers of the bus.
+    Subclasses implement handle, which is called in the thread of the subscriber.
+    """
+
+    def __init__(self, name, maxsize=100):
+        """
+        Args:
+            name (str): name of subscriber
+            maxsize (int, optional): maximal number of events waiting, further events are dropped
+        """
+        #: str: name of subscriber
+        self.name = name
+        #: queue.Queue: events waiting to be handled
+        self.__queue = queue.Queue(maxsize)
+        #: int: events handled
+        self.handled = 0
+        #: int: events dropped because the queue was full
+        self.dropped = 0
+        #: int: events failed
+        self.errors = 0
+        #: str: last error
+        self.last_error = None
+        #: float: total time in seconds spent handling events
+        self.__busy = 0.0
+        #: Thread: handles events
+        self.__thread = None
+
+    def handle(self, event):
+        """Handles event, may block
+
+        Args:
+            event (MotionEvent): event
+        """
+        raise NotImplementedError
+
+    def offer(self, event) -> bool:
+        """Puts event into the queue without blocking
+
+        Args:
+            event (MotionEvent): event
+
+        Returns:
+            bool: False if the event was dropped
+        """
+        try:
+            self.__queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        """Starts thread handling events"""
+        self.__thread = Thread(
+            target=self.__thread_func, name=f"events-{self.name}", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self, timeout=5):
+        """Stops thread after handling the events waiting
+
+        Args:
+            timeout (float, optional): maximal time in seconds to wait
+        """
+        if self.__thread is None:
+            return
+        self.__queue.put(None)
+        self.__thread.join(timeout)
+
+    def __thread_func(self):
+        """Handles events until stopped"""
+        while True:
+            event = self.__queue.get()
+            if event is None:
+                return
+            starttime = time.perf_counter()
+            try:
+                self.handle(event)
+                self.handled += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = repr(e)
+                print(" - EVENTS:", self.name, e)
+            self.__busy += time.perf_counter() - starttime
+
+    def get_status(self) -> dict:
+        """Returns counters of subscriber
+
+        Returns:
+            dict: counters
+        """
+        done = self.handled + self.errors
+        return dict(
+            name=self.name,
+            type=self.__class__.__name__,
+            queued=self.__queue.qsize(),
+            handled=self.handled,
+            dropped=self.dropped,
+            errors=self.errors,
+            last_error=self.last_error,
+            average_ms=1000 * self.__busy / done if done else None,
+        )
+
+
+class WebhookSubscriber(EventSubscriber):
+    """Posts events as JSON to a URL"""
+
+    def __init__(self, url, timeout=5, include_image=False, name="webhook", maxsize=100):
+        """
+        Args:
+            url (str): URL posted to
+            timeout (float, optional): timeout of request in seconds
+            include_image (bool, optional): adds frame of start events as base64 JPEG
+            name (str, optional): name of subscriber
+            maxsize (int, optional): maximal number of events waiting
+        """
+        super().__init__(name, maxsize)
+        #: str: URL posted to
+        self.url = url
+        #: float: timeout of request in seconds
+        self.timeout = timeout
+        #: bool: adds frame of start events as base64 JPEG
+        self.include_image = include_image
+
+    def handle(self, event):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(event_to_dict(event, self.include_image)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class MqttSubscriber(EventSubscriber):
+    """Publishes events as JSON to a MQTT broker, topic is extended by the name of the camera"""
+
+    def __init__(
+        self,
+        host,
+        port=1883,
+        topic="myraspberry/motion",
+        qos=0,
+        username=None,
+        password=None,
+        name="mqtt",
+        maxsize=100,
+    ):
+        """
+        Args:
+            host (str): host of broker
+            port (int, optional): port of broker
+            topic (str, optional): topic, events are published to <topic>/<camera>
+            qos (int, optional): quality of service
+            username (str, optional): user at broker
+            password (str, optional): password at broker
+            name (str, optional): name of subscriber
+            maxsize (int, optional): maximal number of events waiting
+
+        Raises:
+            RuntimeError: if paho-mqtt is not installed
+        """
+        super().__init__(name, maxsize)
+        if mqtt is None:
+            raise RuntimeError("paho-mqtt is not installed")
+        #: str: topic, events are published to <topic>/<camera>
+        self.topic = topic
+        #: int: quality of service
+        self.qos = qos
+        #: mqtt.Client: client, paho-mqtt 2 requires the version of the callbacks
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self.__client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            self.__client = mqtt.Client()
+        if username:
+            self.__client.username_pw_set(username, password)
+        # the network loop runs in a thread of paho and reconnects if the broker was lost
+        self.__client.connect_async(host, port)
+        self.__client.loop_start()
+
+    def handle(self, event):
+        info = self.__client.publish(
+            f"{self.topic}/{event.camera}",
+            json.dumps(event_to_dict(event)),
+            qos=self.qos,
+        )
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            raise RuntimeError(f"publish failed with {info.rc}")
+
+    def stop(self, timeout=5):
+        super().stop(timeout)
+        self.__client.loop_stop()
+        self.__client.disconnect()
+
+
+class FileSubscriber(EventSubscriber):
+    """Appends events as lines of JSON to a file"""
+
+    def __init__(self, path, name="file", maxsize=1000):
+        """
+        Args:
+            path (str): file
+            name (str, optional): name of subscriber
+            maxsize (int, optional): maximal number of events waiting
+        """
+        super().__init__(name, maxsize)
+        #: str: file
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def handle(self, event):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(event_to_dict(event)) + "\n")
+
+
+class RecorderSubscriber(EventSubscriber):
+    """Writes the frames of an event from the rewind buffer of the camera to a video.
+    The video starts some seconds before the event and ends some seconds after it.
+    """
+
+    def __init__(self, cameras, folder, before=5, after=5, name="recorder", maxsize=10):
+        """
+        Args:
+            cameras (dict): CameraController by name, their history is recorded
+            folder (str): folder of videos
+            before (float, optional): seconds recorded before the event
+            after (float, optional): seconds recorded after the event
+            name (str, optional): name of subscriber
+            maxsize (int, optional): maximal number of events waiting
+        """
+        super().__init__(name, maxsize)
+        #: dict: CameraController by name
+        self.cameras = cameras
+        #: str: folder of videos
+        self.folder = folder
+        #: float: seconds recorded before the event
+        self.before = before
+        #: float: seconds recorded after the event
+        self.after = after
+        os.makedirs(folder, exist_ok=True)
+
+    def handle(self, event):
+        if event.kind != "end":
+            return
+        controller = self.cameras.get(event.camera)
+        if controller is None:
+            # cameras without history are left out by create_subscriber
+            return
+        history = controller.get_history()
+        if history is None:
+            raise RuntimeError(f"camera {event.camera} has no history")
+        # the frames after the event are in the history after waiting
+        end = event.timestamp + self.after
+        time.sleep(max(0.0, end - time.time()))
+        frames = [
+            (timestamp, data)
+            for timestamp, data in history.iter_from(event.start - self.before)
+            if timestamp <= end
+        ]
+        if not frames:
+            return
+        fps = (
+            (len(frames) - 1) / (frames[-1][0] - frames[0][0])
+            if len(frames) > 1 and frames[-1][0] > frames[0][0]
+            else 1.0
+        )
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(event.start))
+        filepath = os.path.join(self.folder, f"{event.camera}-{stamp}.avi")
+        writer = None
+        try:
+            for timestamp, data in frames:
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    continue
+                if writer is None:
+                    writer = cv2.VideoWriter(
+                        filepath,
+                        cv2.VideoWriter_fourcc(*"MJPG"),
+                        fps,
+                        (image.shape[1], image.shape[0]),
+                    )
+                writer.write(image)
+        finally:
+            if writer is not None:
+                writer.release()
+        print(" - EVENTS: recorded", filepath, len(frames), "frames")
+
+
+class MotionEventBus:
+    """Debounces frames with motion into events and passes them to subscribers.
+    An event starts if motion was seen in some frames with gaps shorter than gap,
+    it ends if no motion was seen for gap seconds. A new event does not start
+    before cooldown seconds passed since the end of the last one.
+    """
+
+    def __init__(self, debounce_frames=3, gap=2.0, cooldown=10.0):
+        """
+        Args:
+            debounce_frames (int, optional): frames with motion needed to start an event
+            gap (float, optional): time in seconds without motion ending an event
+            cooldown (float, optional): time in seconds after an event without new event
+        """
+        #: int: frames with motion needed to start an event
+        self.debounce_frames = debounce_frames
+        #: float: time in seconds without motion ending an event
+        self.gap = gap
+        #: float: time in seconds after an event without new event
+        self.cooldown = cooldown
+        #: list: subscribers
+        self.__subscribers = []
+        #: dict: state of debouncing by camera
+        self.__states = {}
+        #: int: events published
+        self.published = 0
+        #: Lock: protects states
+        self.__lock = Lock()
+        #: Event: stops thread
+        self.__stop = Event()
+        #: Thread: ends events without motion
+        self.__thread = Thread(
+            target=self.__thread_func, name="events-bus", daemon=True
+        )
+        self.__thread.start()
+
+    def add_subscriber(self, subscriber):
+        """Adds and starts subscriber
+
+        Args:
+            subscriber (EventSubscriber): subscriber
+        """
+        subscriber.start()
+        self.__subscribers.append(subscriber)
+
+    def get_subscribers(self) -> list:
+        """Returns subscribers"""
+        return list(self.__subscribers)
+
+    def __publish(self, event):
+        """Puts event into the queues of all subscribers"""
+        self.published += 1
+        for subscriber in self.__subscribers:
+            subscriber.offer(event)
+
+    def publish(self, timestamp, score, bbox, frame, camera=None) -> bool:
+        """Adds frame with motion, intended to be used as listener of a motion detection.
+        Does not block, the frame is copied only if it starts an event.
+
+        Args:
+            timestamp (float): time of frame (seconds since epoch)
+            score (float): score of motion detection
+            bbox (tuple): bounding box of motion (x,y,w,h)
+            frame (np.array): image the motion was detected in
+            camera (str, optional): name of camera
+
+        Returns:
+            bool: True if the frame started an event
+        """
+        with self.__lock:
+            state = self.__states.get(camera)
+            if state is None:
+                state = self.__states[camera] = dict(
+                    count=0, last=None, active=False, start=None, peak=0.0, ended=None
+                )
+            if state["last"] is not None and timestamp - state["last"] > self.gap:
+                state["count"] = 0
+            state["count"] += 1
+            state["last"] = timestamp
+            if state["active"]:
+                state["peak"] = max(state["peak"], score)
+                return False
+            if state["count"] < self.debounce_frames:
+                return False
+            if state["ended"] is not None and timestamp - state["ended"] < self.cooldown:
+                return False
+            state.update(active=True, start=timestamp, peak=score)
+        # the frame might be a view into a camera buffer
+        self.__publish(
+            MotionEvent("start", camera, timestamp, score, bbox, frame.copy(), timestamp)
+        )
+        return True
+
+    def __thread_func(self):
+        """Ends events without motion for gap seconds"""
+        while not self.__stop.wait(min(0.5, self.gap / 2)):
+            now = time.time()
+            ended = []
+            with self.__lock:
+                for camera, state in self.__states.items():
+                    if state["active"] and now - state["last"] > self.gap:
+                        state.update(active=False, count=0, ended=state["last"])
+                        ended.append(
+                            MotionEvent(
+                                "end",
+                                camera,
+                                state["last"],
+                                state["peak"],
+                                None,
+                                None,
+                                state["start"],
+                            )
+                        )
+            for event in ended:
+                self.__publish(event)
+
+    def get_status(self) -> dict:
+        """Returns state of events and counters of subscribers
+
+        Returns:
+            dict: status
+        """
+        with self.__lock:
+            active = {
+                str(camera): state["start"]
+                for camera, state in self.__states.items()
+                if state["active"]
+            }
+        return dict(
+            published=self.published,
+            active=active,
+            subscribers=[subscriber.get_status() for subscriber in self.__subscribers],
+        )
+
+    def close(self):
+        """Stops bus and subscribers"""
+        self.__stop.set()
+        self.__thread.join()
+        for subscriber in self.__subscribers:
+            subscriber.stop()
+
+
+def create_subscriber(config, cameras=None) -> EventSubscriber:
+    """Creates subscriber described by a configuration as given in config.json, e.g.
+    {"type": "webhook", "url": "http://host/hook"}, {"type": "mqtt", "host": "broker"},
+    {"type": "file", "path": "saved/events/events.jsonl"} or
+    {"type": "recorder", "folder": "saved/recordings"}
+
+    Args:
+        config (dict): configuration, further keys are passed to the subscriber
+        cameras (dict, optional): CameraController by name, needed by the recorder
+
+    Returns:
+        EventSubscriber: subscriber
+
+    Raises:
+        ValueError: if type is unknown or no camera has a history for the recorder
+    """
+    config = dict(config)
+    kind = config.pop("type")
+    if kind == "webhook":
+        return WebhookSubscriber(**config)
+    if kind == "mqtt":
+        return MqttSubscriber(**config)
+    if kind == "file":
+        return FileSubscriber(**config)
+    if kind == "recorder":
+        # the history is opt-in, events of cameras without it can not be recorded
+        recorded = {
+            name: controller
+            for name, controller in (cameras or {}).items()
+            if controller.get_history() is not None
+        }
+        if not recorded:
+            raise ValueError("recorder needs a camera with history")
+        for name in set(cameras) - set(recorded):
+            print(" - EVENTS: recorder ignores camera", name, "without history")
+        return RecorderSubscriber(recorded, **config)
+    raise ValueError(f"unknown subscriber {kind}")
@@ -0,0 +1,238 @@
+"""
+This module provides a persistent store for motion events.
+Events are indexed in a SQLite database (timestamp, score, bounding box, thumbnail),
+the thumbnails are kept as JPEG files on disk.
+Writing is done in batched transactions by a background thread, so adding an event
+does not block the thread processing the frames.
+"""
+
+import os
+import queue
+import sqlite3
+import time
+from threading import Thread
+
+import cv2
+
+
+class MotionEventStore:
+    """Stores motion events in a SQLite index and their thumbnails on disk"""
+
+    def __init__(
+        self,
+        folder,
+        thumbnail_size=(160, 120),
+        min_interval=0.5,
+        batch_size=50,
+        flush_interval=1.0,
+        maxsize=1000,
+    ):
+        """Creates database and folder for thumbnails and starts the writer thread
+
+        Args:
+            folder (str): folder containing database and thumbnails
+            thumbnail_size (tuple, optional): size of thumbnails (width,height)
+            min_interval (float, optional): minimal time in seconds between two stored events
+                of a camera
+            batch_size (int, optional): maximal number of events written in one transaction
+            flush_interval (float, optional): maximal time in seconds an event waits to be written
+            maxsize (int, optional): maximal number of events waiting to be written
+        """
+        #: str: folder containing database and thumbnails
+        self.__folder = folder
+        #: str: folder containing thumbnails
+        self.__thumbnail_folder = os.path.join(folder, "thumbnails")
+        os.makedirs(self.__thumbnail_folder, exist_ok=True)
+        #: str: path to SQLite database
+        self.__db_path = os.path.join(folder, "events.db")
+        #: tuple: size of thumbnails (width,height)
+        self.__thumbnail_size = tuple(thumbnail_size)
+        #: float: minimal time in seconds between two stored events of a camera
+        self.__min_interval = min_interval
+        #: int: maximal number of events written in one transaction
+        self.__batch_size = batch_size
+        #: float: maximal time in seconds an event waits to be written
+        self.__flush_interval = flush_interval
+        #: queue.Queue: events waiting to be written
+        self.__queue = queue.Queue(maxsize)
+        #: dict: timestamp of last accepted event by camera
+        self.__last_timestamps = {}
+        #: int: number of events dropped because queue was full
+        self.dropped = 0
+        #: int: number of events written, used to make filenames unique
+        self.__written = 0
+        #: bool: indicates that writer thread is running
+        self.__running = True
+
+        connection = self.__connect()
+        with connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp REAL NOT NULL,
+                    score REAL NOT NULL,
+                    x INTEGER, y INTEGER, w INTEGER, h INTEGER,
+                    thumbnail TEXT,
+                    camera TEXT
+                )"""
+            )
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(events)")]
+            if "camera" not in columns:
+                connection.execute("ALTER TABLE events ADD COLUMN camera TEXT")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_score_timestamp ON events(score, timestamp)"
+            )
+        connection.close()
+
+        #: Thread: writes events to database
+        self.__thread = Thread(
+            target=self.__thread_func, name="eventstore-writer", daemon=True
+        )
+        self.__thread.start()
+
+    def __connect(self) -> sqlite3.Connection:
+        """Returns new connection to the database
+
+        Returns:
+            sqlite3.Connection: connection
+        """
+        connection = sqlite3.connect(self.__db_path, timeout=10)
+        # WAL allows queries while the writer thread is committing
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get_thumbnail_folder(self) -> str:
+        """Returns folder containing thumbnails
+
+        Returns:
+            str: folder
+        """
+        return self.__thumbnail_folder
+
+    def add(self, timestamp, score, bbox, frame, camera=None) -> bool:
+        """Adds event without blocking. Intended to be used as listener of a motion detection.
+
+        Args:
+            timestamp (float): time of event (seconds since epoch)
+            score (float): score of motion detection
+            bbox (tuple): bounding box of motion (x,y,w,h)
+            frame (np.array): image the motion was detected in
+            camera (str, optional): name of camera
+
+        Returns:
+            bool: True if event was accepted
+        """
+        if timestamp - self.__last_timestamps.get(camera, 0) < self.__min_interval:
+            return False
+        # resizing creates a small copy, the frame itself is not retained
+        thumbnail = cv2.resize(
+            frame, self.__thumbnail_size, interpolation=cv2.INTER_AREA
+        )
+        h, w = frame.shape[:2]
+        tw, th = self.__thumbnail_size
+        x, y, bw, bh = bbox
+        # bounding box is stored relative to the thumbnail
+        bbox = (
+            int(x * tw / w),
+            int(y * th / h),
+            int(bw * tw / w),
+            int(bh * th / h),
+        )
+        try:
+            self.__queue.put_nowait((timestamp, float(score), bbox, thumbnail, camera))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.__last_timestamps[camera] = timestamp
+        return True
+
+    def __thread_func(self):
+        """Collects events and writes them in batches"""
+        connection = self.__connect()
+        while self.__running or not self.__queue.empty():
+            batch = []
+            deadline = time.time() + self.__flush_interval
+            while len(batch) < self.__batch_size:
+                try:
+                    batch.append(
+                        self.__queue.get(timeout=max(0, deadline - time.time()))
+                    )
+                except queue.Empty:
+                    break
+            if batch:
+                self.__write(connection, batch)
+        connection.close()
+
+    def __write(self, connection, batch):
+        """Writes thumbnails and inserts events within one transaction
+
+        Args:
+            connection (sqlite3.Connection): connection to database
+            batch (list): events (timestamp, score, bbox, thumbnail, camera)
+        """
+        rows = []
+        for timestamp, score, bbox, thumbnail, camera in batch:
+            filename = f"{int(timestamp * 1000)}_{self.__written}.jpg"
+            self.__written += 1
+            success, jpeg = cv2.imencode(".jpg", thumbnail)
+            if success:
+                with open(os.path.join(self.__thumbnail_folder, filename), "wb") as f:
+                    f.write(jpeg.tobytes())
+            else:
+                filename = None
+            rows.append((timestamp, score, *bbox, filename, camera))
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO events (timestamp, score, x, y, w, h, thumbnail, camera) VALUES (?,?,?,?,?,?,?,?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            print(" - EVENTSTORE:", e)
+
+    def query(
+        self, hours=1, score_min=None, score_max=None, limit=500, now=None
+    ) -> list:
+        """Returns events of the last hours within a range of scores, latest first
+
+        Args:
+            hours (float, optional): time span
+            score_min (float, optional): minimal score
+            score_max (float, optional): maximal score
+            limit (int, optional): maximal number of events returned
+            now (float, optional): end of time span, defaults to current time
+
+        Returns:
+            list: events as dicts
+        """
+        now = time.time() if now is None else now
+        sql = "SELECT timestamp, score, x, y, w, h, thumbnail, camera FROM events WHERE timestamp >= ?"
+        parameters = [now - hours * 3600]
+        if score_min is not None:
+            sql += " AND score >= ?"
+            parameters.append(score_min)
+        if score_max is not None:
+            sql += " AND score <= ?"
+            parameters.append(score_max)
+        sql += " ORDER BY timestamp DESC LIMIT ?"
+        parameters.append(limit)
+        connection = self.__connect()
+        try:
+            rows = connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+        return [
+            dict(
+                timestamp=t, score=s, bbox=(x, y, w, h), thumbnail=thumbnail, camera=c
+            )
+            for t, s, x, y, w, h, thumbnail, c in rows
+        ]
+
+    def close(self):
+        """Writes remaining events and stops writer thread"""
+        self.__running = False
+        self.__thread.join()
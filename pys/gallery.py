@@ -0,0 +1,192 @@
+"""
+This module provides the gallery of saved images. The index of the folder is kept in memory
+and maintained incrementally, so a page of the gallery is listed without scanning the folder.
+Thumbnails are created in the background when an image is saved and kept in a cache folder,
+a thumbnail is created again if the image is newer.
+"""
+
+import bisect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import cv2
+
+
+class ImageGallery:
+    """Index and thumbnail cache of a folder of saved images"""
+
+    #: tuple: extensions of images listed
+    EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+    def __init__(self, folder, thumbnail_size=(160, 120), thumbnail_folder=None):
+        """
+        Args:
+            folder (str): folder of images
+            thumbnail_size (tuple, optional): thumbnails fit into this size (width,height)
+            thumbnail_folder (str, optional): cache of thumbnails, defaults to subfolder .thumbnails
+        """
+        #: str: folder of images
+        self.folder = folder
+        #: tuple: thumbnails fit into this size (width,height)
+        self.thumbnail_size = thumbnail_size
+        #: str: cache of thumbnails
+        self.thumbnail_folder = thumbnail_folder or os.path.join(folder, ".thumbnails")
+        os.makedirs(self.folder, exist_ok=True)
+        os.makedirs(self.thumbnail_folder, exist_ok=True)
+        #: list: (mtime, name) of images, oldest first
+        self.__entries = []
+        #: dict: mtime by name of image
+        self.__mtimes = {}
+        #: float: mtime of folder when it was indexed, changes if files are added or removed by others
+        self.__folder_mtime = None
+        #: Lock: protects index
+        self.__lock = Lock()
+        #: ThreadPoolExecutor: creates thumbnails in the background
+        self.__executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="gallery-thumbnails"
+        )
+        self.__scan()
+
+    def __scan(self):
+        """Indexes folder, only needed at start and if files were changed by others"""
+        entries = []
+        with os.scandir(self.folder) as iterator:
+            for entry in iterator:
+                if entry.is_file() and entry.name.lower().endswith(self.EXTENSIONS):
+                    entries.append((entry.stat().st_mtime, entry.name))
+        entries.sort()
+        with self.__lock:
+            self.__entries = entries
+            self.__mtimes = {name: mtime for mtime, name in entries}
+            self.__folder_mtime = os.stat(self.folder).st_mtime
+
+    def __refresh(self):
+        """Indexes folder again if files were added or removed by others"""
+        if os.stat(self.folder).st_mtime != self.__folder_mtime:
+            self.__scan()
+
+    def new_filepath(self, prefix="image", extension=".jpg") -> str:
+        """Returns path of a new image named by the current time
+
+        Args:
+            prefix (str, optional): start of name, e.g. name of camera
+            extension (str, optional): extension
+
+        Returns:
+            str: path in folder
+        """
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        return os.path.join(
+            self.folder, f"{prefix}-{stamp}-{int(now % 1 * 1000):03d}{extension}"
+        )
+
+    def add(self, filepath):
+        """Adds image written to the folder to the index and creates its thumbnail in the background
+
+        Args:
+            filepath (str): path of image in folder
+        """
+        name = os.path.basename(filepath)
+        mtime = os.stat(filepath).st_mtime
+        with self.__lock:
+            if name in self.__mtimes:
+                self.__entries.remove((self.__mtimes[name], name))
+            bisect.insort(self.__entries, (mtime, name))
+            self.__mtimes[name] = mtime
+            # the change of the folder is known
+            self.__folder_mtime = os.stat(self.folder).st_mtime
+        self.__executor.submit(self.get_thumbnail_path, name)
+
+    def remove(self, name):
+        """Deletes image and its thumbnail
+
+        Args:
+            name (str): name of image
+        """
+        with self.__lock:
+            mtime = self.__mtimes.pop(name, None)
+            if mtime is not None:
+                self.__entries.remove((mtime, name))
+        for path in (
+            os.path.join(self.folder, name),
+            self.__thumbnail_filepath(name),
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+        with self.__lock:
+            self.__folder_mtime = os.stat(self.folder).st_mtime
+
+    def count(self) -> int:
+        """Returns number of images"""
+        self.__refresh()
+        return len(self.__entries)
+
+    def get_page(self, page=0, page_size=24) -> list:
+        """Returns page of images, newest first
+
+        Args:
+            page (int, optional): index of page
+            page_size (int, optional): number of images per page
+
+        Returns:
+            list: dicts with name and mtime
+        """
+        self.__refresh()
+        with self.__lock:
+            end = len(self.__entries) - page * page_size
+            entries = self.__entries[max(0, end - page_size) : max(0, end)]
+        return [dict(name=name, mtime=mtime) for mtime, name in reversed(entries)]
+
+    def get_mtime(self, name) -> float:
+        """Returns mtime of image as indexed
+
+        Args:
+            name (str): name of image
+
+        Returns:
+            float: mtime, None if not indexed
+        """
+        return self.__mtimes.get(name)
+
+    def __thumbnail_filepath(self, name) -> str:
+        """Returns path of thumbnail of image"""
+        return os.path.join(self.thumbnail_folder, os.path.splitext(name)[0] + ".jpg")
+
+    def get_thumbnail_path(self, name) -> str:
+        """Returns path of thumbnail, which is created if missing or older than the image
+
+        Args:
+            name (str): name of image
+
+        Returns:
+            str: path of thumbnail, None if image does not exist
+        """
+        filepath = os.path.join(self.folder, name)
+        thumbnail = self.__thumbnail_filepath(name)
+        try:
+            mtime = os.stat(filepath).st_mtime
+        except FileNotFoundError:
+            return None
+        if os.path.exists(thumbnail) and os.stat(thumbnail).st_mtime >= mtime:
+            return thumbnail
+        # JPEG is decoded at a quarter of its size directly, which is much faster
+        image = cv2.imread(filepath, cv2.IMREAD_REDUCED_COLOR_4)
+        if image is None:
+            image = cv2.imread(filepath)
+        if image is None:
+            return None
+        h, w = image.shape[:2]
+        scale = min(self.thumbnail_size[0] / w, self.thumbnail_size[1] / h, 1.0)
+        image = cv2.resize(
+            image,
+            (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+        # written to a temporary file first, a request must not get a partial thumbnail
+        temppath = thumbnail + ".tmp.jpg"
+        cv2.imwrite(temppath, image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        os.replace(temppath, thumbnail)
+        return thumbnail
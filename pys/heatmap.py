@@ -0,0 +1,153 @@
+"""
+This module provides a heatmap of motion. The masks of a motion detection are accumulated
+into a low-resolution map with exponential decay, so the map shows where motion happened
+during the last hours without storing any frames.
+"""
+
+import math
+import os
+import time
+from threading import Lock, Thread
+
+import cv2
+import numpy as np
+
+
+class MotionHeatmap:
+    """Low-resolution map of motion decaying exponentially, updated in place"""
+
+    def __init__(self, size=(64, 48), half_life=6 * 3600, path=None, save_interval=300):
+        """
+        Args:
+            size (tuple, optional): size of map (width,height)
+            half_life (float, optional): time in seconds motion needs to fade to half
+            path (str, optional): file (.npz) the map is persisted to, None to keep it in memory only
+            save_interval (float, optional): time in seconds between saving
+        """
+        #: tuple: size of map (width,height)
+        self.size = tuple(size)
+        #: float: time in seconds motion needs to fade to half
+        self.half_life = half_life
+        #: str: file the map is persisted to
+        self.path = path
+        #: float: time in seconds between saving
+        self.save_interval = save_interval
+        #: np.array: accumulated motion, float32, 255 for a cell in motion during one frame
+        self.__heat = np.zeros((self.size[1], self.size[0]), dtype=np.float32)
+        #: np.array: buffer of mask resized to size of map
+        self.__motion = np.zeros(self.__heat.shape, dtype=np.uint8)
+        #: float: time of last update
+        self.__timestamp = None
+        #: float: time map was saved
+        self.__saved = time.time()
+        #: Thread: saves map in the background, None if not saving
+        self.__save_thread = None
+        #: Lock: protects __heat
+        self.__lock = Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def update(self, mask, timestamp=None):
+        """Decays map and adds mask of motion
+
+        Args:
+            mask (np.array): binary mask of motion (0 or 255) of any size
+            timestamp (float, optional): time of frame, defaults to now
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        cv2.resize(mask, self.size, dst=self.__motion, interpolation=cv2.INTER_AREA)
+        with self.__lock:
+            if self.__timestamp is not None:
+                decay = math.exp(
+                    -max(0.0, timestamp - self.__timestamp) * math.log(2) / self.half_life
+                )
+                self.__heat *= decay
+            # share of pixels in motion per cell of the map
+            cv2.accumulate(self.__motion, self.__heat)
+            self.__timestamp = timestamp
+        if self.path and timestamp - self.__saved > self.save_interval:
+            self.save_in_background()
+
+    def get_snapshot(self) -> np.array:
+        """Returns copy of map, the map is not changed meanwhile
+
+        Returns:
+            np.array: accumulated motion, float32, 1 for a cell in motion during one frame
+        """
+        with self.__lock:
+            return self.__heat * (1 / 255)
+
+    def render(self, size=None) -> np.array:
+        """Returns map in colors, normalized to its maximum
+
+        Args:
+            size (tuple, optional): size of image (width,height), defaults to size of map
+
+        Returns:
+            np.array: image BGR
+        """
+        heat = self.get_snapshot()
+        maximum = float(heat.max())
+        if maximum > 0:
+            heat *= 255 / maximum
+        image = cv2.applyColorMap(heat.astype(np.uint8), cv2.COLORMAP_JET)
+        if size is not None and tuple(size) != self.size:
+            image = cv2.resize(image, tuple(size), interpolation=cv2.INTER_LINEAR)
+        return image
+
+    def overlay(self, frame, alpha=0.4) -> np.array:
+        """Returns frame with map blended over it
+
+        Args:
+            frame (np.array): image BGR
+            alpha (float, optional): weight of map
+
+        Returns:
+            np.array: image BGR
+        """
+        image = self.render((frame.shape[1], frame.shape[0]))
+        return cv2.addWeighted(frame.astype(np.uint8), 1 - alpha, image, alpha, 0)
+
+    def save_in_background(self):
+        """Saves map to path in a thread, so writing to the SD card does not delay the frame
+        updating the map. Skipped if the last save is still running.
+        """
+        if self.__save_thread is not None and self.__save_thread.is_alive():
+            return
+        self.__saved = time.time()
+        self.__save_thread = Thread(target=self.save, name="heatmap-save", daemon=True)
+        self.__save_thread.start()
+
+    def save(self):
+        """Saves map to path"""
+        self.__saved = time.time()
+        with self.__lock:
+            heat = self.__heat.copy()
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # written to a temporary file first, a crash must not leave a broken map
+        temppath = self.path + ".tmp.npz"
+        np.savez(temppath, heat=heat, timestamp=self.__timestamp or time.time())
+        os.replace(temppath, self.path)
+
+    def load(self):
+        """Loads map from path, ignored if size does not match"""
+        try:
+            with np.load(self.path) as data:
+                heat = data["heat"]
+                timestamp = float(data["timestamp"])
+        except Exception as e:
+            print("HEATMAP", self.path, e)
+            return
+        if heat.shape != self.__heat.shape:
+            return
+        with self.__lock:
+            self.__heat[:] = heat
+            self.__timestamp = timestamp
+
+    def reset(self):
+        """Clears map"""
+        with self.__lock:
+            self.__heat[:] = 0
+            self.__timestamp = None
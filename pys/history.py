@@ -0,0 +1,159 @@
+"""
+This module provides a rewind buffer keeping the frames of the last minutes
+as encoded JPEG bytes, indexed by time. The frames are the ones encoded for the stream,
+so keeping them costs memory only.
+"""
+
+import bisect
+import time
+from threading import Lock
+
+
+class FrameHistory:
+    """Time-indexed buffer of encoded frames limited by age and memory"""
+
+    def __init__(self, seconds=120, max_bytes=32 * 1024 * 1024):
+        """
+        Args:
+            seconds (float, optional): frames older than this are dropped
+            max_bytes (int, optional): oldest frames are dropped if the frames take more memory
+        """
+        #: float: frames older than this are dropped
+        self.seconds = seconds
+        #: int: oldest frames are dropped if the frames take more memory
+        self.max_bytes = max_bytes
+        #: list: timestamps of frames, ascending, valid from index __head
+        self.__timestamps = []
+        #: list: encoded frames, valid from index __head
+        self.__frames = []
+        #: int: index of oldest frame kept, the lists are compacted from time to time
+        self.__head = 0
+        #: int: bytes of frames kept
+        self.__bytes = 0
+        #: Lock: protects lists
+        self.__lock = Lock()
+
+    def add(self, timestamp, data):
+        """Adds encoded frame, frames older than the newest frame are ignored
+
+        Args:
+            timestamp (float): time frame was captured
+            data (bytes): encoded frame
+        """
+        with self.__lock:
+            if self.__timestamps and timestamp <= self.__timestamps[-1]:
+                # frame encoded twice or overtaken by a newer one
+                return
+            self.__timestamps.append(timestamp)
+            self.__frames.append(data)
+            self.__bytes += len(data)
+            oldest = timestamp - self.seconds
+            while self.__head < len(self.__frames) - 1 and (
+                self.__bytes > self.max_bytes or self.__timestamps[self.__head] < oldest
+            ):
+                self.__bytes -= len(self.__frames[self.__head])
+                self.__frames[self.__head] = None
+                self.__head += 1
+            # dropping frames from the start of a list is expensive, so it is done in bulk
+            if self.__head > 1000 and self.__head * 2 > len(self.__frames):
+                del self.__timestamps[: self.__head]
+                del self.__frames[: self.__head]
+                self.__head = 0
+
+    def __index(self, timestamp) -> int:
+        """Returns index of the last frame at or before timestamp, the oldest if none"""
+        index = bisect.bisect_right(self.__timestamps, timestamp, lo=self.__head) - 1
+        return max(index, self.__head)
+
+    def get(self, timestamp) -> tuple:
+        """Returns frame captured at or just before a time
+
+        Args:
+            timestamp (float): time
+
+        Returns:
+            tuple: timestamp and encoded frame, (None, None) if empty
+        """
+        with self.__lock:
+            if self.__head >= len(self.__frames):
+                return None, None
+            index = self.__index(timestamp)
+            return self.__timestamps[index], self.__frames[index]
+
+    def iter_from(self, timestamp):
+        """Yields frames from a time on up to the newest frame,
+        frames added meanwhile are included
+
+        Args:
+            timestamp (float): time of first frame
+
+        Yields:
+            tuple: timestamp and encoded frame
+        """
+        last = None
+        while True:
+            with self.__lock:
+                if self.__head >= len(self.__frames):
+                    return
+                if last is None:
+                    index = self.__index(timestamp)
+                else:
+                    index = bisect.bisect_right(
+                        self.__timestamps, last, lo=self.__head
+                    )
+                    if index >= len(self.__frames):
+                        return
+                entry = self.__timestamps[index], self.__frames[index]
+            last = entry[0]
+            yield entry
+
+    def get_status(self) -> dict:
+        """Returns state of buffer
+
+        Returns:
+            dict: number of frames, bytes, time of oldest and newest frame
+        """
+        with self.__lock:
+            count = len(self.__frames) - self.__head
+            return dict(
+                frames=count,
+                bytes=self.__bytes,
+                max_bytes=self.max_bytes,
+                seconds=self.seconds,
+                oldest=self.__timestamps[self.__head] if count else None,
+                newest=self.__timestamps[-1] if count else None,
+            )
+
+    def clear(self):
+        """Drops all frames"""
+        with self.__lock:
+            self.__timestamps = []
+            self.__frames = []
+            self.__head = 0
+            self.__bytes = 0
+
+
+def replay(history, start, speed=1.0, end=None):
+    """Yields frames of a history keeping the time between them
+
+    Args:
+        history (FrameHistory): buffer
+        start (float): time of first frame
+        speed (float, optional): factor of replay speed
+        end (float, optional): time replay ends, defaults to now
+
+    Yields:
+        tuple: timestamp and encoded frame
+    """
+    first = None
+    starttime = time.time()
+    end = starttime if end is None else end
+    for timestamp, data in history.iter_from(start):
+        if timestamp > end:
+            return
+        if first is None:
+            first = timestamp
+        delay = (timestamp - first) / speed - (time.time() - starttime)
+        if delay > 0:
+            time.sleep(delay)
+        yield timestamp, data
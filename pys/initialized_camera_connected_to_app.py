@@ -3,12 +3,33 @@ This module instanciate an instance of class CameraControl in order
 to allow different pages to access the same instance.
 It can be import where this instance is needed.
 The instance of CameraControl is connected to the Flask-Server of the dash-app.
+
+Several cameras can be configured by the key "cameras" in config.json.
+Each entry describes an adapter (see camera.create_adapter) and may contain
+"name", "priority" and "autostart". Without this key a single camera is
+configured by the top level keys. All cameras are kept in cams, cam is the first one.
 """
 
 import pys.camera as camera
-from flask import Response
+from pys.eventstore import MotionEventStore
+from pys.events import MotionEventBus, create_subscriber
+from pys.gallery import ImageGallery
+from pys.heatmap import MotionHeatmap
+from pys.history import FrameHistory, replay
+from pys.memory import MemoryMonitor
+from pys.profiler import profiler
+from pys.sysmon import SystemMonitor
+from pys.threadroles import ThreadRoles
+from pys.transformer import MotionEngine
+from flask import Response, send_from_directory, abort, jsonify, request
 from dash import get_app
+from collections import OrderedDict
+from functools import partial
+from itertools import count
+import cv2
 import json
+import os
+import time
 
 with open("config.json") as json_data_file:
     configdata = json.load(json_data_file)
@@ -17,36 +38,506 @@ print("CONFIG.JSON")
 print(configdata)
 
 print("CAMERA INIT")
-if configdata["camera"] == "PICAMERA":
-    adapter = camera.AdapterPiCamera(0)
-elif configdata["camera"] == "OPENCV":
-    adapter = camera.AdapterOpenCV()
-else:
-    pass
-
-cam = camera.CameraController(
-    adapter=adapter,
-    active_preprocessing_transformations=configdata[
-        "active_preprocessing_transformations"
-    ],
-    active_postprocessing_transformations=configdata[
-        "active_postprocessing_transformations"
-    ],
+cameraconfigs = configdata.get("cameras", [dict(configdata, name="default")])
+#: CaptureScheduler: shares CPU between the cameras
+scheduler = camera.CaptureScheduler(cpu_budget=configdata.get("cpu_budget", 1.0))
+#: OrderedDict: all cameras by name
+cams = OrderedDict()
+for cameraconfig in cameraconfigs:
+    name = cameraconfig.get("name", f"camera{len(cams)}")
+    if name in cams:
+        # the routes, events and the autostart below rely on unique names
+        raise ValueError(f"Camera name '{name}' is configured twice in config.json")
+    adaptive_quality_config = cameraconfig.get(
+        "adaptive_quality", configdata.get("adaptive_quality")
+    )
+    adaptive_quality = (
+        camera.AdaptiveQualityController(**adaptive_quality_config)
+        if adaptive_quality_config is not None
+        else None
+    )
+    # opt-in, an idle history encodes every frame even without clients of the stream
+    history_config = cameraconfig.get("history", configdata.get("history"))
+    history = (
+        FrameHistory(
+            seconds=history_config.get("seconds", 120),
+            max_bytes=int(history_config.get("max_mb", 32) * 1024 * 1024),
+        )
+        if history_config is not None
+        else None
+    )
+    heatmap_config = cameraconfig.get("heatmap", configdata.get("heatmap", {}))
+    heatmap = (
+        MotionHeatmap(
+            size=heatmap_config.get("size", (64, 48)),
+            half_life=heatmap_config.get("half_life_hours", 6) * 3600,
+            path=os.path.join(
+                heatmap_config.get("folder", "saved/heatmaps"), f"heatmap-{name}.npz"
+            ),
+            save_interval=heatmap_config.get("save_interval", 300),
+        )
+        if heatmap_config is not None
+        else None
+    )
+    cams[name] = camera.CameraController(
+        adapter=camera.create_adapter(cameraconfig),
+        active_preprocessing_transformations=cameraconfig.get(
+            "active_preprocessing_transformations",
+            configdata.get("active_preprocessing_transformations", []),
+        ),
+        active_postprocessing_transformations=cameraconfig.get(
+            "active_postprocessing_transformations",
+            configdata.get("active_postprocessing_transformations", []),
+        ),
+        name=name,
+        scheduler=scheduler,
+        priority=cameraconfig.get("priority", 1),
+        jpeg_encoder=camera.create_jpeg_encoder(
+            **cameraconfig.get("jpeg", configdata.get("jpeg", {}))
+        ),
+        adaptive_quality=adaptive_quality,
+        history=history,
+        roi_sensor=cameraconfig.get("roi_sensor", False),
+        heatmap=heatmap,
+        history_idle=(history_config or {}).get("idle", True),
+    )
+    if cameraconfig.get("roi"):
+        cams[name].set_roi(cameraconfig["roi"])
+    res = cams[name].check()
+    print(" - CAMERA CHECK", name, res, id(cams[name]))
+    print(" - JPEG ENCODER", name, cams[name].get_jpeg_encoder().name)
+
+cam = next(iter(cams.values()))
+
+print("EVENTSTORE INIT")
+event_store = MotionEventStore(
+    folder=configdata.get("event_store_folder", "saved/events")
+)
+
+print("EVENT BUS INIT")
+events_config = configdata.get("events", {})
+#: MotionEventBus: passes debounced motion events to subscribers, None if disabled
+event_bus = (
+    MotionEventBus(
+        debounce_frames=events_config.get("debounce_frames", 3),
+        gap=events_config.get("gap", 2.0),
+        cooldown=events_config.get("cooldown", 10.0),
+    )
+    if events_config is not None
+    else None
+)
+if event_bus is not None:
+    for subscriber_config in events_config.get("subscribers", []):
+        try:
+            event_bus.add_subscriber(create_subscriber(subscriber_config, cams))
+        except Exception as e:
+            print(" - EVENTS:", subscriber_config.get("type"), e)
+
+
+def create_motion_listener(controller, engine, listener):
+    """Returns listener passing the detections of a motion detection on only while it
+    is the first active one of the camera, like the heatmap, so each frame is an
+    event once if several motion detections are active
+
+    Args:
+        controller (CameraController): camera
+        engine (MotionEngine): motion detection of the camera
+        listener (callable): called with (timestamp, score, bbox, frame)
+
+    Returns:
+        callable: listener of the motion detection
+    """
+
+    def on_motion(timestamp, score, bbox, frame):
+        if controller.get_motion_engine() is engine:
+            listener(timestamp, score, bbox, frame)
+
+    return on_motion
+
+
+for name, controller in cams.items():
+    for transformation in controller.get_transformation("registered").values():
+        if isinstance(transformation, MotionEngine):
+            listener = partial(event_store.add, camera=name)
+            transformation.add_listener(
+                create_motion_listener(controller, transformation, listener)
+            )
+            if event_bus is not None:
+                listener = partial(event_bus.publish, camera=name)
+                transformation.add_listener(
+                    create_motion_listener(controller, transformation, listener)
+                )
+
+print("GALLERY INIT")
+#: ImageGallery: saved images
+gallery = ImageGallery(folder=configdata.get("saved_images_folder", "saved/images"))
+
+
+def get_memory_owners() -> dict:
+    """Returns objects holding frames by name: the cameras and their transformations"""
+    owners = {}
+    for name, controller in cams.items():
+        owners[name] = controller
+        for group in ("basic", "registered", "post"):
+            for key, transformation in controller.get_transformation(group).items():
+                owners[f"{name}/{group}/{key}"] = transformation
+    return owners
+
+
+def get_memory_gauges() -> dict:
+    """Returns numbers growing with leaking clients or buffers"""
+    gauges = {}
+    for name, controller in cams.items():
+        gauges[f"{name}/stream_clients"] = sum(
+            controller.get_stream_subscribers().values()
+        )
+        if controller.get_history() is not None:
+            gauges[f"{name}/history_mb"] = (
+                controller.get_history().get_status()["bytes"] / 1024 / 1024
+            )
+    return gauges
+
+
+print("MEMORY MONITOR INIT")
+memory_config = configdata.get("memory", {})
+#: MemoryMonitor: samples memory of the app, None if disabled
+memory_monitor = (
+    MemoryMonitor(
+        owners=get_memory_owners,
+        gauges=get_memory_gauges,
+        interval=memory_config.get("interval", 60),
+        history=memory_config.get("history", 1440),
+        tracemalloc_frames=memory_config.get("tracemalloc", 0),
+    )
+    if memory_config is not None
+    else None
+)
+if memory_monitor is not None:
+    memory_monitor.start()
+
+
+print("THREAD ROLES INIT")
+threads_config = configdata.get("threads", {})
+#: ThreadRoles: pins threads to CPUs by role and reports their CPU, None if disabled
+thread_roles = (
+    ThreadRoles(
+        roles=threads_config.get("roles"),
+        patterns=threads_config.get("patterns"),
+        opencv_threads=threads_config.get("opencv_threads"),
+        interval=threads_config.get("interval", 2.0),
+    )
+    if threads_config is not None
+    else None
 )
-res = cam.check()
-print(" - CAMERA CHECK", res, id(cam))
+
+
+def get_system_gauges() -> dict:
+    """Returns frame time of the cameras in ms and CPU used by each role of threads,
+    correlated with the system load
+    """
+    gauges = {}
+    for name, controller in cams.items():
+        frame_time = controller.get_frame_time() if controller.running() else None
+        gauges[f"{name}/frame_ms"] = None if frame_time is None else 1000 * frame_time
+    if thread_roles is not None:
+        for role, cpu in thread_roles.get_cpu_by_role().items():
+            gauges[f"roles/{role}"] = cpu
+    return gauges
+
+
+def get_camera_counters() -> dict:
+    """Returns number of frames processed by the cameras, their rate is the fps"""
+    counters = {}
+    for name, controller in cams.items():
+        meta = controller.get_last_frame_meta()
+        counters[f"{name}/fps"] = None if meta is None else meta.seq
+    return counters
+
+
+print("SYSTEM MONITOR INIT")
+system_monitor_config = configdata.get("system_monitor", {})
+#: SystemMonitor: samples CPU, temperature and throttling, None if disabled
+system_monitor = (
+    SystemMonitor(
+        gauges=get_system_gauges,
+        counters=get_camera_counters,
+        interval=system_monitor_config.get("interval", 1.0),
+        history=system_monitor_config.get("history", 600),
+    )
+    if system_monitor_config is not None
+    else None
+)
+if system_monitor is not None:
+    system_monitor.start()
+
+for cameraconfig, controller in zip(cameraconfigs, cams.values()):
+    if cameraconfig.get("autostart", False):
+        controller.run()
+
+# started after the cameras, so the first sweep finds the capture threads
+if thread_roles is not None:
+    thread_roles.start()
+    # the profiler samples the threads of the roles as configured
+    profiler.patterns = thread_roles.patterns
 
 # Endpoint for videofeed
 app = get_app()
+#: count: numbers clients of the videostreams
+client_counter = count()
+
+
+# request threads serve the streams and the Dash callbacks, assigned at first request
+if thread_roles is not None:
+    app.server.before_request(thread_roles.assign_current_thread)
+
+
+def create_video_feed(controller):
+    """Returns response streaming the variant given by the parameters of the request:
+    stage ('transformed' or 'raw'), w (width) and q (quality of JPEG)
+    """
+    stage = request.args.get("stage", "transformed")
+    width = request.args.get("w", default=160, type=int)
+    quality = request.args.get("q", default=None, type=int)
+    if stage not in camera.STREAM_STAGES:
+        abort(400)
+    return Response(
+        camera.gen(
+            controller,
+            client=f"{request.remote_addr}#{next(client_counter)}",
+            stage=stage,
+            width=width,
+            quality=quality,
+        ),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
+    )
 
 
 # Videostream via Flask
 @app.server.route("/video_feed")
 def video_feed():
     print("CREATION OF VIDEOFEED - CAMERACONTOL")
+    return create_video_feed(cam)
+
+
+@app.server.route("/video_feed/<name>")
+def video_feed_of_camera(name):
+    if name not in cams:
+        abort(404)
+    print("CREATION OF VIDEOFEED - CAMERACONTOL", name)
+    return create_video_feed(cams[name])
+
+
+def create_video_tiles(controller):
+    """Returns response streaming changed tiles of the variant given by the parameters
+    of the request: stage ('transformed' or 'raw'), w (width) and q (quality of JPEG)
+    """
+    stage = request.args.get("stage", "transformed")
+    width = request.args.get("w", default=640, type=int)
+    quality = request.args.get("q", default=None, type=int)
+    if stage not in camera.STREAM_STAGES:
+        abort(400)
     return Response(
-        camera.gen(cam), mimetype="multipart/x-mixed-replace; boundary=frame"
+        camera.gen_tiles(controller, stage=stage, width=width, quality=quality),
+        mimetype="application/octet-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Videostream as changed tiles, rendered to a canvas by assets/tiles.js
+@app.server.route("/video_tiles")
+def video_tiles():
+    return create_video_tiles(cam)
+
+
+@app.server.route("/video_tiles/<name>")
+def video_tiles_of_camera(name):
+    if name not in cams:
+        abort(404)
+    return create_video_tiles(cams[name])
+
+
+# Tiles and bytes sent by the tile streams
+@app.server.route("/tiles/status")
+def tiles_status():
+    return jsonify(
+        {
+            name: {
+                "/".join(str(v) for v in key): status
+                for key, status in controller.get_tile_status().items()
+            }
+            for name, controller in cams.items()
+        }
+    )
+
+
+# Age of frames sent to the clients of the videostreams
+@app.server.route("/latency")
+def latency():
+    return jsonify(
+        {
+            name: controller.get_latency_tracker().get_statistics()
+            for name, controller in cams.items()
+        }
+    )
+
+
+def get_history_of_request():
+    """Returns rewind buffer of camera given by parameter camera of the request"""
+    name = request.args.get("camera")
+    controller = cams.get(name) if name else cam
+    if controller is None or controller.get_history() is None:
+        abort(404)
+    return controller.get_history()
+
+
+def get_time_of_request(key) -> float:
+    """Returns time given by parameter of the request,
+    as seconds since epoch or as seconds before now if not positive
+    """
+    value = request.args.get(key, type=float)
+    if value is None:
+        abort(400)
+    return time.time() + value if value <= 0 else value
+
+
+# Frames of the last minutes
+@app.server.route("/history")
+def history():
+    frames = get_history_of_request()
+    if "t" not in request.args:
+        return jsonify(frames.get_status())
+    timestamp, data = frames.get(get_time_of_request("t"))
+    if data is None:
+        abort(404)
+    response = Response(data, mimetype="image/jpeg")
+    response.headers["X-Timestamp"] = str(timestamp)
+    return response
+
+
+@app.server.route("/history/stream")
+def history_stream():
+    frames = get_history_of_request()
+    start = get_time_of_request("from")
+    speed = request.args.get("speed", default=1.0, type=float)
+    if speed <= 0:
+        abort(400)
+
+    def generate():
+        for timestamp, data in replay(frames, start, speed):
+            yield (
+                b"--frame\r\n" b"Content-Type: image/jpeg\r\n\r\n" + data + b"\r\n\r\n"
+            )
+
+    return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+
+def get_heatmap_of_request():
+    """Returns heatmap of camera given by parameter camera of the request"""
+    name = request.args.get("camera")
+    controller = cams.get(name) if name else cam
+    if controller is None or controller.get_heatmap() is None:
+        abort(404)
+    return controller.get_heatmap()
+
+
+# Heatmap of motion as image
+@app.server.route("/heatmap")
+def heatmap():
+    heatmap = get_heatmap_of_request()
+    width = request.args.get("width", default=320, type=int)
+    height = width * heatmap.size[1] // heatmap.size[0]
+    success, data = cv2.imencode(".png", heatmap.render((width, height)))
+    return Response(data.tobytes(), mimetype="image/png")
+
+
+# Heatmap of motion as values
+@app.server.route("/heatmap/data")
+def heatmap_data():
+    heat = get_heatmap_of_request().get_snapshot()
+    return jsonify(
+        width=heat.shape[1],
+        height=heat.shape[0],
+        max=float(heat.max()),
+        values=heat.round(4).tolist(),
+    )
+
+
+# Saved images and their thumbnails, URLs contain the mtime, so they can be cached for long
+@app.server.route("/gallery/images/<path:filename>")
+def gallery_image(filename):
+    return send_from_directory(
+        os.path.abspath(gallery.folder), filename, max_age=31536000
+    )
+
+
+@app.server.route("/gallery/thumbnails/<path:filename>")
+def gallery_thumbnail(filename):
+    if gallery.get_mtime(filename) is None:
+        abort(404)
+    thumbnail = gallery.get_thumbnail_path(filename)
+    if thumbnail is None:
+        abort(404)
+    return send_from_directory(
+        os.path.abspath(os.path.dirname(thumbnail)),
+        os.path.basename(thumbnail),
+        max_age=31536000,
+    )
+
+
+# Thumbnails of motion events
+@app.server.route("/events/thumbnails/<path:filename>")
+def event_thumbnail(filename):
+    return send_from_directory(
+        os.path.abspath(event_store.get_thumbnail_folder()),
+        filename,
+        max_age=86400,
     )
 
 
+# State of motion events and their subscribers
+@app.server.route("/events/bus")
+def events_bus():
+    if event_bus is None:
+        abort(404)
+    return jsonify(event_bus.get_status())
+
+
+# Memory telemetry, growing series hint at leaks
+@app.server.route("/memory")
+def memory():
+    if memory_monitor is None:
+        abort(404)
+    return jsonify(memory_monitor.get_status())
+
+
+@app.server.route("/memory/history")
+def memory_history():
+    if memory_monitor is None:
+        abort(404)
+    return jsonify(memory_monitor.get_series())
+
+
+# System resources, samples since a seq are fetched by ?since=<seq>
+@app.server.route("/system")
+def system():
+    if system_monitor is None:
+        abort(404)
+    return jsonify(system_monitor.get_status())
+
+
+@app.server.route("/system/history")
+def system_history():
+    if system_monitor is None:
+        abort(404)
+    return jsonify(system_monitor.get_samples(request.args.get("since", type=int)))
+
+
+# CPU used by each role of threads, their CPUs and nice levels
+@app.server.route("/threads")
+def threads():
+    if thread_roles is None:
+        abort(404)
+    return jsonify(thread_roles.get_report())
+
+
 print("CAMERA INIT DONE")
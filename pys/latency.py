@@ -0,0 +1,155 @@
+"""
+This module provides classes to trace the latency of frames
+from capturing by the camera to sending them to the clients of the stream.
+"""
+
+import time
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+
+class FrameMeta:
+    """Compact record travelling with a frame through the pipeline.
+    All times are seconds since epoch, None if the stage was not reached.
+    """
+
+    __slots__ = (
+        "seq",
+        "t_read",
+        "t_capture",
+        "t_basic",
+        "t_registered",
+        "t_post",
+        "t_encoded",
+    )
+
+    def __init__(self, seq, t_read, t_capture):
+        """
+        Args:
+            seq (int): sequence number of frame
+            t_read (float): time reading from camera started
+            t_capture (float): time image was returned by the camera
+        """
+        #: int: sequence number of frame
+        self.seq = seq
+        #: float: time reading from camera started
+        self.t_read = t_read
+        #: float: time image was returned by the camera
+        self.t_capture = t_capture
+        #: float: time basic transformations were done
+        self.t_basic = None
+        #: float: time registered transformations were done
+        self.t_registered = None
+        #: float: time post transformations were done
+        self.t_post = None
+        #: float: time frame was first encoded for the stream
+        self.t_encoded = None
+
+    def get_stages(self) -> dict:
+        """Returns duration of each stage reached
+
+        Returns:
+            dict: duration in seconds by name of stage
+        """
+        stages = {}
+        previous = self.t_read
+        for name in ("capture", "basic", "registered", "post", "encoded"):
+            current = getattr(self, "t_" + name)
+            if current is None:
+                break
+            stages[name] = current - previous
+            previous = current
+        return stages
+
+
+class LatencyTracker:
+    """Keeps age of frames at the time they were sent to each client of the stream"""
+
+    def __init__(self, maxlen=500):
+        """
+        Args:
+            maxlen (int, optional): number of ages kept per client
+        """
+        #: int: number of ages kept per client
+        self.__maxlen = maxlen
+        #: dict: deque of ages in seconds by client
+        self.__ages = {}
+        #: deque: durations of stages of latest frames sent
+        self.__stages = deque([], maxlen)
+        #: Lock: protects __ages
+        self.__lock = Lock()
+
+    def record(self, client, meta, t_sent=None):
+        """Records frame sent to a client
+
+        Args:
+            client (str): id of client
+            meta (FrameMeta): record of frame sent
+            t_sent (float, optional): time frame was sent, defaults to now
+        """
+        t_sent = time.time() if t_sent is None else t_sent
+        with self.__lock:
+            if client not in self.__ages:
+                self.__ages[client] = deque([], self.__maxlen)
+            self.__ages[client].append(t_sent - meta.t_capture)
+        stages = meta.get_stages()
+        if meta.t_encoded is not None:
+            stages["sent"] = t_sent - meta.t_encoded
+        self.__stages.append(stages)
+
+    def remove(self, client):
+        """Removes client which disconnected
+
+        Args:
+            client (str): id of client
+        """
+        with self.__lock:
+            self.__ages.pop(client, None)
+
+    def get_age_percentile(self, percentile=50) -> float:
+        """Returns percentile of age at send over all clients
+
+        Args:
+            percentile (float, optional): percentile
+
+        Returns:
+            float: age in seconds, None if nothing was sent
+        """
+        with self.__lock:
+            ages = [age for client_ages in self.__ages.values() for age in client_ages]
+        if not ages:
+            return None
+        return float(np.percentile(ages, percentile))
+
+    def get_statistics(self) -> dict:
+        """Returns percentiles of age at send per client and mean duration of stages
+
+        Returns:
+            dict: 'clients' with p50/p90/p99 in ms per client, 'stages' with mean in ms per stage
+        """
+        with self.__lock:
+            ages = {client: list(values) for client, values in self.__ages.items()}
+        clients = {
+            client: dict(
+                count=len(values),
+                p50_ms=1000 * float(np.percentile(values, 50)),
+                p90_ms=1000 * float(np.percentile(values, 90)),
+                p99_ms=1000 * float(np.percentile(values, 99)),
+            )
+            for client, values in ages.items()
+            if values
+        }
+        stages = {}
+        records = list(self.__stages)
+        for record in records:
+            for name, duration in record.items():
+                stages.setdefault(name, []).append(duration)
+        return dict(
+            clients=clients,
+            stages={
+                name: 1000 * float(np.mean(durations))
+                for name, durations in stages.items()
+            },
+        )
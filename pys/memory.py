@@ -0,0 +1,294 @@
+"""
+This module provides memory telemetry for an app running for weeks. A background thread
+samples the RSS of the process, the NumPy arrays held by registered owners (controllers and
+transformations) and optional gauges. With tracemalloc switched on the top allocators and their
+growth since the first sample are added. The samples are kept in a bounded history and
+series growing steadily are flagged, so a leak shows up long before the Pi runs out of memory.
+"""
+
+import gc
+import os
+import resource
+import threading
+import time
+import tracemalloc
+import types
+from collections import deque
+
+import numpy as np
+
+from pys.sampler import PeriodicSampler
+
+#: tuple: types not searched for arrays
+SKIPPED_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.MethodType,
+    types.BuiltinFunctionType,
+    threading.Thread,
+    str,
+    bytes,
+    bytearray,
+    int,
+    float,
+)
+
+
+def get_rss_mb() -> float:
+    """Returns resident set size of the process
+
+    Returns:
+        float: RSS in MB, the peak RSS if the current one is not available
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        # ru_maxrss is given in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def find_arrays(obj, stop_ids=(), depth=4) -> dict:
+    """Returns NumPy arrays reachable from an object by attributes and containers.
+    Views are counted by the array owning the memory.
+
+    Args:
+        obj (object): object searched
+        stop_ids (set, optional): ids of objects not entered, e.g. other owners
+        depth (int, optional): levels of attributes and containers searched
+
+    Returns:
+        dict: arrays owning memory by id
+    """
+    arrays = {}
+    seen = set()
+
+    def visit(item, level):
+        if isinstance(item, np.ndarray):
+            while isinstance(item.base, np.ndarray):
+                item = item.base
+            arrays[id(item)] = item
+            return
+        if level > depth or item is None or isinstance(item, SKIPPED_TYPES):
+            return
+        if id(item) in seen or (level > 0 and id(item) in stop_ids):
+            return
+        seen.add(id(item))
+        try:
+            if isinstance(item, dict):
+                children = list(item.values())
+            elif isinstance(item, (list, tuple, deque, set, frozenset)):
+                children = list(item)
+            elif hasattr(item, "__dict__"):
+                children = list(vars(item).values())
+            elif hasattr(item, "__slots__"):
+                children = [getattr(item, name, None) for name in item.__slots__]
+            else:
+                return
+        except RuntimeError:
+            # changed by another thread meanwhile, seen at the next sample
+            return
+        for child in children:
+            visit(child, level + 1)
+
+    visit(obj, 0)
+    return arrays
+
+
+def detect_growth(values, window=10, min_growth=1.0) -> bool:
+    """Returns True if the last values grow steadily, one decrease is tolerated
+
+    Args:
+        values (list): series, oldest first
+        window (int, optional): number of last values checked
+        min_growth (float, optional): minimal growth from first to last value of window
+
+    Returns:
+        bool: True if growing
+    """
+    values = [value for value in list(values)[-window:] if value is not None]
+    if len(values) < window:
+        return False
+    decreases = sum(1 for a, b in zip(values, values[1:]) if b < a)
+    return decreases <= 1 and values[-1] - values[0] >= min_growth
+
+
+class MemoryMonitor(PeriodicSampler):
+    """Samples memory of the process in a background thread"""
+
+    thread_name = "memory-monitor"
+
+    def __init__(
+        self,
+        owners=None,
+        gauges=None,
+        interval=60,
+        history=1440,
+        tracemalloc_frames=0,
+        window=10,
+    ):
+        """
+        Args:
+            owners (callable, optional): returns objects holding frames by name
+            gauges (callable, optional): returns further numbers sampled by name, e.g. clients
+            interval (float, optional): time in seconds between samples
+            history (int, optional): number of samples kept
+            tracemalloc_frames (int, optional): frames of tracebacks traced, 0 for no tracing
+            window (int, optional): number of samples a series has to grow to be flagged
+        """
+        super().__init__(interval)
+        #: callable: returns objects holding frames by name
+        self.owners = owners or (lambda: {})
+        #: callable: returns further numbers sampled by name
+        self.gauges = gauges or (lambda: {})
+        #: int: frames of tracebacks traced, 0 for no tracing
+        self.tracemalloc_frames = tracemalloc_frames
+        #: int: number of samples a series has to grow to be flagged
+        self.window = window
+        #: deque: samples, oldest first
+        self.__samples = deque([], history)
+        #: tracemalloc.Snapshot: snapshot of first sample, base of growth of allocators
+        self.__baseline = None
+        #: list: top allocators of last sample
+        self.__top = []
+        #: Lock: protects samples
+        self.__lock = threading.Lock()
+
+    def start(self):
+        """Starts sampling, tracemalloc is started if configured"""
+        if self.tracemalloc_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+        super().start()
+
+    def sample(self) -> dict:
+        """Takes sample and adds it to the history
+
+        Returns:
+            dict: sample
+        """
+        starttime = time.time()
+        owners = self.owners()
+        stop_ids = {id(obj) for obj in owners.values()}
+        counted = set()
+        frames = {}
+        for name, obj in owners.items():
+            # an array shared by several owners is counted by the first one
+            arrays = {
+                key: array
+                for key, array in find_arrays(obj, stop_ids).items()
+                if key not in counted
+            }
+            counted.update(arrays)
+            frames[name] = dict(
+                arrays=len(arrays),
+                mb=sum(array.nbytes for array in arrays.values()) / 1024 / 1024,
+            )
+        sample = dict(
+            time=starttime,
+            rss_mb=get_rss_mb(),
+            gc_objects=len(gc.get_objects()),
+            threads=threading.active_count(),
+            frames=frames,
+            gauges=dict(self.gauges()),
+        )
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            sample["traced_mb"] = current / 1024 / 1024
+            sample["traced_peak_mb"] = peak / 1024 / 1024
+            self.__update_top()
+        sample["duration_ms"] = 1000 * (time.time() - starttime)
+        with self.__lock:
+            self.__samples.append(sample)
+        return sample
+
+    def __update_top(self, n=10):
+        """Updates top allocators and their growth since the first snapshot"""
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            )
+        )
+        if self.__baseline is None:
+            self.__baseline = snapshot
+        self.__top = [
+            dict(
+                location=f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                mb=stat.size / 1024 / 1024,
+                growth_mb=stat.size_diff / 1024 / 1024,
+                count=stat.count,
+            )
+            for stat in snapshot.compare_to(self.__baseline, "lineno")[:n]
+        ]
+
+    def get_series(self) -> dict:
+        """Returns series of history by name, e.g. 'rss_mb' or 'frames/<owner>'
+
+        Returns:
+            dict: lists of values, oldest first, None where not sampled
+        """
+        with self.__lock:
+            samples = list(self.__samples)
+        names = {"rss_mb", "traced_mb", "gc_objects", "threads"}
+        for sample in samples:
+            names.update(f"frames/{name}" for name in sample["frames"])
+            names.update(f"gauges/{name}" for name in sample["gauges"])
+        series = {}
+        for name in sorted(names):
+            group, _, key = name.partition("/")
+            if group == "frames":
+                series[name] = [
+                    sample["frames"].get(key, {}).get("mb") for sample in samples
+                ]
+            elif group == "gauges":
+                series[name] = [sample["gauges"].get(key) for sample in samples]
+            else:
+                series[name] = [sample.get(name) for sample in samples]
+        return series
+
+    def get_growing(self) -> list:
+        """Returns names of series growing steadily during the last window of samples
+
+        Returns:
+            list: names of series, see get_series
+        """
+        # memory has to grow by at least 1 MB, the number of objects by 1000
+        min_growth = {"gc_objects": 1000}
+        return [
+            name
+            for name, values in self.get_series().items()
+            if detect_growth(
+                values,
+                self.window,
+                min_growth.get(name, 1.0),
+            )
+        ]
+
+    def get_status(self) -> dict:
+        """Returns last sample, growing series and top allocators
+
+        Returns:
+            dict: status
+        """
+        with self.__lock:
+            latest = self.__samples[-1] if self.__samples else None
+            count = len(self.__samples)
+        return dict(
+            interval=self.interval,
+            samples=count,
+            tracing=tracemalloc.is_tracing(),
+            latest=latest,
+            growing=self.get_growing(),
+            top=self.__top,
+        )
+
+    def get_history(self) -> list:
+        """Returns samples, oldest first
+
+        Returns:
+            list: samples
+        """
+        with self.__lock:
+            return list(self.__samples)
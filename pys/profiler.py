@@ -0,0 +1,162 @@
+"""
+This module provides a sampling profiler which can be switched on for some seconds
+while the app is running. It samples the stacks of the capture threads and the
+threads of the server, the roles of the threads are those of pys.threadroles. While it is off no thread runs and nothing is hooked,
+so there is no overhead.
+The result is available as collapsed stacks (input of flamegraph.pl or speedscope)
+and as a table of the functions most often seen.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from pys.threadroles import get_role
+
+
+class SamplingProfiler:
+    """Samples stacks of selected threads in a background thread for a limited time"""
+
+    def __init__(self, interval=0.005, roles=("capture", "web"), patterns=None):
+        """
+        Args:
+            interval (float, optional): time in seconds between two samples
+            roles (tuple, optional): roles of threads sampled, see threadroles.get_role
+            patterns (dict, optional): patterns of thread names by role,
+                threadroles.DEFAULT_PATTERNS if None
+        """
+        #: float: time in seconds between two samples
+        self.interval = interval
+        #: tuple: roles of threads sampled
+        self.roles = roles
+        #: dict: patterns of thread names by role, None for the default patterns
+        self.patterns = patterns
+        #: Thread: samples stacks, None if not running
+        self.__thread = None
+        #: Counter: number of samples by collapsed stack
+        self.__stacks = Counter()
+        #: Counter: number of samples a function was on top of the stack
+        self.__self_counts = Counter()
+        #: Counter: number of samples a function was anywhere on the stack
+        self.__total_counts = Counter()
+        #: int: number of samples taken
+        self.__samples = 0
+        #: float: time profiling started
+        self.__starttime = None
+        #: float: time profiling ends
+        self.__endtime = None
+        #: Lock: protects results
+        self.__lock = threading.Lock()
+
+    def running(self) -> bool:
+        """Returns True if profiling is running"""
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self, seconds=10) -> bool:
+        """Starts profiling for some seconds, results of the previous run are discarded
+
+        Args:
+            seconds (float, optional): duration
+
+        Returns:
+            bool: False if profiling is already running
+        """
+        if self.running():
+            return False
+        with self.__lock:
+            self.__stacks = Counter()
+            self.__self_counts = Counter()
+            self.__total_counts = Counter()
+            self.__samples = 0
+        self.__starttime = time.time()
+        self.__endtime = self.__starttime + seconds
+        self.__thread = threading.Thread(
+            target=self.__thread_func, name="profiler", daemon=True
+        )
+        self.__thread.start()
+        return True
+
+    def stop(self):
+        """Stops profiling before its time is over"""
+        self.__endtime = time.time()
+
+    @staticmethod
+    def __label(code) -> str:
+        """Returns label of function used in stacks"""
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def __thread_func(self):
+        """Takes samples until time is over"""
+        own_ident = threading.get_ident()
+        while time.time() < self.__endtime:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self.__lock:
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    role = get_role(names.get(ident), self.patterns)
+                    if role not in self.roles:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self.__label(frame.f_code))
+                        frame = frame.f_back
+                    if not stack:
+                        continue
+                    stack.reverse()
+                    self.__stacks[";".join([role] + stack)] += 1
+                    self.__self_counts[stack[-1]] += 1
+                    for label in set(stack):
+                        self.__total_counts[label] += 1
+                self.__samples += 1
+            del frames
+            time.sleep(self.interval)
+
+    def get_status(self) -> dict:
+        """Returns state of profiling
+
+        Returns:
+            dict: running, samples taken and remaining seconds
+        """
+        remaining = 0
+        if self.running():
+            remaining = max(0, self.__endtime - time.time())
+        return dict(running=self.running(), samples=self.__samples, remaining=remaining)
+
+    def get_collapsed(self) -> str:
+        """Returns collapsed stacks, one line per stack with its number of samples
+
+        Returns:
+            str: collapsed stacks
+        """
+        with self.__lock:
+            stacks = sorted(self.__stacks.items())
+        return "\n".join(f"{stack} {count}" for stack, count in stacks) + "\n"
+
+    def get_top(self, n=20) -> list:
+        """Returns functions seen most often on top of the stacks
+
+        Args:
+            n (int, optional): number of functions
+
+        Returns:
+            list: dicts with function, self and total samples and share of self samples in %
+        """
+        with self.__lock:
+            total = sum(self.__self_counts.values())
+            return [
+                dict(
+                    function=label,
+                    self=count,
+                    total=self.__total_counts[label],
+                    self_percent=round(100 * count / total, 1) if total else 0,
+                )
+                for label, count in self.__self_counts.most_common(n)
+            ]
+
+
+#: SamplingProfiler: profiler used by the app
+profiler = SamplingProfiler()
@@ -0,0 +1,58 @@
+"""
+This module provides the base class of the monitors sampling in a background thread,
+e.g. the memory monitor, the system monitor and the thread roles. A subclass implements
+sample, the base class calls it periodically until stopped.
+"""
+
+import threading
+
+
+class PeriodicSampler:
+    """Calls sample periodically in a background thread"""
+
+    #: str: name of the thread, also used in messages of errors
+    thread_name = "sampler"
+    #: bool: first sample is taken at start, else after the first interval
+    sample_at_start = True
+
+    def __init__(self, interval):
+        """
+        Args:
+            interval (float): time in seconds between samples
+        """
+        #: float: time in seconds between samples
+        self.interval = interval
+        #: Event: stops thread
+        self.__stop = threading.Event()
+        #: Thread: samples
+        self.__thread = None
+
+    def sample(self):
+        """Takes sample, to be implemented by subclasses"""
+        raise NotImplementedError
+
+    def start(self):
+        """Starts sampling"""
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__thread_func, name=self.thread_name, daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self):
+        """Stops sampling"""
+        self.__stop.set()
+
+    def __thread_func(self):
+        """Samples until stopped, errors of a sample are printed and sampling goes on"""
+        if not self.sample_at_start and self.__stop.wait(self.interval):
+            return
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print(self.thread_name.upper(), e)
+            if self.__stop.wait(self.interval):
+                return
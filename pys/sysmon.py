@@ -0,0 +1,280 @@
+"""
+This module provides a live monitor of the system resources. A background thread samples the
+CPU load (total, per core and of the app), the CPU frequency, the temperature of the thermal
+zones, the throttling state of the Raspberry Pi, the CPU used by each thread of the app and
+gauges of the cameras like the frame time. Samples are kept in a ring buffer of fixed size and
+numbered, so clients fetch only the samples added since their last request.
+
+Everything is read from /proc and /sys through psutil or directly, a sample takes about a
+millisecond and does not block, so the monitor can run at a rate of one sample per second.
+"""
+
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+
+from pys.sampler import PeriodicSampler
+
+#: str: throttling state of the Raspberry Pi as shown by vcgencmd get_throttled
+THROTTLED_PATH = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+#: dict: bits of the throttling state
+THROTTLED_BITS = {
+    0: "under-voltage",
+    1: "frequency capped",
+    2: "throttled",
+    3: "soft temperature limit",
+}
+
+
+def read_thermal_zones(pattern="/sys/class/thermal/thermal_zone*") -> dict:
+    """Returns temperatures of the thermal zones
+
+    Args:
+        pattern (str, optional): pattern of folders of the thermal zones
+
+    Returns:
+        dict: temperature in °C by type of zone, e.g. 'cpu-thermal', empty if not available
+    """
+    temperatures = {}
+    for folder in sorted(glob.glob(pattern)):
+        try:
+            with open(os.path.join(folder, "temp")) as f:
+                value = int(f.read()) / 1000
+            with open(os.path.join(folder, "type")) as f:
+                name = f.read().strip()
+        except (OSError, ValueError):
+            # zones of some drivers can not be read, e.g. if the device sleeps
+            continue
+        # zones of the same type are told apart by their folder
+        if name in temperatures:
+            name = os.path.basename(folder)
+        temperatures[name] = value
+    return temperatures
+
+
+def read_throttled(path=THROTTLED_PATH) -> int:
+    """Returns throttling state of the Raspberry Pi, see THROTTLED_BITS
+
+    Args:
+        path (str, optional): file provided by the firmware
+
+    Returns:
+        int: bits of state, None if not available
+    """
+    try:
+        with open(path) as f:
+            return int(f.read().strip(), 16)
+    except (OSError, ValueError):
+        return None
+
+
+def decode_throttled(value) -> list:
+    """Returns names of the bits set in the current throttling state
+
+    Args:
+        value (int): bits of state, None if not available
+
+    Returns:
+        list: names
+    """
+    if not value:
+        return []
+    return [name for bit, name in THROTTLED_BITS.items() if value & (1 << bit)]
+
+
+def get_thread_names() -> dict:
+    """Returns names of threads by native id, Python threads by their name, others
+    (e.g. the workers of OpenCV) by the name given by the system
+
+    Returns:
+        dict: names by native id
+    """
+    names = {}
+    for folder in glob.glob("/proc/self/task/*"):
+        try:
+            with open(os.path.join(folder, "comm")) as f:
+                names[int(os.path.basename(folder))] = f.read().strip()
+        except (OSError, ValueError):
+            continue
+    for thread in threading.enumerate():
+        if thread.native_id is not None:
+            names[thread.native_id] = thread.name
+    return names
+
+
+class ThreadLoad:
+    """Measures the CPU used by each thread of the process between two calls of update"""
+
+    def __init__(self):
+        #: psutil.Process: process of the app
+        self.__process = psutil.Process()
+        #: tuple: time and CPU times by native id of last update
+        self.__last_times = (None, {})
+
+    def update(self, now) -> dict:
+        """Returns CPU used by each thread since the last update
+
+        Args:
+            now (float): time of the update
+
+        Returns:
+            dict: CPU in % of a core by native id of all threads, None for threads
+                started since the last update and at the first update
+        """
+        times = {
+            thread.id: thread.user_time + thread.system_time
+            for thread in self.__process.threads()
+        }
+        last_time, last_times = self.__last_times
+        self.__last_times = (now, times)
+        valid = last_time is not None and now > last_time
+        return {
+            native_id: (
+                100 * (cpu_time - last_times[native_id]) / (now - last_time)
+                if valid and native_id in last_times
+                else None
+            )
+            for native_id, cpu_time in times.items()
+        }
+
+
+class SystemMonitor(PeriodicSampler):
+    """Samples the system resources in a background thread"""
+
+    thread_name = "system-monitor"
+    # cpu_percent measures since its previous call, the first sample waits an interval
+    sample_at_start = False
+
+    def __init__(
+        self, gauges=None, counters=None, interval=1.0, history=600, threads=10
+    ):
+        """
+        Args:
+            gauges (callable, optional): returns further numbers sampled by name, e.g. frame times
+            counters (callable, optional): returns counters by name, their rate per second
+                is sampled, e.g. the frames of a camera
+            interval (float, optional): time in seconds between samples
+            history (int, optional): number of samples kept
+            threads (int, optional): number of threads using the most CPU kept in a sample
+        """
+        super().__init__(interval)
+        #: callable: returns further numbers sampled by name
+        self.gauges = gauges or (lambda: {})
+        #: callable: returns counters by name
+        self.counters = counters or (lambda: {})
+        #: int: number of threads using the most CPU kept in a sample
+        self.threads = threads
+        #: int: number of samples kept
+        self.history = history
+        #: psutil.Process: process of the app
+        self.__process = psutil.Process()
+        #: deque: samples, oldest first
+        self.__samples = deque([], history)
+        #: int: sequence number of last sample
+        self.__seq = 0
+        #: tuple: time and counters of last sample, base of rates
+        self.__last_counters = (None, {})
+        #: ThreadLoad: CPU used by each thread
+        self.__thread_load = ThreadLoad()
+        #: Lock: protects samples
+        self.__lock = threading.Lock()
+
+    def start(self):
+        """Starts sampling"""
+        # the first call of cpu_percent starts the measurement
+        psutil.cpu_percent(percpu=True)
+        self.__process.cpu_percent()
+        super().start()
+
+    def __get_rates(self, now) -> dict:
+        """Returns rates per second of counters since the last sample"""
+        counters = dict(self.counters())
+        last_time, last_counters = self.__last_counters
+        self.__last_counters = (now, counters)
+        if last_time is None or now <= last_time:
+            return {}
+        return {
+            name: max(0, value - last_counters[name]) / (now - last_time)
+            for name, value in counters.items()
+            if value is not None and last_counters.get(name) is not None
+        }
+
+    def __get_thread_load(self, now) -> list:
+        """Returns threads using the most CPU since the last sample"""
+        cpu_by_thread = self.__thread_load.update(now)
+        names = get_thread_names()
+        load = [
+            dict(id=key, name=names.get(key, str(key)), cpu=cpu)
+            for key, cpu in cpu_by_thread.items()
+            if cpu is not None
+        ]
+        load.sort(key=lambda item: item["cpu"], reverse=True)
+        return load[: self.threads]
+
+    def sample(self) -> dict:
+        """Takes sample and adds it to the history
+
+        Returns:
+            dict: sample
+        """
+        starttime = time.perf_counter()
+        now = time.time()
+        cores = psutil.cpu_percent(percpu=True)
+        frequency = psutil.cpu_freq()
+        temperatures = read_thermal_zones()
+        throttled = read_throttled()
+        sample = dict(
+            time=now,
+            cpu=sum(cores) / len(cores) if cores else None,
+            cores=cores,
+            process_cpu=self.__process.cpu_percent(),
+            memory=psutil.virtual_memory().percent,
+            frequency=frequency.current if frequency else None,
+            temperature=max(temperatures.values()) if temperatures else None,
+            temperatures=temperatures,
+            throttled=throttled,
+            threads=self.__get_thread_load(now),
+            gauges=dict(self.gauges()),
+            rates=self.__get_rates(now),
+        )
+        sample["duration_ms"] = 1000 * (time.perf_counter() - starttime)
+        with self.__lock:
+            self.__seq += 1
+            sample["seq"] = self.__seq
+            self.__samples.append(sample)
+        return sample
+
+    def get_samples(self, since=None) -> list:
+        """Returns samples added since a sample, a client keeps the seq of the last
+        sample received to fetch only new ones
+
+        Args:
+            since (int, optional): seq of last sample received, None for all samples
+
+        Returns:
+            list: samples, oldest first
+        """
+        with self.__lock:
+            if since is None:
+                return list(self.__samples)
+            return [sample for sample in self.__samples if sample["seq"] > since]
+
+    def get_status(self) -> dict:
+        """Returns last sample and the meaning of its throttling state
+
+        Returns:
+            dict: status
+        """
+        with self.__lock:
+            latest = self.__samples[-1] if self.__samples else None
+            count = len(self.__samples)
+        return dict(
+            interval=self.interval,
+            samples=count,
+            latest=latest,
+            throttled=decode_throttled(latest["throttled"]) if latest else [],
+        )
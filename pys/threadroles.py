@@ -0,0 +1,240 @@
+"""
+This module provides roles of the threads of the app. Threads are assigned to a role by their
+name, e.g. the capture threads of the cameras, the threads encoding high resolution images,
+the recorder and event threads and the threads serving requests and Dash callbacks. Each role
+can be pinned to a set of CPUs and get a nice level, so one core of the Pi can be kept for
+capturing while the web threads run on the others. The CPU used by each role is reported.
+
+Affinity and nice level are set per thread by its native id (Linux only). Threads are
+assigned when they are found by a periodic sweep, request threads at their first request.
+Threads started later inherit the settings of the thread starting them until they are found.
+The number of threads of OpenCV is a setting of the process, not of a thread, it is set once.
+The workers of OpenCV are started by the first thread using them, usually the capture
+thread, and run with its affinity. They are reported as role 'native' with other threads not
+started by Python.
+"""
+
+import fnmatch
+import os
+import threading
+import time
+
+import cv2
+
+from pys.sampler import PeriodicSampler
+from pys.sysmon import ThreadLoad, get_thread_names
+
+#: dict: patterns of thread names by role, the first matching role is used
+DEFAULT_PATTERNS = {
+    "capture": ["capture-*"],
+    "encode": ["hr-*", "gallery-thumbnails*"],
+    "recorder": ["events-*", "eventstore-*"],
+    "web": ["MainThread", "Thread-* (process_request_thread)"],
+    "monitor": ["memory-monitor", "system-monitor", "profiler", "thread-roles"],
+}
+#: str: role of Python threads not matching any pattern
+OTHER = "other"
+#: str: role of threads not started by Python, e.g. the workers of OpenCV
+NATIVE = "native"
+
+
+def parse_cpus(value) -> set:
+    """Returns set of CPUs
+
+    Args:
+        value (str|list|int): CPUs as list, single CPU or string like '0' or '1-3,5'
+
+    Returns:
+        set: numbers of CPUs, None if value is None
+    """
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return {value}
+    if not isinstance(value, str):
+        return {int(cpu) for cpu in value}
+    cpus = set()
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def get_role(name, patterns=None) -> str:
+    """Returns role of a thread
+
+    Args:
+        name (str): name of Python thread, None for threads not started by Python
+        patterns (dict, optional): patterns of thread names by role, DEFAULT_PATTERNS if None
+
+    Returns:
+        str: first role with a pattern matching the name, OTHER or NATIVE
+    """
+    if name is None:
+        return NATIVE
+    for role, role_patterns in (patterns or DEFAULT_PATTERNS).items():
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in role_patterns):
+            return role
+    return OTHER
+
+
+class ThreadRoles(PeriodicSampler):
+    """Assigns threads to roles, applies CPU affinity and nice level of the roles
+    and reports the CPU used by each role
+    """
+
+    # the first sweep is done by the thread itself, so it gets the settings of role
+    # monitor instead of keeping the ones inherited from the thread starting it
+    thread_name = "thread-roles"
+
+    def __init__(self, roles=None, patterns=None, opencv_threads=None, interval=2.0):
+        """
+        Args:
+            roles (dict, optional): settings by role, 'cpus' (see parse_cpus) and 'nice',
+                a role without settings is reported only
+            patterns (dict, optional): patterns of thread names by role, replace the
+                patterns of DEFAULT_PATTERNS, new roles are matched first
+            opencv_threads (int, optional): number of threads used by OpenCV,
+                0 for no threads of its own, None to keep the default of OpenCV
+            interval (float, optional): time in seconds between sweeps
+        """
+        super().__init__(interval)
+        #: dict: patterns of thread names by role
+        self.patterns = dict(patterns or {})
+        for role, role_patterns in DEFAULT_PATTERNS.items():
+            self.patterns.setdefault(role, role_patterns)
+        #: set: CPUs available to the process
+        self.available_cpus = (
+            os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None
+        )
+        #: dict: settings by role, cpus as set
+        self.roles = {}
+        for role, settings in (roles or {}).items():
+            cpus = parse_cpus(settings.get("cpus"))
+            if cpus is not None and self.available_cpus is not None:
+                if not cpus & self.available_cpus:
+                    print("THREAD ROLES", role, "no CPU of", cpus, "available")
+                cpus = cpus & self.available_cpus or None
+            self.roles[role] = dict(cpus=cpus, nice=settings.get("nice"))
+        if opencv_threads is not None:
+            cv2.setNumThreads(opencv_threads)
+        #: ThreadLoad: CPU used by each thread
+        self.__thread_load = ThreadLoad()
+        #: dict: name and role applied by native id
+        self.__applied = {}
+        #: dict: last error by role, e.g. if the nice level must not be lowered
+        self.__errors = {}
+        #: dict: report of last sweep
+        self.__report = {}
+        #: Lock: protects the threads applied
+        self.__lock = threading.Lock()
+
+    def get_role(self, name) -> str:
+        """Returns role of a thread
+
+        Args:
+            name (str): name of Python thread, None for threads not started by Python
+
+        Returns:
+            str: role
+        """
+        return get_role(name, self.patterns)
+
+    def __apply(self, native_id, name, role):
+        """Applies settings of role to a thread once"""
+        with self.__lock:
+            if self.__applied.get(native_id) == (name, role):
+                return
+            self.__applied[native_id] = (name, role)
+        settings = self.roles.get(role)
+        if not settings:
+            return
+        try:
+            if settings["cpus"] is not None and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(native_id, settings["cpus"])
+            if settings["nice"] is not None and hasattr(os, "setpriority"):
+                os.setpriority(os.PRIO_PROCESS, native_id, settings["nice"])
+        except ProcessLookupError:
+            # thread ended meanwhile
+            pass
+        except OSError as e:
+            # lowering the nice level needs CAP_SYS_NICE
+            if role not in self.__errors:
+                print("THREAD ROLES", role, name, e)
+            self.__errors[role] = str(e)
+
+    def assign_current_thread(self):
+        """Applies role of the calling thread, cheap if it was applied before,
+        e.g. called at the start of each request
+        """
+        thread = threading.current_thread()
+        self.__apply(thread.native_id, thread.name, self.get_role(thread.name))
+
+    def sample(self) -> dict:
+        """Sweeps: applies roles to all threads and measures CPU used by each role since
+        the last sweep
+
+        Returns:
+            dict: report, see get_report
+        """
+        now = time.time()
+        python_names = {
+            thread.native_id: thread.name
+            for thread in threading.enumerate()
+            if thread.native_id is not None
+        }
+        names = get_thread_names()
+        cpu_by_thread = self.__thread_load.update(now)
+        roles = {
+            role: dict(cpu=0.0, threads=[])
+            for role in list(self.patterns) + [OTHER, NATIVE]
+        }
+        for native_id, cpu in cpu_by_thread.items():
+            name = python_names.get(native_id)
+            role = self.get_role(name)
+            self.__apply(native_id, name, role)
+            entry = roles.setdefault(role, dict(cpu=0.0, threads=[]))
+            entry["threads"].append(names.get(native_id, str(native_id)))
+            if cpu is not None:
+                entry["cpu"] += cpu
+        with self.__lock:
+            # threads ended are forgotten, their native ids may be reused
+            for native_id in set(self.__applied) - set(cpu_by_thread):
+                del self.__applied[native_id]
+        for role, entry in roles.items():
+            settings = self.roles.get(role, {})
+            cpus = settings.get("cpus")
+            entry.update(
+                cpus=sorted(cpus) if cpus is not None else None,
+                nice=settings.get("nice"),
+                error=self.__errors.get(role),
+            )
+        self.__report = dict(
+            time=now,
+            roles=roles,
+            available_cpus=(
+                sorted(self.available_cpus) if self.available_cpus is not None else None
+            ),
+            opencv_threads=cv2.getNumThreads(),
+        )
+        return self.__report
+
+    def get_report(self) -> dict:
+        """Returns report of last sweep
+
+        Returns:
+            dict: 'roles' with CPU in % of a core, names of threads, CPUs and nice level
+                by role, 'available_cpus' and 'opencv_threads'
+        """
+        return self.__report
+
+    def get_cpu_by_role(self) -> dict:
+        """Returns CPU used by each role during the last interval
+
+        Returns:
+            dict: CPU in % of a core by role
+        """
+        return {
+            role: entry["cpu"]
+            for role, entry in self.__report.get("roles", {}).items()
+        }
@@ -0,0 +1,231 @@
+"""
+This module provides delta streaming by tiles. A frame is divided into tiles, tiles which
+changed since they were sent last are detected on a downscaled gray image and sent as small
+JPEGs with their position. A keyframe with the whole frame is sent periodically and to
+clients which missed messages. For static scenes only few tiles are encoded and sent.
+
+A message is little-endian: length of the rest of the message (uint32), kind (uint8,
+1 keyframe, 0 delta), width and height of the frame (uint16 each), number of tiles (uint16),
+then for each tile x, y (uint16 each), length of JPEG (uint32) and the JPEG.
+"""
+
+import struct
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+#: int: kind of message containing the whole frame
+KEYFRAME = 1
+#: int: kind of message containing changed tiles only
+DELTA = 0
+
+
+def pack_message(kind, size, tiles) -> bytes:
+    """Returns message of tiles
+
+    Args:
+        kind (int): KEYFRAME or DELTA
+        size (tuple): width,height of frame
+        tiles (list): tiles as (x, y, JPEG bytes)
+
+    Returns:
+        bytes: message
+    """
+    parts = [struct.pack("<BHHH", kind, size[0], size[1], len(tiles))]
+    for x, y, data in tiles:
+        parts.append(struct.pack("<HHI", x, y, len(data)))
+        parts.append(data)
+    body = b"".join(parts)
+    return struct.pack("<I", len(body)) + body
+
+
+def unpack_message(message) -> tuple:
+    """Returns content of a message, used by tests and clients written in Python
+
+    Args:
+        message (bytes): message including its length
+
+    Returns:
+        tuple: kind, (width,height), tiles as (x, y, JPEG bytes)
+    """
+    kind, width, height, count = struct.unpack_from("<BHHH", message, 4)
+    offset = 4 + 7
+    tiles = []
+    for _ in range(count):
+        x, y, length = struct.unpack_from("<HHI", message, offset)
+        offset += 8
+        tiles.append((x, y, message[offset : offset + length]))
+        offset += length
+    return kind, (width, height), tiles
+
+
+class TileDeltaEncoder:
+    """Encodes frames as messages of changed tiles, shared by the clients of a stream.
+    Changes are detected against the tiles as sent, so slow changes add up until they are sent.
+    """
+
+    def __init__(
+        self,
+        jpeg_encoder,
+        tile_size=64,
+        threshold=12,
+        scale=4,
+        keyframe_interval=10.0,
+        history=30,
+    ):
+        """
+        Args:
+            jpeg_encoder (JpegEncoderOpenCV): encodes the tiles
+            tile_size (int, optional): width and height of tiles, multiple of scale
+            threshold (int, optional): minimal change of gray value of a downscaled pixel
+            scale (int, optional): factor the frame is downscaled by to detect changes
+            keyframe_interval (float, optional): time in seconds between keyframes
+            history (int, optional): number of messages kept for clients reading behind
+        """
+        #: JpegEncoderOpenCV: encodes the tiles
+        self.jpeg_encoder = jpeg_encoder
+        #: int: factor the frame is downscaled by to detect changes
+        self.scale = scale
+        #: int: width and height of tiles
+        self.tile_size = max(scale, tile_size // scale * scale)
+        #: int: minimal change of gray value of a downscaled pixel
+        self.threshold = threshold
+        #: float: time in seconds between keyframes
+        self.keyframe_interval = keyframe_interval
+        #: np.array: frame as sent, starting point of new clients
+        self.__canvas = None
+        #: np.array: downscaled gray frame as sent, padded to whole tiles
+        self.__reference = None
+        #: float: time of last keyframe
+        self.__keyframe_time = 0.0
+        #: int: sequence number of last message
+        self.__seq = 0
+        #: deque: last messages as (seq, message)
+        self.__messages = deque([], history)
+        #: tuple: seq and keyframe of canvas made for new clients
+        self.__canvas_keyframe = (None, None)
+        #: dict: counters of tiles and bytes
+        self.__stats = dict(frames=0, keyframes=0, tiles=0, tiles_sent=0, bytes=0)
+
+    def __downscale(self, frame) -> np.array:
+        """Returns gray frame downscaled and padded to whole tiles"""
+        h, w = frame.shape[:2]
+        small = cv2.resize(
+            frame,
+            (max(1, w // self.scale), max(1, h // self.scale)),
+            interpolation=cv2.INTER_AREA,
+        )
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        t = self.tile_size // self.scale
+        pad_y = -small.shape[0] % t
+        pad_x = -small.shape[1] % t
+        if pad_x or pad_y:
+            small = cv2.copyMakeBorder(small, 0, pad_y, 0, pad_x, cv2.BORDER_REPLICATE)
+        return small
+
+    def __encode(self, frame, quality) -> bytes:
+        """Returns JPEG of a part of a frame"""
+        return self.jpeg_encoder.encode(np.ascontiguousarray(frame), quality)
+
+    def update(self, frame, quality=None) -> int:
+        """Adds frame, the message of its changed tiles is kept for the clients
+
+        Args:
+            frame (np.array): image BGR
+            quality (int, optional): quality of JPEG, None for quality of the encoder
+
+        Returns:
+            int: sequence number of last message, unchanged if no tile changed
+        """
+        now = time.time()
+        small = self.__downscale(frame)
+        h, w = frame.shape[:2]
+        t = self.tile_size // self.scale
+        rows, cols = small.shape[0] // t, small.shape[1] // t
+        self.__stats["frames"] += 1
+        self.__stats["tiles"] += rows * cols
+        if (
+            self.__canvas is None
+            or self.__canvas.shape != frame.shape
+            or now - self.__keyframe_time >= self.keyframe_interval
+        ):
+            self.__canvas = frame.copy()
+            self.__reference = small
+            self.__keyframe_time = now
+            self.__stats["keyframes"] += 1
+            self.__stats["tiles_sent"] += rows * cols
+            return self.__add(
+                pack_message(KEYFRAME, (w, h), [(0, 0, self.__encode(frame, quality))])
+            )
+        diff = cv2.absdiff(small, self.__reference)
+        changed = diff.reshape(rows, t, cols, t).max(axis=(1, 3)) > self.threshold
+        if not changed.any():
+            return self.__seq
+        tiles = []
+        size = self.tile_size
+        for row in range(rows):
+            col = 0
+            while col < cols:
+                if not changed[row, col]:
+                    col += 1
+                    continue
+                # neighbouring tiles of a row are merged into one JPEG
+                end = col
+                while end + 1 < cols and changed[row, end + 1]:
+                    end += 1
+                x, y = col * size, row * size
+                x2, y2 = min(w, (end + 1) * size), min(h, y + size)
+                tiles.append((x, y, self.__encode(frame[y:y2, x:x2], quality)))
+                self.__canvas[y:y2, x:x2] = frame[y:y2, x:x2]
+                self.__reference[row * t : (row + 1) * t, col * t : (end + 1) * t] = small[
+                    row * t : (row + 1) * t, col * t : (end + 1) * t
+                ]
+                self.__stats["tiles_sent"] += end - col + 1
+                col = end + 1
+        return self.__add(pack_message(DELTA, (w, h), tiles))
+
+    def __add(self, message) -> int:
+        """Keeps message for the clients and returns its sequence number"""
+        self.__seq += 1
+        self.__messages.append((self.__seq, message))
+        self.__stats["bytes"] += len(message)
+        return self.__seq
+
+    def get_messages(self, since=None, quality=None) -> tuple:
+        """Returns messages a client needs to catch up
+
+        Args:
+            since (int, optional): sequence number of last message received, None for a new client
+            quality (int, optional): quality of keyframe made for new clients
+
+        Returns:
+            tuple: list of messages, sequence number of last message (None if no frame yet)
+        """
+        if self.__canvas is None:
+            return [], None
+        if since == self.__seq:
+            return [], since
+        oldest = self.__messages[0][0] if self.__messages else self.__seq + 1
+        if since is not None and oldest <= since + 1 <= self.__seq:
+            return [message for seq, message in self.__messages if seq > since], self.__seq
+        # new client or messages missed: the canvas is sent as keyframe, made once per seq
+        if self.__canvas_keyframe[0] != self.__seq:
+            h, w = self.__canvas.shape[:2]
+            self.__canvas_keyframe = (
+                self.__seq,
+                pack_message(
+                    KEYFRAME, (w, h), [(0, 0, self.__encode(self.__canvas, quality))]
+                ),
+            )
+        return [self.__canvas_keyframe[1]], self.__seq
+
+    def get_status(self) -> dict:
+        """Returns counters
+
+        Returns:
+            dict: frames, keyframes, tiles, tiles sent and bytes of messages
+        """
+        return dict(self.__stats, seq=self.__seq)
@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
-from collections import deque
+import time
+from collections import deque, namedtuple
 
 
 class Parameter:
@@ -14,6 +15,9 @@ class Parameter:
 class Smoother:
     """Implements exponential smoothing in time-domain"""
 
+    #: bool: output depends on previous frames, not applied to single stills
+    stateful = True
+
     def __init__(self, alpha):
         self.__last_frame = None
         self.parameter = dict(
@@ -24,7 +28,8 @@ class Smoother:
     def __call__(self, frame):
         alpha = self.parameter["alpha"].value
         if self.__last_frame is None:
-            self.__last_frame = frame
+            # frame might be a view into a camera buffer, so it is copied when retained
+            self.__last_frame = frame.copy()
         else:
             self.__last_frame = cv2.addWeighted(
                 self.__last_frame, alpha, frame, 1 - alpha, 0.0
@@ -39,6 +44,9 @@ class Smoother:
 class GaussianBlur:
     """Implements exponential smoothing in time-domain"""
 
+    #: bool: output depends on previous frames, not applied to single stills
+    stateful = False
+
     def __init__(self, kernelsize, std=0):
         self.parameter = dict(
             kernelsize=Parameter(name="Kernelsize", value=kernelsize, vmin=0, vmax=50),
@@ -54,10 +62,136 @@ class GaussianBlur:
         pass
 
 
-class SimpleMotionDetection:
+#: MotionResult: result of a motion detection, score, binary mask and boxes (x,y,w,h) of motion
+MotionResult = namedtuple("MotionResult", ["score", "mask", "boxes"])
+
+
+class MotionEngine:
+    """Base class of motion detections sharing one interface.
+    Subclasses implement detect and render. Calling an engine detects motion, keeps the score
+    for the plot, notifies listeners if the score exceeds the action threshold
+    and returns an image chosen by parameter output.
+    """
+
+    #: bool: output depends on previous frames, not applied to single stills
+    stateful = True
+
+    def __init__(self, action_threshold, min_area=20):
+        """
+        Args:
+            action_threshold (float): listeners are notified if score exceeds this value
+            min_area (int, optional): minimal area of boxes in pixels of the mask
+        """
+        self.parameter = dict(
+            action_threshold=Parameter(
+                name="AT", value=action_threshold, vmin=0, vmax=100
+            ),
+        )
+        #: int: minimal area of boxes in pixels of the mask
+        self.min_area = min_area
+        #: deque: latest scores
+        self.__data = deque([0] * 1000, 1000)
+        #: list: callables notified with (timestamp, score, bbox, frame) if motion is detected
+        self.__listeners = []
+        #: MotionResult: result of last frame
+        self.__last_result = None
+
+    def get_data(self) -> dict:
+        return {"data": self.__data}
+
+    def get_last_result(self) -> MotionResult:
+        """Returns result of last frame
+
+        Returns:
+            MotionResult: score, mask and boxes, None before the first frame
+        """
+        return self.__last_result
+
+    def add_listener(self, listener):
+        """Adds listener called if score exceeds action threshold.
+        Listeners are called within the thread processing the frames and must not block.
+
+        Args:
+            listener (callable): called with (timestamp, score, bbox, frame)
+        """
+        self.__listeners.append(listener)
+
+    def boxes_from_mask(self, mask, scale=1.0) -> list:
+        """Returns bounding boxes of connected areas of a mask
+
+        Args:
+            mask (np.array): binary mask
+            scale (float, optional): factor from mask to frame coordinates
+
+        Returns:
+            list: boxes (x,y,w,h) in frame coordinates
+        """
+        contours, _ = cv2.findContours(
+            mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < self.min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append(
+                (int(x * scale), int(y * scale), int(w * scale), int(h * scale))
+            )
+        return boxes
+
+    def detect(self, frame) -> MotionResult:
+        """Detects motion, to be implemented by subclasses
+
+        Args:
+            frame (np.array): image BGR
+
+        Returns:
+            MotionResult: score, mask and boxes
+        """
+        raise NotImplementedError
+
+    def render(self, frame, result) -> np.array:
+        """Returns image chosen by parameter output, to be implemented by subclasses
+
+        Args:
+            frame (np.array): image BGR
+            result (MotionResult): result of detect
+
+        Returns:
+            np.array: image BGR
+        """
+        raise NotImplementedError
+
+    def __call__(self, frame) -> np.array:
+        result = self.detect(frame)
+        self.__last_result = result
+        self.__data.append(result.score)
+        if result.score > self.parameter["action_threshold"].value and self.__listeners:
+            if result.boxes:
+                points = np.array(
+                    [(x, y) for x, y, w, h in result.boxes]
+                    + [(x + w, y + h) for x, y, w, h in result.boxes]
+                )
+                bbox = cv2.boundingRect(points)
+            else:
+                bbox = (0, 0, frame.shape[1], frame.shape[0])
+            timestamp = time.time()
+            for listener in self.__listeners:
+                try:
+                    listener(timestamp, result.score, bbox, frame)
+                except Exception as e:
+                    print(e)
+        return self.render(frame, result)
+
+    def reset(self):
+        self.__last_result = None
+
+
+class SimpleMotionDetection(MotionEngine):
     def __init__(
         self, alpha=0.9, beta=0.4, threshold=20, blur=20, action_threshold=6, output=6
     ):
+        super().__init__(action_threshold)
         self.__frame1 = None
         self.__frame2 = None
         self.parameter = dict(
@@ -71,21 +205,13 @@ class SimpleMotionDetection:
             output=Parameter(name="Output", value=output, vmin=0, vmax=9),
         )
         self.__last_image_detected = None
-        self.__data = deque([0] * 1000, 1000)
-
-    def get_data(self) -> deque:
-        return {"data": self.__data}
 
-    def __call__(self, frame) -> np.array:
+    def detect(self, frame) -> MotionResult:
         bwframe = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
         alpha = self.parameter["alpha"].value
         beta = self.parameter["beta"].value
         threshold = self.parameter["threshold"].value
         blur = self.parameter["maskblur"].value
-        action_threshold = self.parameter["action_threshold"].value
-        output = self.parameter["output"].value
-        if self.__last_image_detected is None:
-            self.__last_image_detected = np.ones(frame.shape) * 100
         if self.__frame1 is None or self.__frame2 is None:
             self.__frame1 = bwframe
             self.__frame2 = bwframe
@@ -105,64 +231,426 @@ class SimpleMotionDetection:
         # Threshold for differences
         diff_frame = cv2.absdiff(self.__diff_frame, diff_frame)
         value = np.mean(diff_frame)
-        self.__data.append(value)
-        # print(value)
         _, mask = cv2.threshold(diff_frame, threshold, 255, cv2.THRESH_BINARY)
 
         # Blurring of differences
         mask2 = cv2.blur(mask, (blur, blur))
         _, mask2 = cv2.threshold(mask2, 1, 255, cv2.THRESH_BINARY)
 
-        # d4 = cv2.GaussianBlur(d4, (blur, blur), 10)
-        # d4 = cv2.dilate(d4, None, iterations=4)
+        # intermediate images are kept for render
+        self.__bwframe = bwframe
+        self.__diff = diff_frame
+        self.__mask = mask
+        return MotionResult(value, mask2, self.boxes_from_mask(mask2))
 
-        # d5 = cv2.cvtColor(d4, cv2.COLOR_GRAY2BGR)
-        bwframe_bgr = cv2.cvtColor(bwframe, cv2.COLOR_GRAY2BGR)
-        frame_masked = cv2.bitwise_and(frame, frame, mask=mask2)
-        frame_masked2 = cv2.bitwise_and(
-            bwframe_bgr, bwframe_bgr, mask=cv2.bitwise_not(mask2)
-        )
+    def render(self, frame, result) -> np.array:
+        output = self.parameter["output"].value
+        mask2 = result.mask
+        bwframe = self.__bwframe
+        if self.__last_image_detected is None:
+            self.__last_image_detected = np.full(frame.shape, 100, dtype=np.uint8)
+        detected = result.score > self.parameter["action_threshold"].value
+        if detected:
+            self.__last_image_detected = frame.copy()
+
+        # only the images needed for the output are created
+        def d1():
+            return cv2.cvtColor(self.__frame1, cv2.COLOR_GRAY2BGR)
+
+        def d2():
+            return cv2.cvtColor(self.__frame2, cv2.COLOR_GRAY2BGR)
+
+        def d3():
+            return cv2.cvtColor(
+                (
+                    self.__diff_frame / max(100, np.max(self.__diff_frame)) * 255
+                ).astype("uint8"),
+                cv2.COLOR_GRAY2BGR,
+            )
 
-        d1 = cv2.cvtColor(self.__frame1, cv2.COLOR_GRAY2BGR)
-        d2 = cv2.cvtColor(self.__frame2, cv2.COLOR_GRAY2BGR)
-        d3 = cv2.cvtColor(
-            (self.__diff_frame / max(100, np.max(self.__diff_frame)) * 255).astype(
-                "uint8"
-            ),
-            cv2.COLOR_GRAY2BGR,
-        )
+        def d4():
+            return cv2.cvtColor(self.__diff, cv2.COLOR_GRAY2BGR)
 
-        d4 = cv2.cvtColor(diff_frame, cv2.COLOR_GRAY2BGR)
-        d5 = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
-        d6 = cv2.cvtColor(mask2, cv2.COLOR_GRAY2BGR)
-        d7 = cv2.addWeighted(frame_masked, 1, frame_masked2, 0.8, 0.0)
+        def d5():
+            return cv2.cvtColor(self.__mask, cv2.COLOR_GRAY2BGR)
 
-        # d8 = frame
-        if value > action_threshold:
-            d8 = frame
-            self.__last_image_detected = frame
-        else:
-            d8 = bwframe_bgr
-        d9 = self.__last_image_detected
+        def d6():
+            return cv2.cvtColor(mask2, cv2.COLOR_GRAY2BGR)
+
+        def d7():
+            bwframe_bgr = cv2.cvtColor(bwframe, cv2.COLOR_GRAY2BGR)
+            frame_masked = cv2.bitwise_and(frame, frame, mask=mask2)
+            frame_masked2 = cv2.bitwise_and(
+                bwframe_bgr, bwframe_bgr, mask=cv2.bitwise_not(mask2)
+            )
+            return cv2.addWeighted(frame_masked, 1, frame_masked2, 0.8, 0.0)
 
-        # d4 = cv2.cvtColor(d4, cv2.COLOR_GRAY2BGR)
-        # img = cv2.bitwise_and(frame, frame, mask=d3)
-        img1 = np.hstack((d1, d2, d3))
-        img2 = np.hstack((d4, d5, d6))
-        img3 = np.hstack((d7, d8, d9))
-        img_all = np.vstack((img1, img2, img3))
+        def d8():
+            if detected:
+                return frame
+            return cv2.cvtColor(bwframe, cv2.COLOR_GRAY2BGR)
+
+        def d9():
+            return self.__last_image_detected
+
+        def img_all():
+            img1 = np.hstack((d1(), d2(), d3()))
+            img2 = np.hstack((d4(), d5(), d6()))
+            img3 = np.hstack((d7(), d8(), d9()))
+            return np.vstack((img1, img2, img3))
 
         outputs = (d1, d2, d3, d4, d5, d6, d7, d8, d9, img_all)
-        return outputs[output]
+        return outputs[output]()
 
     def reset(self):
+        super().reset()
         self.__frame1 = None
         self.__frame2 = None
+        self.__last_image_detected = None
+
+
+class BackgroundSubtractionMotionDetection(MotionEngine):
+    """Motion detection based on the background subtractors MOG2 or KNN of OpenCV.
+    The frame is downscaled before subtraction, the background model adapts to slow lighting changes.
+    """
+
+    def __init__(
+        self,
+        method="MOG2",
+        history=300,
+        threshold=16,
+        scale=0.5,
+        action_threshold=1,
+        output=0,
+    ):
+        """
+        Args:
+            method (str, optional): 'MOG2' or 'KNN'
+            history (int, optional): number of frames the background model is based on
+            threshold (float, optional): variance threshold of MOG2, squared distance threshold of KNN is 25 times this value
+            scale (float, optional): scale of the image the subtraction is applied to
+            action_threshold (float, optional): percentage of area in motion notifying listeners
+            output (int, optional): 0 frame with boxes, 1 mask, 2 moving parts of frame
+        """
+        super().__init__(action_threshold)
+        #: str: 'MOG2' or 'KNN'
+        self.method = method
+        #: int: number of frames the background model is based on
+        self.__history = history
+        self.parameter.update(
+            threshold=Parameter(name="Threshold", value=threshold, vmin=1, vmax=100),
+            scale=Parameter(name="Scale", value=scale, vmin=0, vmax=1),
+            output=Parameter(name="Output", value=output, vmin=0, vmax=2),
+        )
+        #: cv2.BackgroundSubtractor: background model
+        self.__subtractor = None
+        #: np.array: kernel removing noise from the mask
+        self.__kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+    def __create_subtractor(self):
+        """Creates background model"""
+        if self.method == "KNN":
+            return cv2.createBackgroundSubtractorKNN(
+                history=self.__history, detectShadows=False
+            )
+        return cv2.createBackgroundSubtractorMOG2(
+            history=self.__history, detectShadows=False
+        )
+
+    def detect(self, frame) -> MotionResult:
+        scale = self.parameter["scale"].value or 1
+        threshold = self.parameter["threshold"].value
+        small = frame
+        if scale < 1:
+            small = cv2.resize(
+                frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        if self.__subtractor is None:
+            self.__subtractor = self.__create_subtractor()
+        if self.method == "KNN":
+            self.__subtractor.setDist2Threshold(threshold * 25)
+        else:
+            self.__subtractor.setVarThreshold(threshold)
+        mask = self.__subtractor.apply(small)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.__kernel)
+        score = 100 * cv2.countNonZero(mask) / mask.size
+        return MotionResult(score, mask, self.boxes_from_mask(mask, 1 / scale))
+
+    def render(self, frame, result) -> np.array:
+        return render_motion_result(frame, result, self.parameter["output"].value)
+
+    def reset(self):
+        super().reset()
+        self.__subtractor = None
+
+
+class FrameDifferenceMotionDetection(MotionEngine):
+    """Fast motion detection by the difference of consecutive frames, downscaled and in grayscale"""
+
+    def __init__(self, scale=0.25, threshold=25, action_threshold=1, output=0):
+        """
+        Args:
+            scale (float, optional): scale of the image the difference is computed on
+            threshold (int, optional): minimal difference of gray values regarded as motion
+            action_threshold (float, optional): percentage of area in motion notifying listeners
+            output (int, optional): 0 frame with boxes, 1 mask, 2 moving parts of frame
+        """
+        super().__init__(action_threshold, min_area=4)
+        self.parameter.update(
+            threshold=Parameter(name="Threshold", value=threshold, vmin=0, vmax=255),
+            scale=Parameter(name="Scale", value=scale, vmin=0, vmax=1),
+            output=Parameter(name="Output", value=output, vmin=0, vmax=2),
+        )
+        #: np.array: previous downscaled gray frame
+        self.__last_gray = None
+        #: np.array: kernel joining neighbouring differences
+        self.__kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+    def detect(self, frame) -> MotionResult:
+        scale = self.parameter["scale"].value or 1
+        threshold = self.parameter["threshold"].value
+        small = frame
+        if scale < 1:
+            small = cv2.resize(
+                frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.__last_gray is None or self.__last_gray.shape != gray.shape:
+            self.__last_gray = gray
+        diff = cv2.absdiff(gray, self.__last_gray)
+        self.__last_gray = gray
+        _, mask = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, self.__kernel)
+        score = 100 * cv2.countNonZero(mask) / mask.size
+        return MotionResult(score, mask, self.boxes_from_mask(mask, 1 / scale))
+
+    def render(self, frame, result) -> np.array:
+        return render_motion_result(frame, result, self.parameter["output"].value)
+
+    def reset(self):
+        super().reset()
+        self.__last_gray = None
+
+
+class OpticalFlowMotionDetection(MotionEngine):
+    """Motion vectors of a bounded set of feature points tracked by pyramidal Lucas-Kanade
+    on a downscaled gray frame. Features are only searched again if too many tracks were lost.
+    Score is the mean speed of the moving points in pixels per frame of the full frame,
+    the dominant direction of motion is kept as time series next to the score.
+    """
+
+    def __init__(
+        self,
+        scale=0.25,
+        max_points=100,
+        min_speed=0.5,
+        action_threshold=2,
+        output=0,
+    ):
+        """
+        Args:
+            scale (float, optional): scale of the image the points are tracked on
+            max_points (int, optional): maximal number of points tracked
+            min_speed (float, optional): minimal speed in pixels per frame of the full frame regarded as motion
+            action_threshold (float, optional): mean speed notifying listeners
+            output (int, optional): 0 frame with vectors, 1 mask, 2 moving parts of frame
+        """
+        super().__init__(action_threshold, min_area=1)
+        self.parameter.update(
+            scale=Parameter(name="Scale", value=scale, vmin=0, vmax=1),
+            max_points=Parameter(name="Points", value=max_points, vmin=1, vmax=500),
+            min_speed=Parameter(name="Min. speed", value=min_speed, vmin=0, vmax=100),
+            output=Parameter(name="Output", value=output, vmin=0, vmax=2),
+        )
+        #: deque: dominant direction of motion in degrees, 0 to the right, 90 downwards, None if still
+        self.__direction = deque([None] * 1000, 1000)
+        #: deque: number of points moving
+        self.__moving = deque([0] * 1000, 1000)
+        #: np.array: previous downscaled gray frame
+        self.__last_gray = None
+        #: np.array: points tracked in the previous frame, shape (n,1,2), float32
+        self.__points = None
+        #: list: vectors (x,y,dx,dy) of moving points of the last frame in coordinates of the full frame
+        self.__vectors = []
+        #: dict: parameters of pyramidal Lucas-Kanade
+        self.__lk_parameters = dict(
+            winSize=(15, 15),
+            maxLevel=2,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+            # points without structure (flat areas, sensor noise) are dropped
+            minEigThreshold=1e-3,
+        )
+
+    def get_data(self) -> dict:
+        data = super().get_data()
+        data.update(direction=self.__direction, moving=self.__moving)
+        return data
+
+    def get_vectors(self) -> list:
+        """Returns motion vectors of last frame
+
+        Returns:
+            list: vectors (x,y,dx,dy) of moving points in coordinates of the full frame
+        """
+        return self.__vectors
+
+    def get_summary(self) -> dict:
+        """Returns dominant motion of last frame
+
+        Returns:
+            dict: speed in pixels per frame, direction in degrees (None if still), number of moving and tracked points
+        """
+        result = self.get_last_result()
+        return dict(
+            speed=result.score if result else 0,
+            direction=self.__direction[-1],
+            moving=self.__moving[-1],
+            tracked=0 if self.__points is None else len(self.__points),
+        )
+
+    def __seed(self, gray, points) -> np.array:
+        """Adds new features to the points still tracked
+
+        Args:
+            gray (np.array): downscaled gray frame
+            points (np.array): points tracked, shape (n,1,2)
+
+        Returns:
+            np.array: points, shape (n,1,2)
+        """
+        max_points = int(self.parameter["max_points"].value)
+        mask = np.full(gray.shape, 255, dtype=np.uint8)
+        for x, y in points.reshape(-1, 2):
+            cv2.circle(mask, (int(x), int(y)), 5, 0, -1)
+        new_points = cv2.goodFeaturesToTrack(
+            gray,
+            maxCorners=max_points - len(points),
+            qualityLevel=0.01,
+            minDistance=5,
+            mask=mask,
+        )
+        if new_points is None:
+            return points
+        return np.vstack((points, new_points.astype(np.float32)))
+
+    def detect(self, frame) -> MotionResult:
+        scale = self.parameter["scale"].value or 1
+        max_points = int(self.parameter["max_points"].value)
+        min_speed = self.parameter["min_speed"].value
+        small = frame
+        if scale < 1:
+            small = cv2.resize(
+                frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        mask = np.zeros(gray.shape, dtype=np.uint8)
+        if self.__last_gray is None or self.__last_gray.shape != gray.shape:
+            self.__last_gray = gray
+            self.__points = self.__seed(gray, np.empty((0, 1, 2), np.float32))
+        points = self.__points
+        vectors = []
+        if len(points):
+            new_points, status, _ = cv2.calcOpticalFlowPyrLK(
+                self.__last_gray, gray, points, None, **self.__lk_parameters
+            )
+            found = status.reshape(-1) == 1
+            old = points.reshape(-1, 2)[found]
+            points = new_points[found].reshape(-1, 1, 2)
+            # inside of frame only
+            h, w = gray.shape
+            inside = (
+                (points[:, 0, 0] >= 0)
+                & (points[:, 0, 0] < w)
+                & (points[:, 0, 1] >= 0)
+                & (points[:, 0, 1] < h)
+            )
+            old = old[inside]
+            points = points[inside]
+            shift = (points.reshape(-1, 2) - old) / scale
+            speed = np.hypot(shift[:, 0], shift[:, 1])
+            moving = speed >= min_speed
+            for (x, y), (dx, dy) in zip(old[moving] / scale, shift[moving]):
+                vectors.append((int(x), int(y), float(dx), float(dy)))
+            for x, y in points.reshape(-1, 2)[moving]:
+                cv2.circle(mask, (int(x), int(y)), 2, 255, -1)
+        # features are only searched again if too many tracks were lost
+        if len(points) < max_points // 2:
+            points = self.__seed(gray, points)
+        self.__points = points
+        self.__last_gray = gray
+        self.__vectors = vectors
+
+        if vectors:
+            mean_dx = np.mean([v[2] for v in vectors])
+            mean_dy = np.mean([v[3] for v in vectors])
+            score = float(np.mean([np.hypot(v[2], v[3]) for v in vectors]))
+            direction = float(np.degrees(np.arctan2(mean_dy, mean_dx)) % 360)
+        else:
+            score = 0.0
+            direction = None
+        self.__direction.append(direction)
+        self.__moving.append(len(vectors))
+        return MotionResult(score, mask, self.boxes_from_mask(mask, 1 / scale))
+
+    def render(self, frame, result) -> np.array:
+        output = self.parameter["output"].value
+        if output != 0:
+            return render_motion_result(frame, result, output)
+        image = frame.copy()
+        for x, y, dx, dy in self.__vectors:
+            cv2.arrowedLine(
+                image, (x, y), (int(x + 3 * dx), int(y + 3 * dy)), (0, 255, 0), 1
+            )
+        direction = self.__direction[-1]
+        if direction is not None:
+            h, w = image.shape[:2]
+            center = (w - 30, 30)
+            tip = (
+                int(center[0] + 20 * np.cos(np.radians(direction))),
+                int(center[1] + 20 * np.sin(np.radians(direction))),
+            )
+            cv2.arrowedLine(image, center, tip, (0, 0, 255), 2, tipLength=0.4)
+        return image
+
+    def reset(self):
+        super().reset()
+        self.__last_gray = None
+        self.__points = None
+        self.__vectors = []
+
+
+def render_motion_result(frame, result, output) -> np.array:
+    """Returns image showing the result of a motion detection
+
+    Args:
+        frame (np.array): image BGR
+        result (MotionResult): result of detection
+        output (int): 0 frame with boxes, 1 mask, 2 moving parts of frame
+
+    Returns:
+        np.array: image BGR
+    """
+    if output == 0:
+        image = frame.copy()
+        for x, y, w, h in result.boxes:
+            cv2.rectangle(image, (x, y), (x + w, y + h), (0, 0, 255), 2)
+        return image
+    mask = result.mask
+    if mask.shape[:2] != frame.shape[:2]:
+        mask = cv2.resize(
+            mask, (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_NEAREST
+        )
+    if output == 1:
+        return cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+    return cv2.bitwise_and(frame, frame, mask=mask)
 
 
 class Test:
     """Implements exponential smoothing in time-domain"""
 
+    #: bool: output depends on previous frames, not applied to single stills
+    stateful = True
+
     def __init__(self, beta):
         self.__last_frame = None
         self.parameter = dict(beta=Parameter(name="Beta", value=beta, vmin=0, vmax=1))